@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import importlib.util
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -77,12 +81,73 @@ WSGI_APPLICATION = 'Model_API.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# The profile is picked with DJANGO_DB_PROFILE:
+#   sqlite      plain sqlite file with Django's defaults
+#   sqlite-wal  sqlite in WAL mode, readers don't block the writer (default)
+#   postgres    PostgreSQL through a psycopg connection pool, needs the optional
+#               `pip install "psycopg[binary,pool]"` (not in requirements.txt)
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'sqlite-wal')
+
+DB_CONN_MAX_AGE = int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 600))
+
+if DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+elif DB_PROFILE == 'sqlite-wal':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                # WAL lets reads run next to the single writer, NORMAL syncs at checkpoints
+                # only and the table pages are read through a 256 MB memory map
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('DJANGO_DB_MMAP_SIZE', 256 * 1024 ** 2))};"
+                ),
+                # Take the write lock when the transaction starts instead of failing the
+                # upgrade from a read lock, and wait for it rather than raising right away
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('DJANGO_DB_TIMEOUT', 20)),
+            },
+        }
+    }
+
+elif DB_PROFILE == 'postgres':
+    if importlib.util.find_spec('psycopg') is None or importlib.util.find_spec('psycopg_pool') is None:
+        raise ImproperlyConfigured(
+            "DJANGO_DB_PROFILE=postgres needs psycopg with its pool, pip install \"psycopg[binary,pool]\""
+        )
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'sales'),
+            'USER': os.environ.get('DJANGO_DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DJANGO_DB_PORT', '5432'),
+            # Connections are reused through the pool, Django refuses persistent ones next to it
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX', 10)),
+                    'timeout': int(os.environ.get('DJANGO_DB_TIMEOUT', 20)),
+                },
+            },
+        }
     }
-}
+
+else:
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_PROFILE `{DB_PROFILE}`, use sqlite, sqlite-wal or postgres")
 
 
 # Password validation
@@ -125,3 +190,126 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Model artifacts
+# The API serves the preprocessing pipeline together with the newest model, saved natively
+# as `model_<timestamp>.ubj` by Model_IO.save_model or pickled as `model_<timestamp>.pkl`
+
+SCRIPTS_DIR = BASE_DIR.parent / 'scripts'
+
+MODEL_DIR = BASE_DIR / 'apis'
+
+PIPELINE_FILE = 'preprocessing_pipeline.pkl'
+
+MODEL_FILE_PATTERN = ['model_*.ubj', 'model_*.json', 'model_*.pkl']
+
+# Seconds between two checks of MODEL_DIR for a newer model
+MODEL_RELOAD_INTERVAL = 30
+
+# `xgboost` scores through the booster, `flat` through Tree_Predictor.FlatTreePredictor,
+# a numba traversal of the flattened trees with a much lower fixed cost for small batches
+MODEL_PREDICTOR = os.environ.get('DJANGO_MODEL_PREDICTOR', 'xgboost')
+
+# Load the model bundle when Django starts instead of on the first request. With
+# `gunicorn --preload` the master loads it once and the forked workers share its pages
+MODEL_PRELOAD = os.environ.get('DJANGO_MODEL_PRELOAD', '0') == '1'
+
+# A bundle of per-store or per-cluster models written by Sharded_Training.py, when set the
+# prediction views score each request with the model of its shard instead of the global one
+MODEL_SHARD_DIR = os.environ.get('DJANGO_MODEL_SHARD_DIR') or None
+
+# Shard models kept loaded by every worker, the least recently used one is dropped first
+MODEL_SHARD_CACHE_SIZE = 64
+
+
+# Batch prediction
+
+# Largest number of rows accepted by status/batch/
+PREDICT_BATCH_MAX_ROWS = 100_000
+
+# Rows serialized per chunk of the streamed response, can be overridden with ?chunk_size=
+PREDICT_BATCH_CHUNK_SIZE = 5_000
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Predictions keyed on the request features and the model version, see apis/prediction_cache.py
+    'predictions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'predictions',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+        },
+    },
+}
+
+
+# Precomputed forecasts, see `manage.py precompute_forecasts`
+
+STORE_DATA_FILE = BASE_DIR.parent / 'data' / 'store.csv'
+
+# Six weeks ahead
+FORECAST_HORIZON = 42
+
+FORECAST_BULK_BATCH_SIZE = 5_000
+
+# Rows per page of the cursor paginated forecasts/ listing, and the largest ?page_size=
+FORECAST_PAGE_SIZE = 1000
+FORECAST_MAX_PAGE_SIZE = 10_000
+
+
+# Async prediction views
+
+# Threads XGBoost uses for one predict call, applied to every model the registry loads.
+# Off (all cores) by default, large batches and the forecasts are one predict call each
+XGBOOST_NTHREAD = int(os.environ.get('DJANGO_XGBOOST_NTHREAD', 0)) or None
+
+# XGBoost threads of every prediction of the async views, which run on the executor
+# next to each other; they predict with a copy of the model capped to this many threads
+PREDICT_EXECUTOR_NTHREAD = int(os.environ.get('DJANGO_PREDICT_EXECUTOR_NTHREAD', 1)) or None
+
+# Prediction threads of the async views, None uses cpu_count // PREDICT_EXECUTOR_NTHREAD
+PREDICT_EXECUTOR_WORKERS = None
+
+# Predictions allowed to wait for a thread before the async views answer 503
+PREDICT_EXECUTOR_QUEUE = 32
+
+# Seconds sent in the Retry-After header of those 503 responses
+PREDICT_RETRY_AFTER = 1
+
+
+# Micro-batching of single-record predictions
+
+# Score concurrent status/ requests together instead of one predict call each. Off by
+# default: a one-request-per-worker WSGI server never has a second request to batch with
+# and every prediction would only wait for the window. Set DJANGO_MICRO_BATCH=1 on ASGI
+# or threaded servers
+MICRO_BATCH_ENABLED = os.environ.get('DJANGO_MICRO_BATCH', '0') == '1'
+
+# Most requests scored by one predict call
+MICRO_BATCH_MAX_SIZE = 64
+
+# Seconds the first request of a batch waits for others to arrive
+MICRO_BATCH_MAX_WAIT = 0.003
+
+# Seconds a request waits for its micro-batched prediction before a 503
+MICRO_BATCH_TIMEOUT = 30.0
+
+
+# SalesData listing and bulk ingest
+
+# Rows per page of the cursor paginated SalesData listing
+SALES_DATA_PAGE_SIZE = 1000
+
+# Largest page a client can ask for with ?page_size=
+SALES_DATA_MAX_PAGE_SIZE = 10_000
+
+# Rows inserted per INSERT statement by the bulk endpoint
+SALES_DATA_BULK_BATCH_SIZE = 1000
@@ -1,6 +1,28 @@
+import gc
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apis'
+
+    def ready(self):
+        if not settings.MODEL_PRELOAD:
+            return
+
+        from .model_registry import registry
+
+        try:
+            registry.get()
+        except FileNotFoundError as e:
+            logger.warning(f"Skipping the model preload: {e}")
+            return
+
+        # Move the loaded objects out of the collector's generations, otherwise every
+        # collection in a forked worker writes to their headers and unshares the pages
+        gc.freeze()
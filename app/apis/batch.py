@@ -0,0 +1,99 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .models import SalesData
+
+# Columns the preprocessing pipeline expects, in the order of the SalesData model
+BATCH_COLUMNS = [field.name for field in SalesData._meta.fields if field.name != 'id']
+
+
+def read_batch(request) -> pd.DataFrame:
+    '''
+    Builds a DataFrame of SalesData rows from a batch request.
+
+    The rows are either the JSON array sent as the request body or an uploaded
+    CSV/Parquet file under the `file` field.
+
+    Parameters:
+    -----------
+        request(rest_framework.request.Request or django.http.HttpRequest)
+
+    Returns:
+    --------
+        pd.DataFrame: The rows restricted to BATCH_COLUMNS
+
+    Raises:
+    -------
+        ValueError: When the payload can't be read, is too large or misses columns
+    '''
+    upload = request.FILES.get('file')
+
+    if upload is not None:
+        extension = os.path.splitext(upload.name)[1].lower()
+        if extension == '.csv':
+            data = pd.read_csv(upload, low_memory=False)
+        elif extension in ('.parquet', '.pq'):
+            try:
+                data = pd.read_parquet(upload)
+            except ImportError:
+                raise ValueError("Parquet uploads need pyarrow installed on the server")
+        else:
+            raise ValueError(f"Unsupported file type `{extension}`, upload a .csv or .parquet file")
+
+    else:
+        rows = _request_rows(request)
+        if not isinstance(rows, list):
+            raise ValueError("Send a JSON array of rows or upload a file under `file`")
+        data = pd.DataFrame.from_records(rows)
+
+    if data.empty:
+        raise ValueError("The batch is empty")
+
+    if len(data) > settings.PREDICT_BATCH_MAX_ROWS:
+        raise ValueError(f"The batch has {len(data)} rows, the maximum is {settings.PREDICT_BATCH_MAX_ROWS}")
+
+    missing_cols = [col for col in BATCH_COLUMNS if col not in data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns: {', '.join(missing_cols)}")
+
+    return data[BATCH_COLUMNS]
+
+
+def _request_rows(request):
+    # DRF requests parse the body themselves, the plain Django ones of the async views don't
+    if hasattr(request, 'data'):
+        return request.data
+
+    try:
+        return json.loads(request.body or b'null')
+    except json.JSONDecodeError:
+        raise ValueError("The request body isn't valid JSON")
+
+
+def stream_predictions(data: pd.DataFrame, predictions: np.ndarray, chunk_size: int):
+    '''
+    Yields the predictions as a JSON array, `chunk_size` rows at a time
+
+    Parameters:
+    -----------
+        data(pd.DataFrame): The scored rows, used for the Store and Date of each prediction
+        predictions(np.ndarray): Model output aligned with data
+        chunk_size(int): Number of rows serialized per yielded chunk
+    '''
+    stores = data['Store'].to_numpy()
+    dates = pd.to_datetime(data['Date']).dt.strftime('%Y-%m-%d').to_numpy()
+    sales = np.asarray(predictions, dtype=float)
+
+    yield '['
+    for start in range(0, len(sales), chunk_size):
+        stop = min(start + chunk_size, len(sales))
+        rows = [
+            json.dumps({'Store': int(stores[i]), 'Date': dates[i], 'Sales': float(sales[i])})
+            for i in range(start, stop)
+        ]
+        yield (',' if start else '') + ','.join(rows)
+    yield ']'
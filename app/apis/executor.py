@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class ExecutorBusy(Exception):
+    '''
+    Raised when every worker is busy and the waiting queue is full
+    '''
+
+
+class BoundedExecutor:
+    '''
+    Thread pool for the CPU bound part of the async prediction views.
+
+    At most `max_workers` jobs run and `max_queue` more wait for a worker, any
+    further submit raises ExecutorBusy instead of queueing without bound, so the
+    views can answer 503 while the server is saturated.
+
+    Parameters:
+    -----------
+        max_workers(int): Number of threads running predictions
+        max_queue(int): Number of jobs allowed to wait for a thread
+    '''
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='predict')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+
+    @classmethod
+    def from_settings(cls):
+        max_workers = settings.PREDICT_EXECUTOR_WORKERS or default_workers(settings.PREDICT_EXECUTOR_NTHREAD)
+        return cls(max_workers, settings.PREDICT_EXECUTOR_QUEUE)
+
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusy(f"All {self.max_workers} workers are busy and {self.max_queue} jobs are waiting")
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+def default_workers(nthread: int) -> int:
+    '''
+    Number of prediction threads that keeps workers * XGBoost threads within the cores,
+    one when XGBoost isn't capped and every predict call uses all of them
+    '''
+    if not nthread:
+        return 1
+
+    return max(1, (os.cpu_count() or 1) // nthread)
+
+
+predict_executor = BoundedExecutor.from_settings()
@@ -0,0 +1,29 @@
+import sys
+import json
+import hashlib
+
+import pandas as pd
+from django.conf import settings
+
+# The forecast grid is built by scripts/Forecasting.py, shared with the notebooks
+if str(settings.SCRIPTS_DIR) not in sys.path:
+    sys.path.append(str(settings.SCRIPTS_DIR))
+
+from Forecasting import STORE_COLUMNS
+
+
+def store_input_hashes(store: pd.DataFrame, model_version: str) -> dict:
+    '''
+    Hash of everything the forecast of each store depends on, keyed on the store id.
+
+    The forecast of a day only depends on the store row, the model and the day itself,
+    not on the window it was made in, so a day forecast yesterday is still current today.
+    '''
+    records = store[STORE_COLUMNS].astype(object).where(store[STORE_COLUMNS].notna(), None).to_dict('records')
+
+    hashes = {}
+    for record in records:
+        canonical = json.dumps([record, model_version], sort_keys=True, default=str)
+        hashes[int(record['Store'])] = hashlib.sha256(canonical.encode()).hexdigest()
+
+    return hashes
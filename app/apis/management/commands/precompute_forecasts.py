@@ -0,0 +1,90 @@
+import datetime
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apis.models import SalesForecast
+from apis.model_registry import registry
+from apis.forecasting import store_input_hashes
+
+from Forecasting import Forecaster
+
+
+class Command(BaseCommand):
+    help = "Scores every store for the next days in one batch and stores the result in the SalesForecast table"
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store-file', default=str(settings.STORE_DATA_FILE),
+                            help="csv with one row per store, defaults to the STORE_DATA_FILE setting")
+        parser.add_argument('--start', default=None,
+                            help="First forecast day (YYYY-MM-DD), defaults to tomorrow")
+        parser.add_argument('--horizon', type=int, default=settings.FORECAST_HORIZON,
+                            help="Number of days to forecast")
+        parser.add_argument('--force', action='store_true',
+                            help="Rescore every store, even the ones whose inputs didn't change")
+
+
+    def handle(self, *args, **options):
+        try:
+            store = pd.read_csv(options['store_file'], low_memory=False)
+        except OSError as e:
+            raise CommandError(f"Can't read the store file: {e}")
+
+        start = pd.Timestamp(options['start'] or datetime.date.today() + datetime.timedelta(days=1)).normalize()
+        horizon = options['horizon']
+        end = start + pd.Timedelta(days=horizon - 1)
+
+        bundle = registry.get()
+        hashes = store_input_hashes(store, bundle.version)
+        window = pd.date_range(start, periods=horizon, freq='D').date
+
+        # Days of each store already forecast from its current inputs
+        current = {}
+        if not options['force']:
+            rows = SalesForecast.objects.filter(Date__range=(start.date(), end.date())).values('Store', 'Date', 'input_hash')
+            for row in rows:
+                if row['input_hash'] == hashes.get(row['Store']):
+                    current.setdefault(row['Store'], set()).add(row['Date'])
+
+        # Each store is scored from its first day without a current forecast: a changed
+        # store over the whole window, an unchanged one only over the days the window
+        # moved onto since the last run
+        by_first_day = {}
+        for store_id in hashes:
+            days = current.get(store_id, set())
+            missing = [day for day in window if day not in days]
+            if missing:
+                by_first_day.setdefault(missing[0], []).append(store_id)
+
+        forecasts = []
+        for first_day, store_ids in by_first_day.items():
+            # Every store of a group and day scored with one predict call
+            sales = Forecaster(bundle.pipeline, bundle.model, store).forecast(
+                store_ids, first_day, (end.date() - first_day).days + 1)
+            forecasts += [
+                SalesForecast(Store=store_id, Date=date, Sales=value, input_hash=hashes[store_id],
+                              model_version=bundle.version)
+                for store_id, date, value in zip(sales['Store'].tolist(), sales['Date'].dt.date.tolist(),
+                                                 sales['Sales'].tolist())
+            ]
+
+        with transaction.atomic():
+            # Forecasts outside the window, or of stores no longer in the store file, are dropped
+            pruned, _ = SalesForecast.objects.exclude(Date__range=(start.date(), end.date())).delete()
+            pruned += SalesForecast.objects.exclude(Store__in=list(hashes)).delete()[0]
+
+            for first_day, store_ids in by_first_day.items():
+                SalesForecast.objects.filter(Store__in=store_ids, Date__range=(first_day, end.date())).delete()
+            SalesForecast.objects.bulk_create(forecasts, batch_size=settings.FORECAST_BULK_BATCH_SIZE)
+
+        if not forecasts:
+            self.stdout.write(f"All forecasts are up to date, pruned {pruned} old ones")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecasted {len(forecasts)} store days of {sum(map(len, by_first_day.values()))} of {len(hashes)} "
+            f"stores from {start.date()} to {end.date()}, pruned {pruned} old ones"
+        ))
@@ -0,0 +1,204 @@
+import time
+import queue
+import threading
+import collections
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+from django.conf import settings
+
+
+class MicroBatcher:
+    '''
+    Gathers concurrent single-record predictions into one preprocess and predict call.
+
+    Callers block in `predict` while a background thread collects the records that
+    arrive within `max_wait` seconds of the first one (or until `max_batch_size`
+    records are waiting), scores them together and hands each caller its own result.
+    Records served by different model bundles are scored separately.
+
+    Parameters:
+    -----------
+        max_batch_size(int): Most records scored by one predict call
+        max_wait(float): Seconds the first record of a batch waits for others
+        metrics_window(int): Number of recent requests the latency percentiles cover
+        timeout(float): Seconds a caller waits for its prediction before giving up
+    '''
+
+    def __init__(self, max_batch_size: int = 64, max_wait: float = 0.003, metrics_window: int = 10_000,
+                 timeout: float = 30.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=metrics_window)
+        self._finished = collections.deque(maxlen=metrics_window)
+        self._batch_sizes = collections.deque(maxlen=metrics_window)
+        self.requests = 0
+        self.batches = 0
+
+
+    @classmethod
+    def from_settings(cls):
+        return cls(settings.MICRO_BATCH_MAX_SIZE, settings.MICRO_BATCH_MAX_WAIT, timeout=settings.MICRO_BATCH_TIMEOUT)
+
+
+    def submit(self, bundle, record: dict) -> Future:
+        '''
+        Queues a record for the next batch and returns the future of its prediction
+        '''
+        self._ensure_worker()
+
+        future = Future()
+        self._queue.put((bundle, record, future, time.perf_counter()))
+
+        return future
+
+
+    def predict(self, bundle, record: dict) -> float:
+        future = self.submit(bundle, record)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise TimeoutError(f"No prediction after {self.timeout}s, try again later")
+
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._collect()
+
+                by_bundle = {}
+                for item in batch:
+                    by_bundle.setdefault(id(item[0]), []).append(item)
+
+                for items in by_bundle.values():
+                    try:
+                        self._score(items)
+                    except Exception as e:
+                        self._fail(items, e)
+        except BaseException as e:
+            # The next submit starts a new worker, the records queued so far fail instead of hanging
+            error = RuntimeError(f"Micro-batcher worker stopped: {e!r}")
+            self._fail(batch, error)
+            while True:
+                try:
+                    self._fail([self._queue.get_nowait()], error)
+                except queue.Empty:
+                    break
+            raise
+
+
+    @staticmethod
+    def _fail(items: list, error: Exception):
+        for _, _, future, _ in items:
+            if not future.done():
+                future.set_exception(error)
+
+
+    def _score(self, items: list):
+        bundle = items[0][0]
+        records = [item[1] for item in items]
+
+        try:
+            predictions = bundle.model.predict(bundle.transform_records(records))
+            if len(predictions) != len(records):
+                # e.g. an outlier step of the fallback pipeline dropped rows, they can't be matched back
+                raise ValueError(f"{len(predictions)} predictions for {len(records)} records")
+            results = [(float(prediction), None) for prediction in predictions]
+        except Exception:
+            # One bad record mustn't fail the whole batch, score them one by one to find it
+            results = [self._score_one(bundle, record) for record in records]
+
+        now = time.perf_counter()
+        for (_, _, future, _), (prediction, error) in zip(items, results, strict=True):
+            # A caller that timed out has cancelled its future
+            if not future.set_running_or_notify_cancel():
+                continue
+            if error is None:
+                future.set_result(prediction)
+            else:
+                future.set_exception(error)
+
+        with self._stats_lock:
+            self.requests += len(items)
+            self.batches += 1
+            self._batch_sizes.append(len(items))
+            for _, _, _, submitted in items:
+                self._latencies.append(now - submitted)
+                self._finished.append(now)
+
+
+    @staticmethod
+    def _score_one(bundle, record: dict):
+        try:
+            predictions = bundle.model.predict(bundle.transform_record(record))
+            if len(predictions) != 1:
+                raise ValueError("The pipeline dropped the record, it can't be scored")
+            return float(predictions[0]), None
+        except Exception as e:
+            return None, e
+
+
+    def stats(self) -> dict:
+        '''
+        Latency percentiles, throughput and batch sizes over the recent requests
+        '''
+        with self._stats_lock:
+            latencies = np.array(self._latencies)
+            finished = np.array(self._finished)
+            batch_sizes = np.array(self._batch_sizes)
+            requests, batches = self.requests, self.batches
+
+        stats = {
+            'requests': requests,
+            'batches': batches,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+        if len(latencies):
+            elapsed = finished.max() - (finished.min() - latencies[finished.argmin()])
+            stats.update({
+                'latency_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3),
+                'latency_p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 3),
+                'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+                'mean_batch_size': round(float(batch_sizes.mean()), 2),
+            })
+
+        return stats
+
+
+micro_batcher = MicroBatcher.from_settings()
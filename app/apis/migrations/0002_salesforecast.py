@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Store', models.IntegerField()),
+                ('Date', models.DateField()),
+                ('Sales', models.FloatField()),
+                ('input_hash', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Store', 'Date'), name='unique_forecast_store_date')],
+            },
+        ),
+    ]
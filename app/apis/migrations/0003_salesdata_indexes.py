@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0002_salesforecast'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesdata',
+            index=models.Index(fields=['Store', 'Date'], name='salesdata_store_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesdata',
+            index=models.Index(fields=['Date', 'Store'], name='salesdata_date_store_idx'),
+        ),
+    ]
@@ -0,0 +1,314 @@
+import os
+import sys
+import copy
+import glob
+import time
+import logging
+import threading
+
+import joblib
+import psutil
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# The pickled pipeline references the custom transformers, which live next to the notebooks
+if str(settings.SCRIPTS_DIR) not in sys.path:
+    sys.path.append(str(settings.SCRIPTS_DIR))
+
+from Inference_Plan import InferencePlan
+from Model_IO import NATIVE_FORMATS, METADATA_SUFFIX, load_model, read_metadata
+from Tree_Predictor import FlatTreePredictor
+
+
+class LoadedArtifact:
+    '''
+    A single loaded artifact together with the numbers describing its load
+
+    Parameters:
+    -----------
+        path(str): File the artifact was loaded from
+        obj: The loaded object
+        mtime(float): Modification time of the file when it was loaded
+        load_time(float): Seconds spent reading and deserializing the file
+        memory(int): Growth of the process RSS in bytes caused by the load
+    '''
+
+    def __init__(self, path: str, obj, mtime: float, load_time: float, memory: int):
+        self.path = path
+        self.obj = obj
+        self.mtime = mtime
+        self.load_time = load_time
+        self.memory = memory
+
+
+    @classmethod
+    def load(cls, path: str):
+        process = psutil.Process()
+        mtime = os.path.getmtime(path)
+        rss_before = process.memory_info().rss
+        start = time.perf_counter()
+
+        # Boosters saved by Model_IO.save_model load through XGBoost's own parser, the
+        # preprocessing pipeline and older models are pickles
+        if os.path.splitext(path)[1].lower() in NATIVE_FORMATS:
+            obj = load_model(path)
+        else:
+            obj = joblib.load(path)
+
+        load_time = time.perf_counter() - start
+        memory = max(process.memory_info().rss - rss_before, 0)
+        logger.info(f"Loaded {os.path.basename(path)} in {load_time:.3f}s using {memory / 1024 ** 2:.1f} MB")
+
+        return cls(path, obj, mtime, load_time, memory)
+
+
+    def info(self) -> dict:
+        info = {
+            'path': self.path,
+            'file_size': os.path.getsize(self.path) if os.path.exists(self.path) else None,
+            'mtime': self.mtime,
+            'load_time': round(self.load_time, 4),
+            'memory': self.memory,
+        }
+
+        metadata = read_metadata(self.path) if os.path.splitext(self.path)[1].lower() in NATIVE_FORMATS else {}
+        if metadata:
+            info['metadata'] = {key: metadata.get(key) for key in ('format', 'estimator', 'xgboost_version', 'created', 'n_features')}
+
+        return info
+
+
+def load_model_artifact(path: str) -> LoadedArtifact:
+    '''
+    Loads a model the way the API serves it, with capped threads and the configured predictor
+    '''
+    model = LoadedArtifact.load(path)
+
+    # Cap the threads of every predict call, the async views run several of them at once
+    if settings.XGBOOST_NTHREAD and hasattr(model.obj, 'set_params'):
+        model.obj.set_params(n_jobs=settings.XGBOOST_NTHREAD)
+
+    if settings.MODEL_PREDICTOR == 'flat' and hasattr(model.obj, 'get_booster'):
+        try:
+            model.obj = FlatTreePredictor.from_model(model.obj)
+            logger.info(f"Serving {os.path.basename(path)} with the flattened tree predictor")
+        except ValueError as e:
+            logger.warning(f"Serving {os.path.basename(path)} through the booster, it can't be flattened: {e}")
+
+    return model
+
+
+class ModelBundle:
+    '''
+    The (preprocessing pipeline, model) pair served by the API
+
+    Parameters:
+    -----------
+        pipeline(LoadedArtifact): The fitted preprocessing pipeline
+        model(LoadedArtifact): The fitted regressor
+    '''
+
+    def __init__(self, pipeline: LoadedArtifact, model: LoadedArtifact):
+        self.pipeline_artifact = pipeline
+        self.model_artifact = model
+        self._plan = None
+        self._plan_compiled = False
+        self._capped = {}
+
+
+    @property
+    def pipeline(self):
+        return self.pipeline_artifact.obj
+
+
+    @property
+    def model(self):
+        return self.model_artifact.obj
+
+
+    @property
+    def plan(self):
+        '''
+        The pipeline compiled into an InferencePlan for single records, None when
+        the pipeline holds a step that can't be compiled
+        '''
+        if not self._plan_compiled:
+            try:
+                self._plan = InferencePlan.from_pipeline(self.pipeline)
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"Serving single records through the pipeline, it can't be compiled: {e}")
+            self._plan_compiled = True
+
+        return self._plan
+
+
+    def transform_record(self, record: dict):
+        '''
+        Preprocesses a single record, through the compiled plan when there is one
+        '''
+        if self.plan is not None:
+            return self.plan.transform_record(record)
+
+        return self.pipeline.transform(pd.DataFrame([record]))
+
+
+    def transform_records(self, records: list):
+        '''
+        Preprocesses a list of records in one go, through the compiled plan when there is one
+        '''
+        if self.plan is not None:
+            return self.plan.transform_records(records)
+
+        return self.pipeline.transform(pd.DataFrame(records))
+
+
+    def with_model(self, model: LoadedArtifact):
+        '''
+        A bundle serving another model with the same pipeline, sharing its compiled plan
+        '''
+        bundle = ModelBundle(self.pipeline_artifact, model)
+        bundle._plan, bundle._plan_compiled = self._plan, self._plan_compiled
+
+        return bundle
+
+
+    def capped(self, nthread: int):
+        '''
+        The bundle with a copy of the model predicting on at most `nthread` XGBoost threads,
+        for the executor running several predictions at once. The copy is made once, the
+        bundle itself is returned when there is nothing to cap.
+        '''
+        if not nthread or not hasattr(self.model, 'set_params'):
+            return self
+
+        bundle = self._capped.get(nthread)
+        if bundle is None:
+            model = copy.deepcopy(self.model).set_params(n_jobs=nthread)
+            artifact = self.model_artifact
+            bundle = self.with_model(LoadedArtifact(artifact.path, model, artifact.mtime, artifact.load_time, artifact.memory))
+            # A concurrent caller may have made its own copy meanwhile, the first one stored wins
+            bundle = self._capped.setdefault(nthread, bundle)
+
+        return bundle
+
+
+    @property
+    def version(self) -> str:
+        # Both artifacts, a new pipeline changes the features even with the same model
+        return (f"{os.path.basename(self.model_artifact.path)}@{self.model_artifact.mtime:.0f}"
+                f"+{os.path.basename(self.pipeline_artifact.path)}@{self.pipeline_artifact.mtime:.0f}")
+
+
+class ModelRegistry:
+    '''
+    Process wide cache of the preprocessing pipeline and the latest model.
+
+    Every worker loads the artifacts once and hands out the same instances afterwards.
+    At most every `reload_interval` seconds the model directory is checked, and when a
+    newer model shows up (or the pipeline file changes) the bundle is swapped atomically,
+    requests already holding the old bundle finish with it.
+
+    Parameters:
+    -----------
+        model_dir(str): Directory holding the artifacts
+        pipeline_file(str): File name of the pickled preprocessing pipeline
+        model_pattern(str or list): Glob(s) matching the saved models, the newest by mtime is served
+        reload_interval(float): Seconds between two checks of the model directory
+    '''
+
+    def __init__(self, model_dir, pipeline_file: str, model_pattern: str, reload_interval: float = 30):
+        self.model_dir = str(model_dir)
+        self.pipeline_file = pipeline_file
+        self.model_pattern = model_pattern
+        self.reload_interval = reload_interval
+
+        self._bundle = None
+        self._last_check = None
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def from_settings(cls):
+        return cls(settings.MODEL_DIR, settings.PIPELINE_FILE,
+                   settings.MODEL_FILE_PATTERN, settings.MODEL_RELOAD_INTERVAL)
+
+
+    def latest_model_path(self) -> str:
+        patterns = [self.model_pattern] if isinstance(self.model_pattern, str) else self.model_pattern
+
+        candidates = [
+            path for pattern in patterns for path in glob.glob(os.path.join(self.model_dir, pattern))
+            if not path.endswith(METADATA_SUFFIX)
+        ]
+        if not candidates:
+            raise FileNotFoundError(f"No model matching `{', '.join(patterns)}` in {self.model_dir}")
+
+        return max(candidates, key=os.path.getmtime)
+
+
+    def get(self) -> ModelBundle:
+        '''
+        Returns the current bundle, loading or hot-swapping it when needed
+        '''
+        bundle = self._bundle
+        if bundle is not None and time.monotonic() - self._last_check < self.reload_interval:
+            return bundle
+
+        with self._lock:
+            if self._bundle is not None and time.monotonic() - self._last_check < self.reload_interval:
+                return self._bundle
+
+            self._bundle = self._refresh(self._bundle)
+            self._last_check = time.monotonic()
+
+            return self._bundle
+
+
+    def _refresh(self, bundle: ModelBundle) -> ModelBundle:
+        pipeline_path = os.path.join(self.model_dir, self.pipeline_file)
+        model_path = self.latest_model_path()
+
+        if bundle is None:
+            logger.info("Loading model bundle...")
+            return ModelBundle(LoadedArtifact.load(pipeline_path), self._load_model(model_path))
+
+        pipeline = bundle.pipeline_artifact
+        model = bundle.model_artifact
+
+        if os.path.getmtime(pipeline_path) != pipeline.mtime:
+            logger.info("Preprocessing pipeline changed on disk, reloading...")
+            pipeline = LoadedArtifact.load(pipeline_path)
+
+        if model_path != model.path or os.path.getmtime(model_path) != model.mtime:
+            logger.info(f"Swapping model {os.path.basename(model.path)} -> {os.path.basename(model_path)}")
+            model = self._load_model(model_path)
+
+        if pipeline is bundle.pipeline_artifact and model is bundle.model_artifact:
+            return bundle
+
+        return ModelBundle(pipeline, model)
+
+
+    def _load_model(self, path: str) -> LoadedArtifact:
+        return load_model_artifact(path)
+
+
+    def stats(self) -> dict:
+        '''
+        Load time and memory footprint of the currently served artifacts
+        '''
+        bundle = self._bundle
+        if bundle is None:
+            return {'loaded': False}
+
+        return {
+            'loaded': True,
+            'version': bundle.version,
+            'pipeline': bundle.pipeline_artifact.info(),
+            'model': bundle.model_artifact.info(),
+        }
+
+
+registry = ModelRegistry.from_settings()
@@ -48,6 +48,35 @@ class SalesData(models.Model):
     Promo2SinceYear = models.IntegerField(default=0)
     PromoInterval = models.CharField(max_length=100, choices=Promo_choice)
 
+    class Meta:
+        indexes = [
+            # Rows of one store over a date range, and of all stores on a date range
+            models.Index(fields=['Store', 'Date'], name='salesdata_store_date_idx'),
+            models.Index(fields=['Date', 'Store'], name='salesdata_date_store_idx'),
+        ]
+
+
+    def __str__(self):
+        return self.Store
+
+
+class SalesForecast(models.Model):
+    '''
+    Precomputed forecast of one store for one day, written by `manage.py precompute_forecasts`
+    '''
+
+    Store = models.IntegerField()
+    Date = models.DateField()
+    Sales = models.FloatField()
+    input_hash = models.CharField(max_length=64) # hash of the store inputs the forecast was made from
+    model_version = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['Store', 'Date'], name='unique_forecast_store_date'),
+        ]
+
 
     def __str__(self):
-        return self.Store
\ No newline at end of file
+        return f"{self.Store} {self.Date}"
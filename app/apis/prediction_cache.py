@@ -0,0 +1,119 @@
+import json
+import hashlib
+import datetime
+import threading
+
+from django import forms
+from django.core.cache import caches
+
+from .forms import SalesForm
+
+
+class PredictionCache:
+    '''
+    Caches predictions keyed on the normalized request features and the model version.
+
+    The features are validated through SalesForm, so `{"Promo": 1}` from the JSON API and
+    `Promo=1` from the form share an entry. Entries live in the `predictions` cache of
+    the Django cache framework (LRU with a TTL for the local-memory backend). The model
+    version is part of the key, so the entries of a replaced model are never served and
+    age out, and the shard models of a sharded bundle share the cache without evicting
+    each other.
+
+    Parameters:
+    -----------
+        alias(str): Name of the cache in the CACHES setting
+    '''
+
+    def __init__(self, alias: str = 'predictions'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+
+    @staticmethod
+    def normalize(features: dict):
+        '''
+        Returns the features validated through SalesForm and typed as the pipeline expects
+        them (0/1 choices as ints, the date as YYYY-MM-DD, no extra keys), None when they
+        aren't valid
+        '''
+        form = SalesForm(features)
+        if not form.is_valid():
+            return None
+
+        normalized = {}
+        for name, value in form.cleaned_data.items():
+            field = form.fields[name]
+            # ChoiceField cleans to the submitted string, even for integer choices
+            if isinstance(field, forms.ChoiceField) and all(isinstance(key, int) for key, _ in field.choices):
+                value = int(value)
+            elif isinstance(value, datetime.date):
+                value = value.isoformat()
+            normalized[name] = value
+
+        return normalized
+
+
+    @staticmethod
+    def make_key(normalized: dict, model_version: str) -> str:
+        def default(value):
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                return value.isoformat()
+            return str(value)
+
+        canonical = json.dumps(normalized, sort_keys=True, default=default)
+        digest = hashlib.sha256(f"{model_version}|{canonical}".encode()).hexdigest()
+
+        return f"prediction:{digest}"
+
+
+    def get_or_predict(self, features: dict, model_version: str, predict):
+        '''
+        Returns the cached prediction for the features or computes and stores it
+
+        Parameters:
+        -----------
+            features(dict): Raw request features
+            model_version(str): Version of the model that makes the prediction
+            predict(callable): Computes the prediction of a features dict on a cache miss,
+                called with the normalized features the key was built from
+        '''
+        normalized = self.normalize(features)
+        if normalized is None:
+            # Invalid input isn't cached, the pipeline reports the error
+            return predict(features)
+
+        key = self.make_key(normalized, model_version)
+        prediction = self.cache.get(key)
+
+        with self._lock:
+            if prediction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if prediction is None:
+            prediction = predict(normalized)
+            self.cache.set(key, prediction)
+
+        return prediction
+
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+prediction_cache = PredictionCache()
@@ -1,8 +1,14 @@
 from rest_framework import serializers
 
-from .models import SalesData
+from .models import SalesData, SalesForecast
 
 class SalesDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = SalesData
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class SalesForecastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SalesForecast
+        fields = ['Store', 'Date', 'Sales', 'model_version']
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import logging
+import threading
+import collections
+
+import numpy as np
+from django.conf import settings
+
+from .model_registry import LoadedArtifact, ModelBundle, load_model_artifact
+
+from Sharded_Training import MANIFEST_FILE, shard_key
+
+logger = logging.getLogger(__name__)
+
+
+class ShardRouter:
+    '''
+    Serves a bundle written by Sharded_Training.ShardedTrainer: each request is scored by
+    the model of its store (or store cluster).
+
+    The manifest, the shared pipeline and the global fallback model are loaded on the
+    first request. Shard models are loaded when a request first needs them and kept in
+    an LRU of `cache_size` models, so a bundle of 1,115 stores doesn't have to fit in
+    the memory of every worker. Requests of shards without a model of their own, or
+    whose model file can't be loaded, go to the fallback.
+
+    A shard file that fails to load is served by the fallback and retried after
+    `retry_delay` seconds, doubling up to `max_retry_delay` while it keeps failing.
+
+    Parameters:
+    -----------
+        shard_dir(str): Directory of the sharded bundle (holding manifest.json)
+        cache_size(int): Most shard models kept loaded
+        retry_delay(float): Seconds before the first retry of a shard that failed to load
+        max_retry_delay(float): Longest wait between two retries
+    '''
+
+    def __init__(self, shard_dir, cache_size: int = 64, retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+        self.shard_dir = str(shard_dir) if shard_dir else None
+        self.cache_size = cache_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._manifest = None
+        self._fallback = None
+        self._shards = collections.OrderedDict()
+        self._failures = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    @classmethod
+    def from_settings(cls):
+        return cls(settings.MODEL_SHARD_DIR, settings.MODEL_SHARD_CACHE_SIZE)
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_dir is not None
+
+
+    def _load_bundle(self):
+        with self._lock:
+            if self._fallback is not None:
+                return
+
+            with open(os.path.join(self.shard_dir, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+
+            logger.info(f"Loading sharded bundle of {len(manifest['shards'])} shards from {self.shard_dir}")
+            pipeline = LoadedArtifact.load(os.path.join(self.shard_dir, manifest['pipeline']))
+            self._fallback = ModelBundle(pipeline, load_model_artifact(os.path.join(self.shard_dir, manifest['fallback'])))
+            # Compiled once here, the shard bundles share the plan of the fallback
+            self._fallback.plan
+            self._manifest = manifest
+
+
+    def get(self, record: dict) -> ModelBundle:
+        '''
+        Returns the bundle serving a record, loading its shard model when needed
+        '''
+        if self._fallback is None:
+            self._load_bundle()
+
+        try:
+            file_name = self._manifest['shards'].get(shard_key(record, self._manifest['by']))
+        except KeyError as e:
+            raise ValueError(f"Missing {e.args[0]}, the model is sharded on it")
+
+        if file_name is None:
+            return self._fallback
+
+        with self._lock:
+            bundle = self._shards.get(file_name)
+            if bundle is not None:
+                self._shards.move_to_end(file_name)
+                self.hits += 1
+                return bundle
+
+            retry_at, delay = self._failures.get(file_name, (None, None))
+            if retry_at is not None and time.monotonic() < retry_at:
+                return self._fallback
+
+        # Loaded outside the lock so requests of cached shards don't wait for it
+        try:
+            bundle = self._fallback.with_model(load_model_artifact(os.path.join(self.shard_dir, file_name)))
+        except Exception as e:
+            # A missing or corrupt shard file is served by the fallback rather than failing
+            # every request of the store, it is only retried once the backoff expires
+            delay = min(delay * 2, self.max_retry_delay) if delay else self.retry_delay
+            logger.error(f"Shard model {file_name} can't be loaded, serving the global model for {delay:.0f}s: {e}")
+            with self._lock:
+                self._failures[file_name] = (time.monotonic() + delay, delay)
+            return self._fallback
+
+        with self._lock:
+            self._failures.pop(file_name, None)
+            self.misses += 1
+            self._shards[file_name] = bundle
+            self._shards.move_to_end(file_name)
+            while len(self._shards) > self.cache_size:
+                self._shards.popitem(last=False)
+                self.evictions += 1
+
+        return bundle
+
+
+    def predict_frame(self, data, nthread: int = None) -> np.ndarray:
+        '''
+        Predicts a DataFrame of records, preprocessed once and scored shard by shard,
+        with at most `nthread` XGBoost threads when it is given
+        '''
+        if self._fallback is None:
+            self._load_bundle()
+
+        by = self._manifest['by']
+        missing = [col for col in by if col not in data.columns]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)}, the model is sharded on it")
+
+        X = self._fallback.pipeline.transform(data)
+        y_pred = np.empty(len(data), dtype=np.float32)
+        for values, index in data.reset_index(drop=True).groupby(by, sort=False, dropna=False).indices.items():
+            record = dict(zip(by, values if isinstance(values, tuple) else (values,)))
+            y_pred[index] = self.get(record).capped(nthread).model.predict(X[index])
+
+        return y_pred
+
+
+    def stats(self) -> dict:
+        '''
+        Shards in the manifest, shards loaded and the LRU counters
+        '''
+        if self._manifest is None:
+            return {'enabled': self.enabled, 'loaded': False}
+
+        with self._lock:
+            return {
+                'enabled': True,
+                'loaded': True,
+                'by': self._manifest['by'],
+                'shards': len(self._manifest['shards']),
+                'cached': len(self._shards),
+                'cache_size': self.cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+shard_router = ShardRouter.from_settings()
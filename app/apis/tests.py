@@ -1,3 +1,809 @@
-from django.test import TestCase
+import os
+import json
+import time
+import tempfile
+import threading
+from io import StringIO
+from unittest.mock import patch, MagicMock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.test import TestCase, AsyncClient, override_settings
+from rest_framework.test import APIClient
+
+from .model_registry import ModelRegistry
+from .prediction_cache import PredictionCache
+from .executor import BoundedExecutor, ExecutorBusy, default_workers
+from .micro_batcher import MicroBatcher
+from .shard_router import ShardRouter
+from .models import SalesData, SalesForecast
+
+
+class TestModelRegistry(TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.model_dir = self.tmp_dir.name
+
+        joblib.dump({'name': 'pipeline'}, os.path.join(self.model_dir, 'preprocessing_pipeline.pkl'))
+        self.dump_model('model_01-01-2024-00-00-00.pkl', 'old', mtime=1_000_000)
+
+        self.registry = ModelRegistry(self.model_dir, 'preprocessing_pipeline.pkl', 'model_*.pkl', reload_interval=0)
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def dump_model(self, file_name, name, mtime):
+        path = os.path.join(self.model_dir, file_name)
+        joblib.dump({'name': name}, path)
+        os.utime(path, (mtime, mtime))
+
+
+    def test_get_returns_shared_instance(self):
+        '''
+        The artifacts are loaded once and the same objects are handed out afterwards
+        '''
+
+        first = self.registry.get()
+        second = self.registry.get()
+
+        self.assertIs(first, second)
+        self.assertIs(first.model, second.model)
+        self.assertEqual(first.pipeline['name'], 'pipeline')
+
+
+    def test_hot_swap_newer_model(self):
+        '''
+        A newer model file replaces the served model while the pipeline is kept
+        '''
+
+        first = self.registry.get()
+        self.dump_model('model_02-01-2024-00-00-00.pkl', 'new', mtime=2_000_000)
+        second = self.registry.get()
+
+        self.assertEqual(first.model['name'], 'old')
+        self.assertEqual(second.model['name'], 'new')
+        self.assertIs(first.pipeline, second.pipeline)
+
+
+    def test_version_follows_pipeline(self):
+        '''
+        A replaced pipeline changes the bundle version, even with the same model
+        '''
+
+        first = self.registry.get().version
+        path = os.path.join(self.model_dir, 'preprocessing_pipeline.pkl')
+        joblib.dump({'name': 'new pipeline'}, path)
+        os.utime(path, (3_000_000, 3_000_000))
+
+        self.assertNotEqual(self.registry.get().version, first)
+
+
+    def test_reload_interval(self):
+        '''
+        Within the reload interval the model directory is not checked again
+        '''
+
+        self.registry.reload_interval = 3600
+        first = self.registry.get()
+        self.dump_model('model_02-01-2024-00-00-00.pkl', 'new', mtime=time.time())
+
+        self.assertEqual(self.registry.get().model['name'], 'old')
+        self.assertIs(self.registry.get(), first)
+
+
+    def test_stats(self):
+        '''
+        Load time and memory are reported for both artifacts
+        '''
+
+        self.assertFalse(self.registry.stats()['loaded'])
+        self.registry.get()
+        stats = self.registry.stats()
+
+        self.assertTrue(stats['loaded'])
+        for artifact in ['pipeline', 'model']:
+            self.assertGreaterEqual(stats[artifact]['load_time'], 0)
+            self.assertGreaterEqual(stats[artifact]['memory'], 0)
+
+
+    def test_native_model(self):
+        '''
+        A model saved in the native format is picked over an older pickle, its sidecar is ignored
+        '''
+
+        from xgboost import XGBRegressor
+        from Model_IO import save_model
+
+        X = np.random.default_rng(0).random((50, 3))
+        path = os.path.join(self.model_dir, 'model_02-01-2024-00-00-00.ubj')
+        save_model(XGBRegressor(n_estimators=5).fit(X, X[:, 0]), path)
+        os.utime(path, (2_000_000, 2_000_000))
+
+        self.registry.model_pattern = ['model_*.ubj', 'model_*.json', 'model_*.pkl']
+        bundle = self.registry.get()
+
+        self.assertEqual(bundle.model_artifact.path, path)
+        self.assertEqual(bundle.model.predict(X).shape, (50,))
+        self.assertEqual(self.registry.stats()['model']['metadata']['format'], 'ubjson')
+
+
+    @override_settings(MODEL_PREDICTOR='flat')
+    def test_flat_predictor(self):
+        '''
+        With the flat predictor setting the booster is served through FlatTreePredictor
+        '''
+
+        from xgboost import XGBRegressor
+        from Tree_Predictor import FlatTreePredictor
+
+        X = np.random.default_rng(0).random((50, 3))
+        model = XGBRegressor(n_estimators=5).fit(X, X[:, 0])
+        joblib.dump(model, os.path.join(self.model_dir, 'model_02-01-2024-00-00-00.pkl'))
+
+        bundle = self.registry.get()
+
+        self.assertIsInstance(bundle.model, FlatTreePredictor)
+        np.testing.assert_allclose(bundle.model.predict(X), model.predict(X), rtol=1e-6)
+
+
+class TestBatchPredict(TestCase):
+
+    def setUp(self):
+
+        self.row = {
+            'Store': 1, 'DayOfWeek': 5, 'Date': '2015-07-31', 'Open': 1, 'Promo': 1,
+            'StateHoliday': '0', 'SchoolHoliday': 1, 'StoreType': 'c', 'Assortment': 'a',
+            'CompetitionDistance': 1270.0, 'CompetitionOpenSinceMonth': 9, 'CompetitionOpenSinceYear': 2008,
+            'Promo2': 0, 'Promo2SinceWeek': 0, 'Promo2SinceYear': 0, 'PromoInterval': 'Jan,Apr,Jul,Oct'
+        }
+        self.client = APIClient()
+
+        bundle = MagicMock()
+        bundle.pipeline.transform.side_effect = lambda data: data[['Store']].to_numpy()
+        bundle.model.predict.side_effect = lambda X: X[:, 0] * 100.0
+        bundle.capped.return_value = bundle
+        self.bundle = bundle
+
+
+    @override_settings(PREDICT_BATCH_CHUNK_SIZE=2)
+    def test_batch_predict_json(self):
+        '''
+        All rows are scored with a single predict call and streamed back in order
+        '''
+
+        rows = [dict(self.row, Store=store) for store in range(1, 6)]
+
+        with patch('apis.views.registry') as registry:
+            registry.get.return_value = self.bundle
+            response = self.client.post('/status/batch/', rows, format='json')
+            body = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.bundle.model.predict.call_count, 1)
+        self.assertListEqual([row['Sales'] for row in body], [100.0, 200.0, 300.0, 400.0, 500.0])
+        self.assertEqual(body[0]['Date'], '2015-07-31')
+
+
+    @override_settings(PREDICT_BATCH_MAX_ROWS=2)
+    def test_batch_predict_too_large(self):
+        '''
+        Batches over the configured maximum are rejected
+        '''
+
+        response = self.client.post('/status/batch/', [self.row] * 3, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_batch_predict_missing_columns(self):
+        '''
+        Rows without every SalesData column are rejected
+        '''
+
+        row = {col: value for col, value in self.row.items() if col != 'Promo'}
+        response = self.client.post('/status/batch/', [row], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Promo', response.data)
+
+
+class TestAsyncPredict(TestCase):
+
+    def setUp(self):
+
+        self.row = {
+            'Store': 1, 'DayOfWeek': 5, 'Date': '2015-07-31', 'Open': 1, 'Promo': 1,
+            'StateHoliday': '0', 'SchoolHoliday': 1, 'StoreType': 'c', 'Assortment': 'a',
+            'CompetitionDistance': 1270.0, 'CompetitionOpenSinceMonth': 9, 'CompetitionOpenSinceYear': 2008,
+            'Promo2': 0, 'Promo2SinceWeek': 0, 'Promo2SinceYear': 0, 'PromoInterval': 'Jan,Apr,Jul,Oct'
+        }
+        self.client = AsyncClient()
+
+        bundle = MagicMock()
+        bundle.pipeline.transform.side_effect = lambda data: data[['Store']].to_numpy()
+        bundle.model.predict.side_effect = lambda X: X[:, 0] * 100.0
+        bundle.capped.return_value = bundle
+        self.bundle = bundle
+
+
+    def test_executor_backpressure(self):
+        '''
+        Submits beyond the workers and the queue are refused until a slot frees up
+        '''
+
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        running = executor.submit(release.wait)
+        queued = executor.submit(lambda: 1)
+        with self.assertRaises(ExecutorBusy):
+            executor.submit(lambda: 2)
+
+        release.set()
+        running.result(timeout=5)
+        queued.result(timeout=5)
+        self.assertEqual(executor.submit(lambda: 3).result(timeout=5), 3)
+
+
+    def test_default_workers(self):
+        '''
+        Workers times XGBoost threads stay within the cores, with at least one worker
+        '''
+
+        with patch('apis.executor.os.cpu_count', return_value=8):
+            self.assertEqual(default_workers(1), 8)
+            self.assertEqual(default_workers(4), 2)
+            self.assertEqual(default_workers(16), 1)
+            self.assertEqual(default_workers(None), 1)
+
+
+    def test_capped_model_copy(self):
+        '''
+        The executor's bundle predicts with a thread capped copy of the model, made once
+        '''
+
+        from xgboost import XGBRegressor
+        from .model_registry import LoadedArtifact, ModelBundle
+
+        X = np.random.default_rng(0).random((50, 3))
+        model = XGBRegressor(n_estimators=5).fit(X, X[:, 0])
+        bundle = ModelBundle(LoadedArtifact('pipeline.pkl', None, 0, 0, 0), LoadedArtifact('model.ubj', model, 0, 0, 0))
+
+        capped = bundle.capped(1)
+
+        self.assertIs(bundle.capped(1), capped)
+        self.assertIs(bundle.capped(None), bundle)
+        self.assertEqual(capped.model.n_jobs, 1)
+        self.assertIsNone(bundle.model.n_jobs)
+        self.assertEqual(capped.version, bundle.version)
+        np.testing.assert_allclose(capped.model.predict(X), model.predict(X))
+
+
+    async def test_async_batch_predict(self):
+        '''
+        The async batch view scores the rows on the executor and streams them back
+        '''
+
+        rows = [dict(self.row, Store=store) for store in range(1, 4)]
+
+        with patch('apis.views.registry') as registry:
+            registry.get.return_value = self.bundle
+            response = await self.client.post('/status/batch/async/', rows, content_type='application/json')
+            body = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([row['Sales'] for row in body], [100.0, 200.0, 300.0])
+
+
+    async def test_async_predict_shares_sync_path(self):
+        '''
+        The async single prediction is scored like the sync one, through _predict_record
+        '''
+
+        with patch('apis.views.registry') as registry, patch('apis.views._predict_record', return_value=4321.0) as predict:
+            registry.get.return_value = self.bundle
+            response = await self.client.post('/status/async/', self.row, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('4321', json.loads(response.content))
+        self.assertIs(predict.call_args.args[0], self.bundle)
+
+
+    @override_settings(PREDICT_RETRY_AFTER=7)
+    async def test_async_predict_busy(self):
+        '''
+        A full executor answers 503 with a Retry-After header
+        '''
+
+        with patch('apis.views.registry') as registry, patch('apis.views.predict_executor') as executor:
+            registry.get.return_value = self.bundle
+            executor.submit.side_effect = ExecutorBusy('busy')
+            response = await self.client.post('/status/async/', self.row, content_type='application/json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+
+class TestMicroBatcher(TestCase):
+
+    def setUp(self):
+
+        def transform_records(records):
+            if any(record['Store'] < 0 for record in records):
+                raise ValueError("Unknown store")
+            return np.array([[record['Store']] for record in records], dtype=float)
+
+        bundle = MagicMock()
+        bundle.transform_records.side_effect = transform_records
+        bundle.transform_record.side_effect = lambda record: transform_records([record])
+        bundle.model.predict.side_effect = lambda X: X[:, 0] * 100.0
+        self.bundle = bundle
+
+
+    def test_concurrent_records_share_predict(self):
+        '''
+        Records submitted within the window are scored by one predict call
+        '''
+
+        batcher = MicroBatcher(max_batch_size=8, max_wait=0.2)
+        futures = [batcher.submit(self.bundle, {'Store': store}) for store in range(1, 6)]
+
+        self.assertListEqual([future.result(timeout=5) for future in futures], [100.0, 200.0, 300.0, 400.0, 500.0])
+        self.assertEqual(self.bundle.model.predict.call_count, 1)
+
+        stats = batcher.stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['batches'], 1)
+        self.assertIn('latency_p99_ms', stats)
+
+
+    def test_max_batch_size(self):
+        '''
+        A full batch is scored without waiting for the window to close
+        '''
+
+        batcher = MicroBatcher(max_batch_size=2, max_wait=10)
+        futures = [batcher.submit(self.bundle, {'Store': store}) for store in range(1, 5)]
+
+        self.assertListEqual([future.result(timeout=5) for future in futures], [100.0, 200.0, 300.0, 400.0])
+        self.assertEqual(batcher.stats()['batches'], 2)
+
+
+    def test_failing_record_isolated(self):
+        '''
+        A record the pipeline rejects fails alone, the rest of its batch succeeds
+        '''
+
+        batcher = MicroBatcher(max_batch_size=8, max_wait=0.2)
+        good = batcher.submit(self.bundle, {'Store': 3})
+        bad = batcher.submit(self.bundle, {'Store': -1})
+
+        self.assertEqual(good.result(timeout=5), 300.0)
+        with self.assertRaises(ValueError):
+            bad.result(timeout=5)
+
+
+    def test_dropped_rows_fail_their_records(self):
+        '''
+        Rows dropped by the pipeline fail their own records instead of leaving them pending
+        '''
+
+        # Drops the rows of negative stores, as an outlier step would
+        self.bundle.transform_records.side_effect = lambda records: np.array(
+            [[record['Store']] for record in records if record['Store'] >= 0], dtype=float)
+        batcher = MicroBatcher(max_batch_size=8, max_wait=0.2)
+        good = batcher.submit(self.bundle, {'Store': 3})
+        dropped = batcher.submit(self.bundle, {'Store': -1})
+
+        self.assertEqual(good.result(timeout=5), 300.0)
+        with self.assertRaises(ValueError):
+            dropped.result(timeout=5)
+
+
+    def test_predict_timeout(self):
+        '''
+        A caller gives up after the timeout instead of waiting forever
+        '''
+
+        batcher = MicroBatcher(max_batch_size=8, max_wait=0.2, timeout=0.01)
+
+        with self.assertRaises(TimeoutError):
+            batcher.predict(self.bundle, {'Store': 1})
+
+
+class TestSalesDataView(TestCase):
+
+    def setUp(self):
+
+        self.row = {
+            'Store': 1, 'DayOfWeek': 5, 'Date': '2015-07-31', 'Open': 1, 'Promo': 1,
+            'StateHoliday': '0', 'SchoolHoliday': 1, 'StoreType': 'c', 'Assortment': 'a',
+            'CompetitionDistance': 1270.0, 'CompetitionOpenSinceMonth': 9, 'CompetitionOpenSinceYear': 2008,
+            'Promo2': 0, 'Promo2SinceWeek': 0, 'Promo2SinceYear': 0, 'PromoInterval': 'Jan,Apr,Jul,Oct'
+        }
+        self.client = APIClient()
+
+
+    @override_settings(SALES_DATA_BULK_BATCH_SIZE=2)
+    def test_bulk_create(self):
+        '''
+        Every row of the array is inserted
+        '''
+
+        rows = [dict(self.row, Store=store) for store in range(1, 6)]
+        response = self.client.post('/apis/bulk/', rows, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(SalesData.objects.count(), 5)
+
+
+    def test_bulk_create_invalid_row(self):
+        '''
+        A single invalid row rejects the whole array
+        '''
+
+        rows = [self.row, dict(self.row, Promo=5)]
+        response = self.client.post('/apis/bulk/', rows, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SalesData.objects.count(), 0)
+
+
+    def test_filtered_cursor_pages(self):
+        '''
+        Store/date filters apply and the listing is walked page by page through the cursor
+        '''
+
+        rows = [dict(self.row, Store=store, Date=f'2015-07-{day:02d}') for store in range(1, 4) for day in range(1, 11)]
+        self.client.post('/apis/bulk/', rows, format='json')
+
+        url, stores, dates = '/apis/?store=1,3&start=2015-07-03&end=2015-07-06&page_size=3', set(), []
+        while url:
+            page = self.client.get(url).data
+            self.assertLessEqual(len(page['results']), 3)
+            stores.update(row['Store'] for row in page['results'])
+            dates.extend(row['Date'] for row in page['results'])
+            url = page['next']
+
+        self.assertSetEqual(stores, {1, 3})
+        self.assertEqual(len(dates), 8)
+        self.assertEqual(min(dates), '2015-07-03')
+        self.assertEqual(max(dates), '2015-07-06')
+
+        self.assertEqual(self.client.get('/apis/?date=July').status_code, 400)
+
+
+class TestPredictionCache(TestCase):
+
+    def setUp(self):
+
+        self.row = {
+            'Store': 1, 'DayOfWeek': 5, 'Date': '2015-07-31', 'Open': 1, 'Promo': 1,
+            'StateHoliday': '0', 'SchoolHoliday': 1, 'StoreType': 'c', 'Assortment': 'a',
+            'CompetitionDistance': 1270.0, 'CompetitionOpenSinceMonth': 9, 'CompetitionOpenSinceYear': 2008,
+            'Promo2': 0, 'Promo2SinceWeek': 0, 'Promo2SinceYear': 0, 'PromoInterval': 'Jan,Apr,Jul,Oct'
+        }
+        self.cache = PredictionCache()
+        self.cache.cache.clear()
+
+
+    def test_hit_on_normalized_features(self):
+        '''
+        The same features sent as JSON numbers or form strings share one entry
+        '''
+
+        predict = MagicMock(return_value=5263.0)
+        form_row = {col: str(value) for col, value in self.row.items()}
+
+        first = self.cache.get_or_predict(self.row, 'model_a', predict)
+        second = self.cache.get_or_predict(form_row, 'model_a', predict)
+
+        self.assertEqual(first, second)
+        self.assertEqual(predict.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+
+    def test_predicts_normalized_features(self):
+        '''
+        The prediction is made on the normalized features the entry is keyed on
+        '''
+
+        predict = MagicMock(return_value=5263.0)
+        form_row = dict({col: str(value) for col, value in self.row.items()}, extra='ignored')
+
+        self.cache.get_or_predict(form_row, 'model_a', predict)
+        features = predict.call_args.args[0]
+
+        self.assertNotIn('extra', features)
+        self.assertEqual(features['Store'], 1)
+        self.assertEqual(features['Promo'], 1)
+        self.assertEqual(features['StateHoliday'], '0')
+        self.assertEqual(features['Date'], '2015-07-31')
+
+
+    def test_model_change_invalidates(self):
+        '''
+        A new model version doesn't serve the predictions of the old one
+        '''
+
+        self.cache.get_or_predict(self.row, 'model_a', lambda features: 1.0)
+        result = self.cache.get_or_predict(self.row, 'model_b', lambda features: 2.0)
+
+        self.assertEqual(result, 2.0)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+
+    def test_versions_share_cache(self):
+        '''
+        Alternating model versions, e.g. the shards of two stores, keep each other's entries
+        '''
+
+        predict = MagicMock(return_value=1.0)
+        for version in ['shard_a', 'shard_b', 'shard_a', 'shard_b']:
+            self.cache.get_or_predict(self.row, version, predict)
+
+        self.assertEqual(predict.call_count, 2)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+
+    def test_invalid_features_not_cached(self):
+        '''
+        Features that don't validate are always predicted
+        '''
+
+        predict = MagicMock(return_value=1.0)
+        row = dict(self.row, StoreType='z')
+
+        self.cache.get_or_predict(row, 'model_a', predict)
+        self.cache.get_or_predict(row, 'model_a', predict)
+
+        self.assertEqual(predict.call_count, 2)
+
+
+class TestPrecomputeForecasts(TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_file = os.path.join(self.tmp_dir.name, 'store.csv')
+        self.store = pd.DataFrame({
+            'Store': [1, 2, 3], 'StoreType': ['c', 'a', 'a'], 'Assortment': ['a', 'a', 'c'],
+            'CompetitionDistance': [1270.0, 570.0, None], 'CompetitionOpenSinceMonth': [9.0, 11.0, None],
+            'CompetitionOpenSinceYear': [2008.0, 2007.0, None], 'Promo2': [0, 1, 1],
+            'Promo2SinceWeek': [None, 13.0, 14.0], 'Promo2SinceYear': [None, 2010.0, 2011.0],
+            'PromoInterval': [None, 'Jan,Apr,Jul,Oct', 'Jan,Apr,Jul,Oct']
+        })
+        self.store.to_csv(self.store_file, index=False)
+
+        self.bundle = MagicMock()
+        self.bundle.version = 'model_a'
+        self.bundle.pipeline.transform.side_effect = lambda data: data[['Store', 'DayOfWeek']].to_numpy()
+        self.bundle.model.predict.side_effect = lambda X: X[:, 0] * 1000.0 + X[:, 1]
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def precompute(self, start='2015-08-01'):
+        with patch('apis.management.commands.precompute_forecasts.registry') as registry:
+            registry.get.return_value = self.bundle
+            call_command('precompute_forecasts', store_file=self.store_file, start=start, horizon=7, stdout=StringIO())
+
+
+    def test_precompute_all_stores(self):
+        '''
+        Every store is scored for every day with a single predict call
+        '''
+
+        self.precompute()
+
+        self.assertEqual(SalesForecast.objects.count(), 21)
+        self.assertEqual(self.bundle.model.predict.call_count, 1)
+        self.assertEqual(SalesForecast.objects.get(Store=2, Date='2015-08-01').Sales, 2006.0)
+
+
+    def test_precompute_incremental(self):
+        '''
+        A rerun only rescores the stores whose inputs changed
+        '''
+
+        self.precompute()
+        self.precompute()
+        self.assertEqual(self.bundle.model.predict.call_count, 1)
+
+        self.store.loc[self.store['Store'] == 3, 'CompetitionDistance'] = 90.0
+        self.store.to_csv(self.store_file, index=False)
+        self.precompute()
+
+        rescored = self.bundle.pipeline.transform.call_args.args[0]
+        self.assertListEqual(rescored['Store'].unique().tolist(), [3])
+        self.assertEqual(SalesForecast.objects.count(), 21)
+
+
+    def test_moving_window(self):
+        '''
+        The next day's run only scores the day the window moved onto and drops the day it left
+        '''
+
+        self.precompute()
+        self.precompute(start='2015-08-02')
+
+        rescored = self.bundle.pipeline.transform.call_args.args[0]
+        self.assertEqual(self.bundle.model.predict.call_count, 2)
+        self.assertListEqual(rescored['Date'].dt.strftime('%Y-%m-%d').unique().tolist(), ['2015-08-08'])
+        self.assertEqual(SalesForecast.objects.count(), 21)
+        self.assertFalse(SalesForecast.objects.filter(Date='2015-08-01').exists())
+
+
+    def test_forecast_view(self):
+        '''
+        The read endpoint filters on store and date range
+        '''
+
+        self.precompute()
+        response = APIClient().get('/forecasts/', {'store': 1, 'start': '2015-08-02', 'end': '2015-08-03'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([row['Date'] for row in response.data['results']], ['2015-08-02', '2015-08-03'])
+        self.assertEqual(APIClient().get('/forecasts/', {'store': 'x'}).status_code, 400)
+
+
+    def test_forecast_view_pages(self):
+        '''
+        Without filters the forecasts are walked page by page, by store then date
+        '''
+
+        self.precompute()
+        url, rows = '/forecasts/?page_size=5', []
+        while url:
+            page = APIClient().get(url).data
+            self.assertLessEqual(len(page['results']), 5)
+            rows.extend((row['Store'], row['Date']) for row in page['results'])
+            url = page['next']
+
+        self.assertEqual(len(rows), 21)
+        self.assertListEqual(rows, sorted(rows))
+
+
+class TestShardRouter(TestCase):
+
+    def setUp(self):
+
+        from sklearn.pipeline import Pipeline
+        from Custom_Transformers import ColumnEncoder
+        from Sharded_Training import ShardedTrainer
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        rows = 600
+        data = pd.DataFrame({
+            'Store': np.tile([1, 2, 3], rows // 3),
+            'Promo': rng.integers(0, 2, rows),
+            'StoreType': np.tile(['a', 'b', 'a'], rows // 3),
+        })
+        # Store 3 has too few rows for a model of its own
+        data = data[(data['Store'] != 3) | (data.index < 30)]
+        data['Sales'] = 1000 + data['Store'] * data['Promo'] * 500.0
+
+        pipeline = Pipeline([('Encoder', ColumnEncoder())])
+        ShardedTrainer(pipeline, params={'n_estimators': 20, 'max_depth': 2}, output_dir=self.tmp_dir.name,
+                       min_rows=50, n_jobs=1).fit(data)
+        self.router = ShardRouter(self.tmp_dir.name, cache_size=2)
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def test_routes_to_shard(self):
+        '''
+        Each store is scored by its own model, stores without one by the fallback
+        '''
+
+        first = self.router.get({'Store': 1, 'Promo': 1, 'StoreType': 'a'})
+
+        self.assertIs(self.router.get({'Store': 1, 'Promo': 0, 'StoreType': 'a'}), first)
+        self.assertIs(self.router.get({'Store': ['1'], 'Promo': ['1'], 'StoreType': ['a']}), first)
+        self.assertIsNot(self.router.get({'Store': 2, 'Promo': 1, 'StoreType': 'a'}), first)
+        self.assertIs(self.router.get({'Store': 3, 'Promo': 1, 'StoreType': 'a'}),
+                      self.router.get({'Store': 99, 'Promo': 1, 'StoreType': 'a'}))
+
+        X = first.transform_record({'Store': 1, 'Promo': 1, 'StoreType': 'a'})
+        self.assertAlmostEqual(float(first.model.predict(X)[0]), 1500, delta=50)
+
+        with self.assertRaises(ValueError):
+            self.router.get({'Promo': 1, 'StoreType': 'a'})
+
+
+    def test_missing_shard_file_falls_back(self):
+        '''
+        A shard listed in the manifest whose model file is gone is served by the fallback
+        '''
+
+        with open(os.path.join(self.tmp_dir.name, 'manifest.json')) as f:
+            os.remove(os.path.join(self.tmp_dir.name, json.load(f)['shards']['Store=2']))
+
+        bundle = self.router.get({'Store': 2, 'Promo': 1, 'StoreType': 'b'})
+
+        self.assertIs(bundle, self.router.get({'Store': 99, 'Promo': 1, 'StoreType': 'b'}))
+        self.assertEqual(self.router.stats()['cached'], 0)
+
+
+    def test_shard_load_retried_after_backoff(self):
+        '''
+        A shard that failed to load isn't pinned to the fallback, it is retried once the backoff expires
+        '''
+
+        from .shard_router import load_model_artifact
+
+        record = {'Store': 2, 'Promo': 1, 'StoreType': 'b'}
+        fallback = self.router.get({'Store': 99, 'Promo': 1, 'StoreType': 'b'})
+        failures = [OSError('I/O error')]
+
+        def flaky_load(path):
+            if failures:
+                raise failures.pop()
+            return load_model_artifact(path)
+
+        with patch('apis.shard_router.load_model_artifact', side_effect=flaky_load) as load:
+            self.router.retry_delay = 3600
+            self.assertIs(self.router.get(record), fallback)
+            self.assertIs(self.router.get(record), fallback)
+            self.assertEqual(load.call_count, 1)
+
+            # Once the backoff expires the shard model is loaded
+            self.router._failures = {name: (0, delay) for name, (_, delay) in self.router._failures.items()}
+            self.assertIsNot(self.router.get(record), fallback)
+            self.assertEqual(load.call_count, 2)
+
+
+    def test_lru_eviction(self):
+        '''
+        Beyond the cache size the least recently used shard model is dropped
+        '''
+
+        self.router.cache_size = 1
+        self.router.get({'Store': 1, 'Promo': 1, 'StoreType': 'a'})
+        self.router.get({'Store': 2, 'Promo': 1, 'StoreType': 'a'})
+        self.router.get({'Store': 1, 'Promo': 1, 'StoreType': 'a'})
+
+        stats = self.router.stats()
+        self.assertEqual(stats['shards'], 2)
+        self.assertEqual(stats['cached'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['evictions'], 2)
+
+
+    def test_predict_frame(self):
+        '''
+        A batch is scored shard by shard, in the order of its rows
+        '''
+
+        records = [{'Store': store, 'Promo': 1, 'StoreType': 'a'} for store in [2, 1, 3, 2]]
+        expected = [float(bundle.model.predict(bundle.transform_record(record))[0])
+                    for record in records for bundle in [self.router.get(record)]]
+
+        np.testing.assert_allclose(self.router.predict_frame(pd.DataFrame(records)), expected, rtol=1e-6)
+
+
+    @override_settings(MICRO_BATCH_ENABLED=False)
+    def test_predict_view(self):
+        '''
+        With a sharded bundle status/ answers with the prediction of the store's model
+        '''
+
+        with patch('apis.views.shard_router', self.router):
+            response = APIClient().post('/status/', {'Store': 2, 'Promo': 1, 'StoreType': 'a'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(int(response.json().split()[-1]), 2000, delta=50)
+        self.assertEqual(self.router.stats()['misses'], 1)
@@ -8,5 +8,13 @@ router.register('apis', views.SalsesDataView)
 urlpatterns = [
     path('form/', views.salesFormView, name='home'),
     path('status/', views.SalesDatapredict),
+    path('status/batch/', views.SalesDataBatchPredict),
+    path('status/async/', views.SalesDatapredictAsync),
+    path('status/batch/async/', views.SalesDataBatchPredictAsync),
+    path('status/models/', views.modelStatsView),
+    path('status/shards/', views.shardStatsView),
+    path('status/cache/', views.predictionCacheStatsView),
+    path('status/batcher/', views.microBatchStatsView),
+    path('forecasts/', views.forecastView),
     path('', include(router.urls)),  # Include the router's URLs
 ]
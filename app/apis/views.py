@@ -1,38 +1,207 @@
+import json
+import asyncio
+import datetime
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from rest_framework import viewsets
 from . forms import SalesForm
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
-from . models import SalesData
-from . serializers import SalesDataSerializer
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from . models import SalesData, SalesForecast
+from . serializers import SalesDataSerializer, SalesForecastSerializer
+from . model_registry import registry
+from . batch import read_batch, stream_predictions
+from . prediction_cache import prediction_cache
+from . executor import predict_executor, ExecutorBusy
+from . micro_batcher import micro_batcher
+from . shard_router import shard_router
+
+
+
+class SalesDataPagination(CursorPagination):
+	# Cursor on the primary key, pages stay cheap however deep the client goes
+	ordering = 'id'
+	page_size = settings.SALES_DATA_PAGE_SIZE
+	page_size_query_param = 'page_size'
+	max_page_size = settings.SALES_DATA_MAX_PAGE_SIZE
+
 
-import joblib
-import numpy as np
+class SalesForecastPagination(CursorPagination):
+	# A store's days are contiguous, so the cursor's offset within one store stays small
+	ordering = ('Store', 'Date')
+	page_size = settings.FORECAST_PAGE_SIZE
+	page_size_query_param = 'page_size'
+	max_page_size = settings.FORECAST_MAX_PAGE_SIZE
 
 
 class SalsesDataView(viewsets.ModelViewSet):
+	"""
+	SalesData rows, filtered with ?store=<id>[,<id>...]&date=<YYYY-MM-DD> or &start=<YYYY-MM-DD>&end=<YYYY-MM-DD>
+	"""
 	queryset = SalesData.objects.all()
 	serializer_class = SalesDataSerializer
+	pagination_class = SalesDataPagination
+
+	def get_queryset(self):
+		queryset = super().get_queryset()
+		params = self.request.query_params
+
+		try:
+			if 'store' in params:
+				queryset = queryset.filter(Store__in=[int(store) for store in params['store'].split(',')])
+			if 'date' in params:
+				queryset = queryset.filter(Date=datetime.date.fromisoformat(params['date']))
+			if 'start' in params:
+				queryset = queryset.filter(Date__gte=datetime.date.fromisoformat(params['start']))
+			if 'end' in params:
+				queryset = queryset.filter(Date__lte=datetime.date.fromisoformat(params['end']))
+		except ValueError as e:
+			raise ValidationError(e.args[0])
+
+		return queryset
+
+	@action(detail=False, methods=['post'])
+	def bulk(self, request):
+		"""
+		Creates every row of a JSON array with batched INSERTs
+		"""
+		if not isinstance(request.data, list):
+			return Response("Send a JSON array of rows", status.HTTP_400_BAD_REQUEST)
+
+		serializer = self.get_serializer(data=request.data, many=True)
+		serializer.is_valid(raise_exception=True)
+
+		rows = [SalesData(**item) for item in serializer.validated_data]
+		SalesData.objects.bulk_create(rows, batch_size=settings.SALES_DATA_BULK_BATCH_SIZE)
+
+		return Response({'created': len(rows)}, status.HTTP_201_CREATED)
 		
-# @api_view(["POST"])
+def _get_bundle(features):
+	# With a sharded bundle every record is scored by the model of its store or cluster
+	if shard_router.enabled:
+		return shard_router.get(features)
+
+	return registry.get()
+
+
+def _predict_record(bundle, features):
+	# Concurrent requests share one predict call through the micro-batcher
+	if settings.MICRO_BATCH_ENABLED:
+		return micro_batcher.predict(bundle, features)
+
+	return float(bundle.model.predict(bundle.transform_record(features))[0])
+
+
+@api_view(["POST"])
 def SalesDatapredict(request):
 	try:
-		mdl=joblib.load("apis/model_22-09-2024-12-49-52.pkl")
-		
-		mydata=request.data
-		unit=np.array(list(mydata.values()))
-		unit=unit.reshape(1,-1)
-		scalers=joblib.load("apis/preprocessing_pipeline.pkl")
-		X=scalers.transform(unit)
-		y_pred=mdl.predict(X)
-		ans = int(y_pred)
+		mydata=dict(request.data)
+		bundle = _get_bundle(mydata)
+		prediction = prediction_cache.get_or_predict(mydata, bundle.version,
+			lambda features: _predict_record(bundle, features))
+		ans = int(prediction)
 		return JsonResponse('Your Status is {}'.format(ans), safe=False)
+	except TimeoutError as e:
+		return _busy_response(e)
 	except ValueError as e:
 		return Response(e.args[0], status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["POST"])
+def SalesDataBatchPredict(request):
+	try:
+		data = read_batch(request)
+		chunk_size = int(request.query_params.get('chunk_size', settings.PREDICT_BATCH_CHUNK_SIZE))
+		if chunk_size < 1:
+			raise ValueError("chunk_size must be a positive integer")
+	except ValueError as e:
+		return Response(e.args[0], status.HTTP_400_BAD_REQUEST)
+
+	# One transform and one predict over the whole frame, only the response is chunked
+	try:
+		y_pred = _predict_frame(data)
+	except ValueError as e:
+		return Response(e.args[0], status.HTTP_400_BAD_REQUEST)
+
+	return StreamingHttpResponse(stream_predictions(data, y_pred, chunk_size), content_type='application/json')
+
+
+def _predict_batch(bundle, data):
+	return bundle.model.predict(bundle.pipeline.transform(data))
+
+
+def _predict_frame(data, nthread=None):
+	if shard_router.enabled:
+		return shard_router.predict_frame(data, nthread)
+
+	return _predict_batch(registry.get().capped(nthread), data)
+
+
+def _read_and_predict(request):
+	data = read_batch(request)
+	# Next to the other predictions of the executor, on a few XGBoost threads only
+	return data, _predict_frame(data, settings.PREDICT_EXECUTOR_NTHREAD)
+
+
+def _busy_response(e):
+	response = JsonResponse(str(e), safe=False, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+	response['Retry-After'] = str(settings.PREDICT_RETRY_AFTER)
+	return response
+
+
+@csrf_exempt
+@require_POST
+async def SalesDatapredictAsync(request):
+	"""
+	Async SalesDatapredict for ASGI servers, the prediction runs on the bounded executor
+	"""
+	try:
+		mydata = json.loads(request.body or b'null')
+		if not isinstance(mydata, dict):
+			raise ValueError("Send the features as a JSON object")
+
+		bundle = (await sync_to_async(_get_bundle)(mydata)).capped(settings.PREDICT_EXECUTOR_NTHREAD)
+		prediction = await asyncio.wrap_future(predict_executor.submit(
+			prediction_cache.get_or_predict, mydata, bundle.version,
+			lambda features: _predict_record(bundle, features)))
+	except (ExecutorBusy, TimeoutError) as e:
+		return _busy_response(e)
+	except ValueError as e:
+		return JsonResponse(e.args[0], safe=False, status=status.HTTP_400_BAD_REQUEST)
+
+	return JsonResponse('Your Status is {}'.format(int(prediction)), safe=False)
+
+
+@csrf_exempt
+@require_POST
+async def SalesDataBatchPredictAsync(request):
+	"""
+	Async SalesDataBatchPredict for ASGI servers, the prediction runs on the bounded executor
+	"""
+	try:
+		chunk_size = int(request.GET.get('chunk_size', settings.PREDICT_BATCH_CHUNK_SIZE))
+		if chunk_size < 1:
+			raise ValueError("chunk_size must be a positive integer")
+
+		# Parsing up to PREDICT_BATCH_MAX_ROWS rows is CPU bound too, it stays off the event loop
+		data, y_pred = await asyncio.wrap_future(predict_executor.submit(_read_and_predict, request))
+	except ExecutorBusy as e:
+		return _busy_response(e)
+	except ValueError as e:
+		return JsonResponse(e.args[0], safe=False, status=status.HTTP_400_BAD_REQUEST)
+
+	return StreamingHttpResponse(stream_predictions(data, y_pred, chunk_size), content_type='application/json')
 	
 
+
 def salesFormView(request):
     if request.method == 'POST':
         form = SalesForm(request.POST)
@@ -57,24 +226,59 @@ def salesFormView(request):
                 'PromoInterval': form.cleaned_data['PromoInterval']
             }
 
-            # Convert the data to the format expected by the preprocessor and model
-            import pandas as pd
-            input_data = pd.DataFrame([form_data])  # Convert to a DataFrame for the pipeline
+            # The registry keeps the pipeline and model loaded for the lifetime of the worker
+            bundle = _get_bundle(form_data)
 
-            # Load your preprocessor pipeline and model
-            import joblib
-            preprocessor = joblib.load('C:/Users/user/Documents/Programming/Python/Django_ml/apis/preprocessing_pipeline.pkl')
-            model = joblib.load('C:/Users/user/Documents/Programming/Python/Django_ml/apis/model_22-09-2024-12-49-52.pkl')
-
-            # Apply preprocessing to the input data
-            processed_data = preprocessor.transform(input_data)
-
-            # Make prediction
-            prediction = model.predict(processed_data)
+            # Apply preprocessing to the input data, through the compiled plan when possible,
+            # and make the prediction unless the same features were already scored
+            prediction = prediction_cache.get_or_predict(form_data, bundle.version,
+                lambda features: _predict_record(bundle, features))
 
             # Return the prediction as part of the response
-            return JsonResponse({'status': 'success', 'prediction': prediction[0]})
+            return JsonResponse({'status': 'success', 'prediction': prediction})
     
     # For GET requests, render the form
     form = SalesForm()
-    return render(request, 'myform/SalesForm.html', {'form': form})
\ No newline at end of file
+    return render(request, 'myform/SalesForm.html', {'form': form})
+
+
+@api_view(["GET"])
+def modelStatsView(request):
+	return Response(registry.stats())
+
+
+@api_view(["GET"])
+def shardStatsView(request):
+	return Response(shard_router.stats())
+
+
+@api_view(["GET"])
+def predictionCacheStatsView(request):
+	return Response(prediction_cache.stats())
+
+
+@api_view(["GET"])
+def microBatchStatsView(request):
+	return Response(micro_batcher.stats())
+
+
+@api_view(["GET"])
+def forecastView(request):
+	"""
+	Precomputed forecasts by store and date, filtered with ?store=<id>&start=<YYYY-MM-DD>&end=<YYYY-MM-DD>
+	and paginated through the `next` cursor
+	"""
+	try:
+		queryset = SalesForecast.objects.all()
+		if 'store' in request.query_params:
+			queryset = queryset.filter(Store=int(request.query_params['store']))
+		if 'start' in request.query_params:
+			queryset = queryset.filter(Date__gte=datetime.date.fromisoformat(request.query_params['start']))
+		if 'end' in request.query_params:
+			queryset = queryset.filter(Date__lte=datetime.date.fromisoformat(request.query_params['end']))
+	except ValueError as e:
+		return Response(e.args[0], status.HTTP_400_BAD_REQUEST)
+
+	paginator = SalesForecastPagination()
+	page = paginator.paginate_queryset(queryset, request)
+	return paginator.get_paginated_response(SalesForecastSerializer(page, many=True).data)
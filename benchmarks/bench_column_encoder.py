@@ -0,0 +1,53 @@
+'''
+Compares the notebook pipeline ending with a OneHotEncoder over every column against
+the same pipeline ending with a ColumnEncoder.
+
+For both: width and memory of the encoded CSR matrix, fit_transform time and peak
+traced memory, and the time to fit an XGBRegressor on the output.
+
+Run from the repository root:
+    python benchmarks/bench_column_encoder.py --rows 500000
+'''
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+
+from xgboost import XGBRegressor
+
+sys.path.append(os.path.abspath('benchmarks'))
+from synthetic_data import make_train_store, make_preprocess_pipeline
+
+
+def csr_bytes(X) -> int:
+    return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--trees', type=int, default=100)
+    args = parser.parse_args()
+
+    data = make_train_store(args.rows)
+    y = data.pop('Sales')
+
+    print(f"rows: {args.rows}, trees: {args.trees}")
+    print(f"{'encoder':<10}{'columns':>9}{'nnz/row':>9}{'matrix MB':>11}{'peak MB':>9}{'fit_transform s':>17}{'xgb fit s':>11}")
+    for name, column_encoder in [('onehot', False), ('column', True)]:
+        pipeline = make_preprocess_pipeline(column_encoder=column_encoder)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        X = pipeline.fit_transform(data).tocsr()
+        transform_time = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        XGBRegressor(n_estimators=args.trees, max_depth=8, tree_method='hist', n_jobs=1).fit(X, y)
+        fit_time = time.perf_counter() - start
+
+        print(f"{name:<10}{X.shape[1]:>9}{X.nnz / X.shape[0]:>9.1f}{csr_bytes(X) / 1024 ** 2:>11.1f}"
+              f"{peak / 1024 ** 2:>9.1f}{transform_time:>17.2f}{fit_time:>11.2f}")
@@ -0,0 +1,119 @@
+'''
+Mixed read/write load against the SalesData table for each database profile.
+
+Every profile runs in its own process (the settings read DJANGO_DB_PROFILE at import)
+on a fresh database: `--writers` threads insert rows, one at a time like the REST
+create endpoint or in small bulk batches, while `--readers` threads list one store
+over a date range. Reports operations per second and failed operations.
+
+Run from the repository root:
+    python benchmarks/bench_db_concurrency.py --profiles sqlite sqlite-wal
+The postgres profile needs a server and the DJANGO_DB_* variables pointing at it.
+'''
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+
+def worker(profile: str, args) -> dict:
+    import django
+    from django.core.management import call_command
+    from django.db import connection, OperationalError
+
+    sys.path.append(os.path.abspath('app'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Model_API.settings')
+    django.setup()
+
+    from apis.models import SalesData
+
+    call_command('migrate', 'apis', verbosity=0)
+    connection.close()
+
+    row = {
+        'DayOfWeek': 5, 'Open': 1, 'Promo': 1, 'StateHoliday': '0', 'SchoolHoliday': 1,
+        'StoreType': 'c', 'Assortment': 'a', 'CompetitionDistance': 1270.0,
+        'CompetitionOpenSinceMonth': 9, 'CompetitionOpenSinceYear': 2008, 'Promo2': 0,
+        'Promo2SinceWeek': 0, 'Promo2SinceYear': 0, 'PromoInterval': 'Jan,Apr,Jul,Oct'
+    }
+    counts = {'writes': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def write(index):
+        import datetime
+        i = 0
+        while time.perf_counter() < deadline:
+            date = datetime.date(2015, 1, 1) + datetime.timedelta(days=i % 365)
+            try:
+                if args.bulk > 1:
+                    SalesData.objects.bulk_create([
+                        SalesData(Store=(index * args.bulk + j) % 1115 + 1, Date=date, **row) for j in range(args.bulk)
+                    ])
+                else:
+                    SalesData.objects.create(Store=index % 1115 + 1, Date=date, **row)
+                key, n = 'writes', args.bulk
+            except OperationalError:
+                key, n = 'errors', 1
+            with lock:
+                counts[key] += n
+            i += 1
+        connection.close()
+
+    def read(index):
+        import datetime
+        while time.perf_counter() < deadline:
+            try:
+                list(SalesData.objects.filter(Store=index % 1115 + 1, Date__gte=datetime.date(2015, 3, 1),
+                                              Date__lte=datetime.date(2015, 3, 31)).values_list('id', 'Date')[:100])
+                key = 'reads'
+            except OperationalError:
+                key = 'errors'
+            with lock:
+                counts[key] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=read, args=(i,)) for i in range(args.readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {key: round(value / elapsed, 1) for key, value in counts.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', nargs='+', default=['sqlite', 'sqlite-wal'])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--bulk', type=int, default=1, help='rows per insert, 1 inserts row by row')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args)))
+        sys.exit()
+
+    print(f"writers: {args.writers}, readers: {args.readers}, rows per insert: {args.bulk}, {args.seconds:g}s")
+    print(f"{'profile':<12}{'rows/s':>10}{'reads/s':>10}{'errors/s':>10}")
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DJANGO_DB_PROFILE=profile)
+            if profile.startswith('sqlite'):
+                env['DJANGO_DB_NAME'] = os.path.join(tmp, 'bench.sqlite3')
+
+            command = [sys.executable, __file__, '--worker', profile, '--writers', str(args.writers),
+                       '--readers', str(args.readers), '--bulk', str(args.bulk), '--seconds', str(args.seconds)]
+            output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+
+        print(f"{profile:<12}{result['writes']:>10.1f}{result['reads']:>10.1f}{result['errors']:>10.1f}")
@@ -0,0 +1,61 @@
+'''
+Wall time of a six-week forecast of every store with Forecaster (one grid, one predict
+call) against one predict call per day and one per store and day.
+
+The per store and day mode only runs on the first --row-stores stores, its time for
+every store is extrapolated. Run from the repository root:
+    python benchmarks/bench_forecast.py --rows 200000 --horizon 42
+'''
+import sys
+import os
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.abspath('benchmarks'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--horizon', type=int, default=42)
+    parser.add_argument('--row-stores', type=int, default=20)
+    args = parser.parse_args()
+
+    from xgboost import XGBRegressor
+    from synthetic_data import make_train_store, make_store
+    from Training import make_pipeline
+    from Forecasting import Forecaster, forecast_grid
+
+    data = make_train_store(args.rows)
+    store = make_store()
+    pipeline = make_pipeline()
+    X = pipeline.fit_transform(data.drop(columns='Sales'))
+    model = XGBRegressor(n_estimators=100, max_depth=8, tree_method='hist', n_jobs=1).fit(X, data['Sales'])
+
+    forecaster = Forecaster(pipeline, model, store)
+    start_date = pd.Timestamp(data['Date'].max()) + pd.Timedelta(days=1)
+    forecaster.forecast(start_date=start_date, horizon=1)
+
+    start = time.perf_counter()
+    sales = forecaster.forecast(start_date=start_date, horizon=args.horizon)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for day in pd.date_range(start_date, periods=args.horizon):
+        grid = forecast_grid(store, start_date=day, horizon=1)
+        model.predict(pipeline.transform(grid))
+    per_day = time.perf_counter() - start
+
+    start = time.perf_counter()
+    row_stores = store['Store'].head(args.row_stores).tolist()
+    grid = forecast_grid(store, row_stores, start_date, args.horizon)
+    for i in range(len(grid)):
+        model.predict(pipeline.transform(grid.iloc[[i]]))
+    per_row = (time.perf_counter() - start) * len(store) / len(row_stores)
+
+    print(f"{len(store)} stores x {args.horizon} days = {len(sales)} forecasts")
+    print(f"       one grid: {batched:8.2f}s")
+    print(f"  one call/day : {per_day:8.2f}s (x{per_day / batched:.1f})")
+    print(f"  one call/row : {per_row:8.2f}s (x{per_row / batched:.1f}, extrapolated from {len(row_stores)} stores)")
@@ -0,0 +1,65 @@
+'''
+Compares DataUtils.holiday_generator against the previous row-wise apply implementation.
+
+Run from the repository root:
+    python benchmarks/bench_holiday_generator.py --rows 1000000
+'''
+import sys
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import holidays
+
+sys.path.append(os.path.abspath('scripts'))
+from Utils import DataUtils
+
+
+def legacy_holiday_generator(data):
+    us_holidays = holidays.US()
+    data['Holiday'] = data['Date'].apply(lambda x: us_holidays[x] if x in us_holidays else 'Not Holiday')
+    return data
+
+
+def make_data(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    dates = pd.date_range('2013-01-01', '2015-07-31', freq='D')
+
+    return pd.DataFrame({
+        'Store': rng.integers(1, 1116, rows),
+        'Date': dates[rng.integers(0, len(dates), rows)],
+    })
+
+
+def timed(func, data, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        frame = data.copy()
+        start = time.perf_counter()
+        func(frame)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_data(args.rows)
+    data_utils = DataUtils()
+
+    expected = legacy_holiday_generator(data.copy())['Holiday']
+    result = data_utils.holiday_generator(data.copy())['Holiday']
+    assert (expected.to_numpy() == result.to_numpy()).all(), "Vectorized output differs from the apply path"
+
+    legacy = timed(legacy_holiday_generator, data, args.repeat)
+    vectorized = timed(data_utils.holiday_generator, data, args.repeat)
+
+    print(f"rows: {args.rows}")
+    print(f"apply:      {legacy:.3f}s")
+    print(f"vectorized: {vectorized:.3f}s ({legacy / vectorized:.1f}x faster)")
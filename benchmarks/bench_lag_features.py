@@ -0,0 +1,83 @@
+'''
+Wall time of LagFeatures against the same features computed with a per-store
+groupby-apply (shift/rolling/ewm), and of adding one day with LagFeatures.update
+against refitting on the whole history.
+
+Run from the repository root:
+    python benchmarks/bench_lag_features.py --rows 1000000
+'''
+import sys
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath('benchmarks'))
+
+LAGS = [1, 7, 14]
+WINDOWS = [7, 28]
+SPANS = [7, 28]
+
+
+def groupby_apply(data: pd.DataFrame) -> pd.DataFrame:
+
+    def store_features(group):
+        group = group.set_index('Date').asfreq('D')
+        sales = group['Sales']
+        features = pd.DataFrame(index=group.index)
+        for lag in LAGS:
+            features[f'Sales_lag_{lag}'] = sales.shift(lag)
+        for window in WINDOWS:
+            rolling = sales.shift(1).rolling(window, min_periods=1)
+            features[f'Sales_roll{window}_mean'] = rolling.mean()
+            features[f'Sales_roll{window}_std'] = sales.shift(1).rolling(window, min_periods=2).std()
+            features[f'Sales_roll{window}_min'] = rolling.min()
+            features[f'Sales_roll{window}_max'] = rolling.max()
+        for span in SPANS:
+            features[f'Sales_ewm{span}'] = sales.ewm(span=span, adjust=False, ignore_na=True).mean().shift(1)
+        return features
+
+    frame = data.assign(Date=pd.to_datetime(data['Date']))[['Store', 'Date', 'Sales']]
+    return frame.groupby('Store').apply(store_features, include_groups=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    from synthetic_data import make_train
+    from Custom_Transformers import LagFeatures
+
+    data = make_train(args.rows)[['Store', 'DayOfWeek', 'Date', 'Sales']]
+    data['Date'] = pd.to_datetime(data['Date'])
+
+    start = time.perf_counter()
+    groupby_apply(data)
+    legacy = time.perf_counter() - start
+
+    features = LagFeatures(lags=LAGS, windows=WINDOWS, ewm_spans=SPANS)
+    start = time.perf_counter()
+    features.fit(data).transform(data)
+    vectorized = time.perf_counter() - start
+
+    # One more day of sales, then the features of the day after
+    last_day = data['Date'].max()
+    new_day = data[data['Date'] == last_day].assign(Date=last_day + pd.Timedelta(days=1))
+    next_day = new_day.assign(Date=last_day + pd.Timedelta(days=2)).drop(columns='Sales')
+
+    start = time.perf_counter()
+    LagFeatures(lags=LAGS, windows=WINDOWS, ewm_spans=SPANS).fit(pd.concat([data, new_day])).transform(next_day)
+    refit = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features.update(new_day).transform(next_day)
+    incremental = time.perf_counter() - start
+
+    print(f"rows: {len(data)}, stores: {data['Store'].nunique()}, features: {len(features.get_feature_names_out())}")
+    print(f"   groupby-apply: {legacy:8.3f}s")
+    print(f"     LagFeatures: {vectorized:8.3f}s (x{legacy / vectorized:.1f})")
+    print(f"  refit, new day: {refit:8.3f}s")
+    print(f" update, new day: {incremental:8.3f}s (x{refit / incremental:.1f})")
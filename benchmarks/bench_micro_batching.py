@@ -0,0 +1,81 @@
+'''
+Latency and throughput of single-record predictions with and without micro-batching.
+
+Trains a small XGBoost model on synthetic rows, then `--clients` threads each send
+`--requests` records through the API's MicroBatcher, once with batches of one record
+and once for every `--wait` window.
+
+Run from the repository root:
+    python benchmarks/bench_micro_batching.py --clients 32 --wait 0.002 0.005
+'''
+import sys
+import os
+import time
+import argparse
+import threading
+
+import django
+from xgboost import XGBRegressor
+
+sys.path.append(os.path.abspath('benchmarks'))
+sys.path.append(os.path.abspath('app'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Model_API.settings')
+django.setup()
+
+from synthetic_data import make_train_store, make_preprocess_pipeline
+from apis.model_registry import LoadedArtifact, ModelBundle
+from apis.micro_batcher import MicroBatcher
+
+
+def make_bundle(rows: int) -> ModelBundle:
+    data = make_train_store(rows)
+    y = data.pop('Sales')
+
+    pipeline = make_preprocess_pipeline().fit(data)
+    model = XGBRegressor(n_estimators=100, max_depth=6, n_jobs=1).fit(pipeline.transform(data), y)
+
+    bundle = ModelBundle(LoadedArtifact('pipeline', pipeline, 0, 0, 0), LoadedArtifact('model', model, 0, 0, 0))
+    bundle.plan  # compile outside the timed part
+
+    return bundle, data.head(1000).to_dict('records')
+
+
+def run(batcher: MicroBatcher, bundle: ModelBundle, records: list, clients: int, requests: int) -> dict:
+    def client(offset):
+        for i in range(requests):
+            batcher.predict(bundle, records[(offset + i) % len(records)])
+
+    threads = [threading.Thread(target=client, args=(i * requests,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = batcher.stats()
+    stats['wall_rps'] = round(clients * requests / elapsed, 1)
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--wait', type=float, nargs='+', default=[0.002, 0.005])
+    parser.add_argument('--max-batch', type=int, default=64)
+    args = parser.parse_args()
+
+    bundle, records = make_bundle(args.rows)
+
+    configs = [('unbatched', MicroBatcher(max_batch_size=1, max_wait=0))]
+    configs += [(f'wait {wait * 1000:g} ms', MicroBatcher(args.max_batch, wait)) for wait in args.wait]
+
+    print(f"clients: {args.clients}, requests per client: {args.requests}")
+    print(f"{'mode':<14}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'batch':>8}")
+    for name, batcher in configs:
+        stats = run(batcher, bundle, records, args.clients, args.requests)
+        print(f"{name:<14}{stats['latency_p50_ms']:>10.2f}{stats['latency_p99_ms']:>10.2f}"
+              f"{stats['wall_rps']:>10.1f}{stats['mean_batch_size']:>8.1f}")
@@ -0,0 +1,108 @@
+'''
+Startup cost of a 1000-tree XGBoost model saved as a pickle and in the native formats,
+and the memory a forked worker adds when the model is preloaded in the parent.
+
+Each format is loaded in a fresh interpreter. For the fork comparison the parent
+either loads the model before forking (gunicorn --preload, with gc.freeze) or the
+child loads it itself, the child then predicts and reports its unique set size.
+
+Run from the repository root:
+    python benchmarks/bench_model_loading.py --trees 1000
+'''
+import sys
+import os
+import gc
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import joblib
+import numpy as np
+import psutil
+from xgboost import XGBRegressor
+
+sys.path.append(os.path.abspath('scripts'))
+from Model_IO import save_model, load_model
+
+
+def load(path: str):
+    if path.endswith('.pkl'):
+        return joblib.load(path)
+
+    return load_model(path)
+
+
+def child_load(path: str) -> dict:
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    start = time.perf_counter()
+    load(path)
+
+    return {'load_time': time.perf_counter() - start, 'memory': process.memory_info().rss - rss_before}
+
+
+def forked_worker_uss(path: str, X: np.ndarray, preload: bool) -> int:
+    model = None
+    if preload:
+        model = load(path)
+        gc.freeze()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        worker_model = model if preload else load(path)
+        worker_model.predict(X)
+        uss = psutil.Process().memory_full_info().uss
+        os.write(write_fd, str(uss).encode())
+        os._exit(0)
+
+    os.close(write_fd)
+    uss = int(os.read(read_fd, 64))
+    os.waitpid(pid, 0)
+    gc.unfreeze()
+
+    return uss
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trees', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child_load(args.child)))
+        sys.exit()
+
+    rng = np.random.default_rng(0)
+    X = rng.random((args.rows, 60))
+    y = X[:, :5].sum(axis=1) + rng.normal(0, 0.1, args.rows)
+    model = XGBRegressor(n_estimators=args.trees, max_depth=8, n_jobs=1).fit(X, y)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {'pickle': os.path.join(tmp, 'model.pkl'), 'ubjson': os.path.join(tmp, 'model.ubj'),
+                 'json': os.path.join(tmp, 'model.json')}
+        joblib.dump(model, paths['pickle'])
+        save_model(model, paths['ubjson'])
+        save_model(model, paths['json'])
+
+        print(f"trees: {args.trees}, fresh interpreter per load, best of {args.repeat}")
+        print(f"{'format':<8}{'size MB':>10}{'load s':>10}{'RSS MB':>10}")
+        for name, path in paths.items():
+            runs = [
+                json.loads(subprocess.run([sys.executable, __file__, '--child', path],
+                                          capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1])
+                for _ in range(args.repeat)
+            ]
+            best = min(runs, key=lambda run: run['load_time'])
+            print(f"{name:<8}{os.path.getsize(path) / 1024 ** 2:>10.1f}{best['load_time']:>10.3f}{best['memory'] / 1024 ** 2:>10.1f}")
+
+        print("\nforked worker unique memory after one predict")
+        for preload in [False, True]:
+            uss = forked_worker_uss(paths['ubjson'], X[:1000], preload)
+            print(f"{'preloaded in parent' if preload else 'loaded in worker':<22}{uss / 1024 ** 2:>8.1f} MB")
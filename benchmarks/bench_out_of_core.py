@@ -0,0 +1,72 @@
+'''
+Peak RSS and wall time of training on the full in-memory matrix, as in
+Predict_Sales.ipynb, against OutOfCoreTrainer streaming train.csv in chunks.
+
+Synthetic train.csv/store.csv files are written to a temporary data directory and
+each mode runs in a fresh process. Run from the repository root (Linux, ru_maxrss is in KB):
+    python benchmarks/bench_out_of_core.py --rows 1000000
+'''
+import sys
+import os
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.append(os.path.abspath('benchmarks'))
+
+MODES = ['in_memory', 'quantile_dmatrix', 'external_memory']
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str, data_dir: str, rounds: int, chunksize: int):
+    from xgboost import XGBRegressor
+    from Utils import DataUtils
+    from Training import OutOfCoreTrainer, make_pipeline, rossmann_chunks
+
+    data_utils = DataUtils()
+    data_utils.data_dir = data_dir
+    start = time.perf_counter()
+
+    if mode == 'in_memory':
+        train = data_utils.load_data('train.csv', use_cache=False)
+        store = data_utils.load_data('store.csv', use_cache=False)
+        data = train.merge(store, on='Store', how='inner').drop(columns='Customers')
+        y = data.pop('Sales')
+        X = make_pipeline().fit_transform(data)
+        XGBRegressor(n_estimators=rounds, max_depth=8, tree_method='hist', n_jobs=1).fit(X, y)
+    else:
+        trainer = OutOfCoreTrainer(make_pipeline(), params={'max_depth': 8, 'nthread': 1}, num_boost_round=rounds,
+                                   checkpoint_dir=os.path.join(data_dir, mode), external_memory=mode == 'external_memory')
+        chunks = rossmann_chunks(data_utils, chunksize)
+        trainer.fit_pipeline(chunks, sample_frac=0.05)
+        trainer.train(chunks)
+
+    return peak_rss_mb(), time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--modes', nargs='+', default=MODES)
+    args = parser.parse_args()
+
+    from synthetic_data import make_train, make_store
+
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        make_train(args.rows).to_csv(os.path.join(data_dir, 'train.csv'), index=False)
+        make_store().to_csv(os.path.join(data_dir, 'store.csv'), index=False)
+
+        print(f"rows: {args.rows}, rounds: {args.rounds}, chunksize: {args.chunksize}")
+        for mode in args.modes:
+            with context.Pool(1) as pool:
+                peak, elapsed = pool.apply(run, (mode, data_dir, args.rounds, args.chunksize))
+            print(f"{mode:>17}: peak RSS {peak:8.1f} MB, {elapsed:7.1f}s")
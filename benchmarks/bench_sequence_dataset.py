@@ -0,0 +1,73 @@
+'''
+Peak RSS and epoch time of LSTM windows materialized as one (n_windows, lookback,
+n_features) array, against SequenceDataset's strided view streamed in batches.
+
+Each mode runs in a fresh process so the peaks don't leak into each other.
+Run from the repository root (Linux, ru_maxrss is in KB):
+    python benchmarks/bench_sequence_dataset.py --days 365 --lookback 7 14 42
+'''
+import sys
+import os
+import time
+import argparse
+import resource
+import multiprocessing
+
+sys.path.append(os.path.abspath('scripts'))
+
+MODES = ['materialized', 'strided']
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str, stores: int, days: int, features: int, lookback: int, batch_size: int):
+    import numpy as np
+    import pandas as pd
+    from Sequence_Dataset import SequenceDataset
+
+    rng = np.random.default_rng(0)
+    rows = stores * days
+    X = rng.random((rows, features), dtype=np.float32)
+    y = rng.random(rows, dtype=np.float32)
+    dataset = SequenceDataset(X, y, np.repeat(np.arange(stores), days),
+                              np.tile(pd.date_range('2014-01-01', periods=days).to_numpy(), stores), lookback)
+    del X, y
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    total = 0.0
+    if mode == 'materialized':
+        # What a windowing loop over each store's frame ends up with before model.fit
+        X_windows = dataset.windows[dataset.starts]
+        y_windows = dataset.y[dataset.starts + lookback - 1]
+        for i in range(0, len(X_windows), batch_size):
+            total += X_windows[i:i + batch_size, -1, 0].sum() + y_windows[i:i + batch_size].sum()
+    else:
+        for X_batch, y_batch in dataset.batches(batch_size, shuffle=True, seed=0):
+            total += X_batch[:, -1, 0].sum() + y_batch.sum()
+
+    return len(dataset), baseline, peak_rss_mb(), time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stores', type=int, default=1115)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--features', type=int, default=30)
+    parser.add_argument('--lookback', nargs='+', type=int, default=[7, 14, 42])
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--modes', nargs='+', default=MODES)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+
+    print(f"stores: {args.stores}, days: {args.days}, features: {args.features}")
+    for lookback in args.lookback:
+        for mode in args.modes:
+            with context.Pool(1) as pool:
+                windows, baseline, peak, elapsed = pool.apply(
+                    run, (mode, args.stores, args.days, args.features, lookback, args.batch_size))
+            print(f"lookback {lookback:>2}, {mode:>12}: {windows} windows, "
+                  f"+{peak - baseline:8.1f} MB over the data, epoch {elapsed:6.2f}s")
@@ -0,0 +1,50 @@
+'''
+Wall time of training a sharded bundle (one model per store or per StoreType/Assortment
+cluster) with ShardedTrainer, against the number of worker processes, and of a rerun
+that finds every shard already trained.
+
+Every run writes a fresh bundle to a temporary directory, XGBoost uses one thread per
+worker. Run from the repository root:
+    python benchmarks/bench_sharded_training.py --rows 200000 --workers 1 2 4
+'''
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.abspath('benchmarks'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--stores', type=int, default=1115)
+    parser.add_argument('--by', nargs='+', default=['Store'], help='Store, or StoreType Assortment')
+    parser.add_argument('--estimators', type=int, default=50)
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4])
+    args = parser.parse_args()
+
+    from synthetic_data import make_train_store, make_preprocess_pipeline
+    from Sharded_Training import ShardedTrainer
+
+    data = make_train_store(args.rows, args.stores)
+    params = {'n_estimators': args.estimators, 'max_depth': 6, 'learning_rate': 0.1}
+
+    print(f"rows: {len(data)}, shards by {'/'.join(args.by)}, cores: {os.cpu_count()}")
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as output_dir:
+            trainer = ShardedTrainer(make_preprocess_pipeline(column_encoder=True), by=args.by, params=params,
+                                     output_dir=output_dir, min_rows=50, n_jobs=workers)
+            start = time.perf_counter()
+            manifest = trainer.fit(data)
+            elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            trainer.fit(data)
+            rerun = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        print(f"{workers:>2} workers: {len(manifest['shards']) + 1:5d} models in {elapsed:7.1f}s "
+              f"(x{baseline / elapsed:.2f}), rerun {rerun:5.1f}s")
@@ -0,0 +1,53 @@
+'''
+Peak RSS of the custom transformer chain with and without per-step copies.
+
+Each mode runs in a fresh process so the peaks don't leak into each other.
+Run from the repository root (Linux, ru_maxrss is in KB):
+    python benchmarks/bench_transformer_memory.py --rows 1000000
+'''
+import sys
+import os
+import argparse
+import resource
+import multiprocessing
+
+sys.path.append(os.path.abspath('benchmarks'))
+
+MODES = ['copy', 'copy_on_write', 'copy_free']
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str, rows: int):
+    import pandas as pd
+    from synthetic_data import make_train_store, make_preprocess_pipeline
+    from Custom_Transformers import make_copy_free
+
+    if mode == 'copy_on_write':
+        pd.set_option('mode.copy_on_write', True)
+
+    data = make_train_store(rows)
+    pipeline = make_preprocess_pipeline(encoder=False).fit(data.head(10_000))
+    if mode == 'copy_free':
+        make_copy_free(pipeline)
+
+    baseline = peak_rss_mb()
+    pipeline.transform(data)
+
+    return baseline, peak_rss_mb()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+
+    print(f"rows: {args.rows}")
+    for mode in MODES:
+        with context.Pool(1) as pool:
+            baseline, peak = pool.apply(run, (mode, args.rows))
+        print(f"{mode:>14}: peak RSS {peak:8.1f} MB, {peak - baseline:8.1f} MB above the loaded frame")
@@ -0,0 +1,60 @@
+'''
+Latency of the booster against FlatTreePredictor for batch sizes 1, 64 and 4096.
+
+The model is an XGBRegressor fitted on the one-hot encoded output of the notebook
+pipeline over synthetic rows, so the input is the same CSR matrix the API scores.
+
+Run from the repository root:
+    python benchmarks/bench_tree_predictor.py --trees 1000
+'''
+import sys
+import os
+import time
+import argparse
+
+import numpy as np
+from xgboost import XGBRegressor
+
+sys.path.append(os.path.abspath('benchmarks'))
+from synthetic_data import make_train_store, make_preprocess_pipeline
+from Tree_Predictor import FlatTreePredictor
+
+
+def median_time(func, X, repeat: int) -> float:
+    func(X)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(X)
+        times.append(time.perf_counter() - start)
+
+    return float(np.median(times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--trees', type=int, default=1000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 4096])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    data = make_train_store(args.rows)
+    y = data.pop('Sales')
+    X = make_preprocess_pipeline().fit_transform(data).tocsr()
+
+    model = XGBRegressor(n_estimators=args.trees, max_depth=6, n_jobs=1).fit(X, y)
+
+    start = time.perf_counter()
+    predictor = FlatTreePredictor.from_model(model)
+    print(f"trees: {predictor.n_trees}, features: {X.shape[1]}, flattened and compiled in {time.perf_counter() - start:.2f}s")
+
+    np.testing.assert_allclose(predictor.predict(X[:4096]), model.predict(X[:4096]), rtol=1e-5, atol=1e-2)
+
+    print(f"{'batch':>6}{'booster ms':>12}{'flat ms':>10}{'speedup':>9}")
+    for batch_size in args.batch_sizes:
+        batch = X[:batch_size]
+        repeat = max(3, args.repeat * 64 // max(batch_size, 64))
+        booster = median_time(model.predict, batch, repeat)
+        flat = median_time(predictor.predict, batch, repeat)
+        print(f"{batch_size:>6}{booster * 1000:>12.3f}{flat * 1000:>10.3f}{booster / flat:>8.1f}x")
@@ -0,0 +1,98 @@
+'''
+Synthetic stand-ins for the Rossmann train/store frames used by the benchmarks.
+
+The columns and value ranges follow train.csv merged with store.csv, so the
+preprocessing pipeline from Predict_Sales.ipynb runs on them unchanged.
+'''
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath('scripts'))
+
+
+def make_store(n_stores: int = 1115, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    store = pd.DataFrame({
+        'Store': np.arange(1, n_stores + 1),
+        'StoreType': rng.choice(['a', 'b', 'c', 'd'], n_stores),
+        'Assortment': rng.choice(['a', 'b', 'c'], n_stores),
+        'CompetitionDistance': rng.gamma(1.0, 5000.0, n_stores).round(-1),
+        'CompetitionOpenSinceMonth': rng.integers(1, 13, n_stores).astype(float),
+        'CompetitionOpenSinceYear': rng.integers(2000, 2015, n_stores).astype(float),
+        'Promo2': rng.integers(0, 2, n_stores),
+        'Promo2SinceWeek': rng.integers(1, 53, n_stores).astype(float),
+        'Promo2SinceYear': rng.integers(2009, 2015, n_stores).astype(float),
+        'PromoInterval': rng.choice(['Jan,Apr,Jul,Oct', 'Feb,May,Aug,Nov', 'Mar,Jun,Sept,Dec'], n_stores),
+    })
+
+    # Same missing value pattern as store.csv
+    store.loc[rng.random(n_stores) < 0.3, ['CompetitionOpenSinceMonth', 'CompetitionOpenSinceYear']] = np.nan
+    no_promo2 = store['Promo2'] == 0
+    store.loc[no_promo2, ['Promo2SinceWeek', 'Promo2SinceYear']] = np.nan
+    store.loc[no_promo2, 'PromoInterval'] = np.nan
+
+    return store
+
+
+def make_train(rows: int, n_stores: int = 1115, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_days = -(-rows // n_stores)
+    dates = pd.date_range(end='2015-07-31', periods=n_days, freq='D')
+
+    store_ids = np.tile(np.arange(1, n_stores + 1), n_days)[:rows]
+    day_dates = np.repeat(dates, n_stores)[:rows]
+    promo = rng.integers(0, 2, rows)
+
+    return pd.DataFrame({
+        'Store': store_ids,
+        'DayOfWeek': day_dates.dayofweek + 1,
+        'Date': day_dates.strftime('%Y-%m-%d'),
+        'Sales': (rng.gamma(4.0, 1500.0, rows) * (1 + 0.3 * promo)).astype(int),
+        'Customers': rng.integers(0, 2000, rows),
+        'Open': (rng.random(rows) > 0.15).astype(int),
+        'Promo': promo,
+        'StateHoliday': rng.choice(['0', 'a', 'b', 'c'], rows, p=[0.97, 0.015, 0.01, 0.005]),
+        'SchoolHoliday': rng.integers(0, 2, rows),
+    })
+
+
+def make_train_store(rows: int, n_stores: int = 1115, seed: int = 42) -> pd.DataFrame:
+    '''
+    The merged train/store frame without Customers, as in Predict_Sales.ipynb
+    '''
+    train = make_train(rows, n_stores, seed)
+    train_store = train.merge(make_store(n_stores, seed), on='Store', how='inner')
+    train_store.drop('Customers', axis=1, inplace=True)
+
+    return train_store
+
+
+def make_preprocess_pipeline(encoder=True, column_encoder=False):
+    '''
+    The preprocessing pipeline from Predict_Sales.ipynb, with `column_encoder` the final
+    OneHotEncoder over every column is replaced by a ColumnEncoder
+    '''
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+    from Custom_Transformers import MissingDataHandler, OutlierHandler, ProperDtypes, DateFeatures, ColumnEncoder
+
+    missing_cols = ['CompetitionDistance', 'CompetitionOpenSinceYear', 'CompetitionOpenSinceMonth', 'Promo2SinceWeek', 'Promo2SinceYear', 'Open']
+    cat_missing_cols = ['PromoInterval']
+    outlier_col = ['CompetitionDistance']
+    to_int_cols = ['CompetitionOpenSinceMonth', 'CompetitionOpenSinceYear', 'Promo2', 'Promo2SinceYear']
+
+    steps = [
+        ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols= missing_cols)),
+        ('Cat_missing_handler', MissingDataHandler(strategy='constant', fill_value='No Promo', cols= cat_missing_cols)),
+        ('Outlier_handler', OutlierHandler(method='IQR', cols=outlier_col)),
+        ('Proper_dtypes', ProperDtypes(cols=to_int_cols, proper_type='int64')),
+        ('Feature_engineering', DateFeatures()),
+    ]
+    if encoder:
+        steps.append(('Encoder', ColumnEncoder() if column_encoder else OneHotEncoder()))
+
+    return Pipeline(steps)
@@ -1,15 +1,109 @@
+import copy
+import inspect
+from functools import reduce
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.stats import zscore
+from scipy import sparse
+from joblib import Parallel, delayed
 
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from sklearn.preprocessing import StandardScaler, MinMaxScaler, OneHotEncoder
+
+from Utils import DataUtils, logger
+
+
+class InplaceTransformer(BaseEstimator, TransformerMixin):
+    '''
+    Base class for the custom transformers that can take ownership of their input.
+
+    With copy=True (the default) the input is copied before it is modified, and when
+    pandas copy-on-write is enabled that copy is a lazy shallow one. With copy=False
+    the columns of the input frame are modified in place.
+
+    Pipelines pickled before a parameter such as `copy` existed are loaded with the
+    parameter at its default value.
+    '''
+
+    def __setstate__(self, state):
+        for name, param in inspect.signature(type(self).__init__).parameters.items():
+            if param.default is not inspect.Parameter.empty:
+                state.setdefault(name, param.default)
+
+        super().__setstate__(state)
+
+
+    def _get_frame(self, X):
+
+        if not self.copy:
+            return X
+
+        if pd.options.mode.copy_on_write is True:
+            return X.copy(deep=False)
+
+        return X.copy()
 
-from Utils import DataUtils
 
-class MissingDataHandler(BaseEstimator, TransformerMixin):
+def make_copy_free(pipeline, own_input: bool = False):
+    '''
+    Sets copy=False on the custom transformers of a pipeline, so the frame is copied
+    at most once at the start of the chain instead of once per step.
+
+    Parameters:
+    -----------
+        pipeline(Pipeline): The preprocessing pipeline
+        own_input(bool): When True the first transformer doesn't copy either, the frame
+                         passed to the pipeline is modified
+
+    Returns:
+    --------
+        Pipeline: The same pipeline
+    '''
+    first = not own_input
+    for _, step in pipeline.steps:
+        if isinstance(step, InplaceTransformer):
+            step.set_params(copy=first)
+            first = False
+
+    return pipeline
+
+
+def transform_iter(pipeline, chunks, target: str = None, own_chunks: bool = True):
+    '''
+    Runs a fitted pipeline over an iterable of frames one chunk at a time, e.g. the
+    output of DataUtils.iter_data, so the full dataset never has to be in memory.
+
+    Parameters:
+    -----------
+        pipeline(Pipeline): The fitted preprocessing pipeline
+        chunks(iterable): Frames with the same columns as the ones the pipeline was fitted on
+        target(str): Optional target column, it is removed from every chunk before the
+                     transform and yielded next to the features
+        own_chunks(bool): The chunks are not used by the caller afterwards, so the
+                          transformers can modify them in place instead of copying
+
+    Yields:
+    -------
+        The transformed chunk, or (transformed chunk, target) when `target` is given
+    '''
+    if own_chunks:
+        pipeline = make_copy_free(copy.deepcopy(pipeline), own_input=True)
+
+    for chunk in chunks:
+        if target is None:
+            yield pipeline.transform(chunk)
+        else:
+            y = chunk[target].to_numpy()
+            if own_chunks:
+                del chunk[target]
+            else:
+                chunk = chunk.drop(columns=target)
+            yield pipeline.transform(chunk), y
+
+
+class MissingDataHandler(InplaceTransformer):
     '''
     Custom Trnasformer for handling missing data
 
@@ -18,17 +112,19 @@ class MissingDataHandler(BaseEstimator, TransformerMixin):
         strategy(str):
         fill_value:
         missing_values: 
+        copy(bool): When False the input frame is modified in place
 
     Returns:
     --------
 
     '''
-    def __init__(self, strategy, cols: list, fill_value = None ,missing_values = np.nan):
+    def __init__(self, strategy, cols: list, fill_value = None ,missing_values = np.nan, copy: bool = True):
         self.missing_values= missing_values
         self.strategy= strategy
         self.fill_value= fill_value
         self.imputer = None
         self.cols = cols
+        self.copy = copy
 
     def fit(self, X, y=None):
     
@@ -38,75 +134,238 @@ class MissingDataHandler(BaseEstimator, TransformerMixin):
     
     def transform(self, X, y=None):
         
-        X_transformed = X.copy()
-
         if self.imputer == None:
             raise ValueError("The imputer has not been fitted yet. Call fit() before transform().")
         
+        X_transformed = self._get_frame(X)
         X_transformed[self.cols] = self.imputer.transform(X[self.cols])
 
-        return pd.DataFrame(X_transformed, columns=X.columns)
+        return X_transformed
     
 
-class OutlierHandler(BaseEstimator, TransformerMixin):
+class QuantileSketch:
+    '''
+    Mergeable approximate quantile sketch.
+
+    The values are summarized by at most `size` centroids (mean, weight) sorted by mean.
+    Sketches built on different chunks of a column can be merged, which gives the same
+    summary as one sketch built on the whole column. As long as fewer than `size` values
+    were added the quantiles are exact and match numpy's linear interpolation.
+
+    Parameters:
+    -----------
+        size(int): Maximum number of centroids kept
+    '''
+
+    def __init__(self, size: int = 10_000):
+        self.size = size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+
+    @property
+    def count(self) -> float:
+        return self.weights.sum()
+
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+
+    def merge(self, other):
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+
+    def _compress(self, means, weights):
+        order = np.argsort(means)
+        means, weights = means[order], weights[order]
+
+        if len(means) > self.size:
+            # Group neighbouring centroids into `size` buckets of (about) equal weight
+            start = np.cumsum(weights) - weights
+            bucket = np.minimum((start * self.size // weights.sum()).astype(np.int64), self.size - 1)
+            bucket_weights = np.bincount(bucket, weights=weights, minlength=self.size)
+            bucket_sums = np.bincount(bucket, weights=means * weights, minlength=self.size)
+            filled = bucket_weights > 0
+            means, weights = bucket_sums[filled] / bucket_weights[filled], bucket_weights[filled]
+
+        self.means, self.weights = means, weights
+
+
+    def quantile(self, q: float) -> float:
+        if len(self.means) == 0:
+            return np.nan
+
+        # Rank of the middle value of every centroid, a single value sits on its own rank
+        centers = np.cumsum(self.weights) - (self.weights + 1) / 2
+        return float(np.interp(q * (self.count - 1), centers, self.means))
+
+
+class OutlierHandler(InplaceTransformer):
     '''
     Custom transformer to handle Outliers 
 
+    The bounds are learned in fit and applied unchanged in transform, so a batch (or a
+    single row) is handled with the statistics of the training data. The IQR quartiles
+    come from a QuantileSketch per column and the z-score from the mean and standard
+    deviation of each column. Both are computed on row chunks spread over a joblib
+    pool and merged, and partial_fit adds more data to the statistics.
+
     Parameters
     ----------
         method(str): IQR, z_score
         factor(float): Factor for calculating IQR
         threshold(float): Threshold for determining Z-score 
         cols(list): A list of columns that we don't need to remove the outlier, like unique identifiers
+        n_jobs(int): Number of workers used in fit, -1 uses every core
+        chunk_size(int): Number of rows summarized by one worker task
+        prefer(str): `threads` or `processes`, the kind of joblib pool used in fit
+        sketch_size(int): Number of centroids of the quantile sketches
+        copy(bool): When False the input frame is modified in place
 
     Returns:
     --------
         pd.Dataframe
     '''
 
-    def __init__(self, method: str, factor: float = 1.5, threshold: float = 3, cols: list = None):
+    def __init__(self, method: str, factor: float = 1.5, threshold: float = 3, cols: list = None, n_jobs: int = None,
+                 chunk_size: int = 250_000, prefer: str = 'threads', sketch_size: int = 10_000, copy: bool = True):
         self.method = method
         self.factor = factor
         self.threshold = threshold
         self.cols = cols
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.prefer = prefer
+        self.sketch_size = sketch_size
+        self.copy = copy
+
+
+    def __setstate__(self, state):
+        # Handlers pickled before the bounds were learned in fit have none, they keep
+        # computing them from each batch as they used to until the pipeline is refit
+        legacy = 'chunk_size' not in state and 'fit_cols_' not in state
+        super().__setstate__(state)
+
+        if legacy:
+            self.batch_bounds_ = True
+            logger.warning("Loaded an OutlierHandler pickled without learned bounds, it computes them from "
+                           "every batch: refit the pipeline to apply the bounds of the training data")
+
+
+    def _select_cols(self, X) -> list:
+        numeric_col = list(X.select_dtypes(include='float64').columns)
+        if self.method == 'IQR' and self.cols:
+            return [col for col in numeric_col if col not in self.cols]
+
+        return numeric_col
+
+
+    def _summarize(self, values: np.ndarray) -> list:
+        '''
+        Statistics of one chunk, a sketch per column for IQR or (count, mean, M2) per column for z_score
+        '''
+        if self.method == 'IQR':
+            return [QuantileSketch(self.sketch_size).update(values[:, i]) for i in range(values.shape[1])]
+
+        count = np.sum(~np.isnan(values), axis=0)
+        mean = np.divide(np.nansum(values, axis=0), count, out=np.zeros(values.shape[1]), where=count > 0)
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+
+        return [count, mean, m2]
+
+
+    def _merge(self, left, right):
+        if self.method == 'IQR':
+            return [a.merge(b) for a, b in zip(left, right)]
+
+        # Chan et al. parallel combination of the mean and the sum of squared deviations
+        count_a, mean_a, m2_a = left
+        count_b, mean_b, m2_b = right
+        count = count_a + count_b
+        delta = mean_b - mean_a
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, mean_a + delta * count_b / count, 0.0)
+            m2 = m2_a + m2_b + np.where(count > 0, delta ** 2 * count_a * count_b / count, 0.0)
+
+        return [count, mean, m2]
 
 
     def fit(self, X, y=None):
-        return self
+
+        for attr in ['fit_cols_', 'stats_']:
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+        return self.partial_fit(X)
     
-    def transform(self, X, y=None):
 
-        X_copy = X.copy()
-        
-        numeric_col = X_copy.select_dtypes(include='float64').columns
-        if self.cols:
-            fix_cols = [col for col in numeric_col if col not in self.cols]
-        else:
-            fix_cols = numeric_col
+    def partial_fit(self, X, y=None):
 
-        if self.method == 'IQR':
+        if self.method not in ['IQR', 'z_score']:
+            raise ValueError("method must be 'IQR' or 'z_score'.")
+
+        if not hasattr(self, 'fit_cols_'):
+            self.fit_cols_ = self._select_cols(X)
 
-            Q1 = X_copy[fix_cols].quantile(0.25)
-            Q3 = X_copy[fix_cols].quantile(0.75)
+        values = X[self.fit_cols_].to_numpy(dtype=np.float64)
+        starts = range(0, max(len(values), 1), self.chunk_size)
+        summaries = Parallel(n_jobs=self.n_jobs, prefer=self.prefer)(
+            delayed(self._summarize)(values[start:start + self.chunk_size]) for start in starts
+        )
 
+        if hasattr(self, 'stats_'):
+            summaries.insert(0, self.stats_)
+        self.stats_ = reduce(self._merge, summaries)
+
+        if self.method == 'IQR':
+            Q1 = np.array([sketch.quantile(0.25) for sketch in self.stats_])
+            Q3 = np.array([sketch.quantile(0.75) for sketch in self.stats_])
             IQ = Q3 - Q1
 
-            lower_bound = Q1 - self.factor * IQ
-            upper_bound = Q3 + self.factor * IQ
+            self.lower_bound_ = pd.Series(Q1 - self.factor * IQ, index=self.fit_cols_)
+            self.upper_bound_ = pd.Series(Q3 + self.factor * IQ, index=self.fit_cols_)
 
-            X_copy[fix_cols] = X_copy[fix_cols].clip(lower=lower_bound, upper=upper_bound, axis=1)
+        else:
+            count, mean, m2 = self.stats_
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.mean_ = pd.Series(mean, index=self.fit_cols_)
+                self.std_ = pd.Series(np.sqrt(m2 / count), index=self.fit_cols_)
+
+        return self
+    
+    def transform(self, X, y=None):
+
+        if not hasattr(self, 'fit_cols_'):
+            if getattr(self, 'batch_bounds_', False):
+                # The statistics of the batch itself, fitted on a copy so they aren't kept
+                return copy.copy(self).fit(X).transform(X)
+            raise ValueError("The OutlierHandler has not been fitted yet. Call fit() before transform().")
+
+        X_copy = self._get_frame(X)
+
+        if self.method == 'IQR':
+
+            X_copy[self.fit_cols_] = X_copy[self.fit_cols_].clip(lower=self.lower_bound_, upper=self.upper_bound_, axis=1)
 
             return X_copy  
         
         elif self.method == 'z_score':
 
-            z_scores = np.abs(zscore(X_copy[numeric_col]))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                z_scores = np.abs((X_copy[self.fit_cols_].to_numpy(dtype=np.float64) - self.mean_.to_numpy()) / self.std_.to_numpy())
 
             return X_copy[(z_scores < self.threshold).all(axis = 1)]
 
 
 
-class ProperDtypes(BaseEstimator, TransformerMixin):
+class ProperDtypes(InplaceTransformer):
     '''
     This class is helpful in trasnfoming certain columns to the appropriate column type
 
@@ -114,15 +373,17 @@ class ProperDtypes(BaseEstimator, TransformerMixin):
     -----------
         cols(list): List of columns that need to be transformed
         Proper_type(str): The data type you want the cols to be transformed to
+        copy(bool): When False the input frame is modified in place
 
     Returns:
     --------
         pd.DataFrame: Dataframe with the proper datatypes
     '''
 
-    def __init__ (self, cols: list, proper_type: str):
+    def __init__ (self, cols: list, proper_type: str, copy: bool = True):
         self.cols = cols
         self.proper_type = proper_type
+        self.copy = copy
 
 
     def fit(self, X, y=None):
@@ -130,7 +391,7 @@ class ProperDtypes(BaseEstimator, TransformerMixin):
     
     def transform(self, X, y=None):
 
-        X_transformed = X.copy()
+        X_transformed = self._get_frame(X)
 
         X_transformed['Date'] = pd.to_datetime(X_transformed['Date'])
         X_transformed[self.cols] =  X_transformed[self.cols].astype(self.proper_type)
@@ -139,16 +400,122 @@ class ProperDtypes(BaseEstimator, TransformerMixin):
     
 
 
-class DateFeatures(BaseEstimator, TransformerMixin):
+class CompactDtypes(InplaceTransformer):
+    '''
+    Casts every column to the smallest dtype that safely holds it: integer columns are
+    downcast to the smallest signed integer type and low cardinality string columns
+    become `category`. The memory saved by the last transform is logged and kept in
+    `memory_saved_`.
+
+    Parameters:
+    -----------
+        max_categories(int): String columns with at most this many distinct values become category
+        downcast_floats(bool): Also cast float64 columns to float32
+        cols(list): Columns to leave untouched
+        copy(bool): When False the input frame is modified in place
+
+    Returns:
+    --------
+        pd.DataFrame: Dataframe with compact datatypes
+    '''
+
+    def __init__(self, max_categories: int = 50, downcast_floats: bool = False, cols: list = None, copy: bool = True):
+        self.max_categories = max_categories
+        self.downcast_floats = downcast_floats
+        self.cols = cols
+        self.copy = copy
+
+
+    @staticmethod
+    def _smallest_int(low, high):
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return np.dtype(dtype)
+
+        return np.dtype(np.int64)
+
+
+    def fit(self, X, y=None):
+
+        self.dtypes_ = {}
+        skip_cols = self.cols or []
+
+        for col in X.columns:
+            if col in skip_cols:
+                continue
+
+            series = X[col]
+            if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+                continue
+
+            if pd.api.types.is_integer_dtype(series):
+                self.dtypes_[col] = self._smallest_int(series.min(), series.max()) if len(series) else series.dtype
+
+            elif pd.api.types.is_float_dtype(series) and self.downcast_floats:
+                self.dtypes_[col] = np.dtype(np.float32)
+
+            elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+                categories = series.dropna().unique()
+                if len(categories) <= self.max_categories:
+                    self.dtypes_[col] = pd.CategoricalDtype(categories)
+
+        return self
+    
+    def transform(self, X, y=None):
+
+        if not hasattr(self, 'dtypes_'):
+            raise ValueError("CompactDtypes has not been fitted yet. Call fit() before transform().")
+
+        X_transformed = self._get_frame(X)
+        cols = [col for col in self.dtypes_ if col in X_transformed.columns]
+        memory_before = X_transformed[cols].memory_usage(index=False, deep=True).sum()
+
+        for col in cols:
+            dtype = self.dtypes_[col]
+            series = X_transformed[col]
+
+            if isinstance(dtype, pd.CategoricalDtype):
+                # Values that weren't seen in fit are added instead of being turned into NaN
+                unseen = pd.Index(series.dropna().unique()).difference(dtype.categories)
+                if len(unseen):
+                    dtype = pd.CategoricalDtype(dtype.categories.append(unseen))
+
+            elif pd.api.types.is_integer_dtype(dtype) and len(series):
+                # Widen the learned type when this batch holds larger values
+                dtype = np.promote_types(dtype, self._smallest_int(series.min(), series.max()))
+
+            X_transformed[col] = series.astype(dtype)
+
+        self.memory_saved_ = int(memory_before - X_transformed[cols].memory_usage(index=False, deep=True).sum())
+        logger.info(f"CompactDtypes saved {self.memory_saved_ / 1024 ** 2:.2f} MB on {len(cols)} columns")
+
+        return X_transformed
+    
+
+
+class DateFeatures(InplaceTransformer):
     '''
     Feature extraction: This will generate a date feature
 
+    All the features are computed in one pass over the datetime64 values of `Date`
+    and stored in compact dtypes (int8/int16 and bool).
+
+    Parameters:
+    -----------
+        country(str): ISO code of the holiday calendar of the `Holiday` column
+        subdiv(str): Optional subdivision (state) code of the calendar
+        copy(bool): When False the input frame is modified in place instead of copied
+
     Returns:
     ----------
         pd.DataFrame: Dataframe with more features
     '''
 
-    def __init__(self):
+    def __init__(self, country: str = 'US', subdiv: str = None, copy: bool = True):
+        self.country = country
+        self.subdiv = subdiv
+        self.copy = copy
         self.data_utils = DataUtils()
 
     def fit(self, X, y=None):
@@ -156,22 +523,26 @@ class DateFeatures(BaseEstimator, TransformerMixin):
     
     def transform(self, X, y=None):
 
-        X_copy = X.copy()
+        X_copy = self._get_frame(X)
 
-        
-        X_copy['quarter'] =   X_copy['Date'].dt.quarter
-        X_copy['month'] =     X_copy['Date'].dt.month
-        X_copy['year'] =      X_copy['Date'].dt.year 
-        X_copy['dayofyear'] = X_copy['Date'].dt.dayofyear
-        X_copy['weekdays'] =  X_copy['DayOfWeek'].apply(lambda x: x < 6)
-        X_copy['weekends'] =  X_copy['DayOfWeek'].apply(lambda x: x >= 6)
-        X_copy = self.data_utils.holiday_generator(X_copy)
+        days = X_copy['Date'].to_numpy(dtype='datetime64[D]')
+        years = days.astype('datetime64[Y]')
+        month = (days.astype('datetime64[M]') - years.astype('datetime64[M]')).astype(np.int8) + 1
+        day_of_week = X_copy['DayOfWeek'].to_numpy()
+
+        X_copy['quarter'] =   ((month - 1) // 3 + 1).astype(np.int8)
+        X_copy['month'] =     month
+        X_copy['year'] =      (years.astype(np.int64) + 1970).astype(np.int16)
+        X_copy['dayofyear'] = ((days - years.astype('datetime64[D]')).astype(np.int16) + 1).astype(np.int16)
+        X_copy['weekdays'] =  day_of_week < 6
+        X_copy['weekends'] =  day_of_week >= 6
+        X_copy = self.data_utils.holiday_generator(X_copy, self.country, subdiv=self.subdiv)
         X_copy.drop('Date', axis=1, inplace=True)
 
         return X_copy
     
 
-class Scaler(BaseEstimator, TransformerMixin):
+class Scaler(InplaceTransformer):
     '''
     This class calculates scales the data for a specific column
 
@@ -179,6 +550,7 @@ class Scaler(BaseEstimator, TransformerMixin):
     -----------
         Cols(list): columns to scale
         scaler_type(str): StandardScaler or MinMaxScaler
+        copy(bool): When False the input frame is modified in place
 
     Returns:
     --------
@@ -187,7 +559,7 @@ class Scaler(BaseEstimator, TransformerMixin):
     '''
 
 
-    def __init__(self, cols: list, scaler_type: str):
+    def __init__(self, cols: list, scaler_type: str, copy: bool = True):
 
         if scaler_type not in ['StandardScaler', 'MinMaxScaler']:
             raise ValueError("scaler_type must be 'StandardScaler' or 'MinMaxScaler'.")        
@@ -195,6 +567,7 @@ class Scaler(BaseEstimator, TransformerMixin):
         self.scaler = None
         self.cols = cols
         self.scaler_type = scaler_type
+        self.copy = copy
 
 
     def fit(self, X, y=None):
@@ -214,8 +587,328 @@ class Scaler(BaseEstimator, TransformerMixin):
         if self.scaler is None:
             raise ValueError("The Scaler has not been fitted yet. Call fit() before transform.")
         
-        X_transformed = X.copy()
+        X_transformed = self._get_frame(X)
         X_transformed[self.cols] = self.scaler.transform(X[self.cols])
         
         return X_transformed
         
+
+
+class ColumnEncoder(BaseEstimator, TransformerMixin):
+    '''
+    Final encoding step that one-hot encodes only the categorical columns and passes
+    the numeric ones through, returning a CSR matrix for XGBoost.
+
+    A OneHotEncoder over every column turns each distinct CompetitionDistance or
+    dayofyear into its own column. Here those stay one column each, stored as explicit
+    entries so that a 0 remains a 0 for XGBoost (absent CSR entries are missing values).
+
+    Parameters:
+    -----------
+        categorical_cols(list): Columns to one-hot encode, by default the string,
+            category and bool columns
+        handle_unknown(str): `error` or `ignore`, passed on to the OneHotEncoder
+        dtype: dtype of the output matrix
+
+    Returns:
+    --------
+        sparse.csr_matrix: The numeric columns followed by the one-hot columns
+    '''
+
+    def __init__(self, categorical_cols: list = None, handle_unknown: str = 'error', dtype=np.float32):
+        self.categorical_cols = categorical_cols
+        self.handle_unknown = handle_unknown
+        self.dtype = dtype
+
+
+    @staticmethod
+    def _is_categorical(series: pd.Series) -> bool:
+        return pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series)
+
+
+    def fit(self, X, y=None):
+
+        if self.categorical_cols is None:
+            self.categorical_cols_ = [col for col in X.columns if self._is_categorical(X[col])]
+        else:
+            self.categorical_cols_ = list(self.categorical_cols)
+
+        self.numeric_cols_ = [col for col in X.columns if col not in self.categorical_cols_]
+        non_numeric = [col for col in self.numeric_cols_ if not pd.api.types.is_numeric_dtype(X[col])]
+        if non_numeric:
+            raise ValueError(f"Columns {non_numeric} aren't numeric, add them to categorical_cols")
+
+        self.encoder_ = OneHotEncoder(handle_unknown=self.handle_unknown, dtype=self.dtype)
+        self.encoder_.fit(X[self.categorical_cols_])
+        self.n_features_out_ = len(self.numeric_cols_) + sum(len(categories) for categories in self.encoder_.categories_)
+
+        return self
+
+
+    def transform(self, X, y=None):
+
+        if not hasattr(self, 'encoder_'):
+            raise ValueError("ColumnEncoder has not been fitted yet. Call fit() before transform().")
+
+        n_rows, n_numeric = len(X), len(self.numeric_cols_)
+        encoded = self.encoder_.transform(X[self.categorical_cols_]).tocsr()
+
+        # Each row holds its numeric values, zeros included, followed by its one-hot
+        # entries, the arrays of the output are filled in place instead of stacking blocks
+        indptr = encoded.indptr.astype(np.int64) + np.arange(n_rows + 1, dtype=np.int64) * n_numeric
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1], dtype=self.dtype)
+
+        numeric_pos = (indptr[:-1, None] + np.arange(n_numeric)).ravel()
+        indices[numeric_pos] = np.tile(np.arange(n_numeric, dtype=np.int32), n_rows)
+        data[numeric_pos] = X[self.numeric_cols_].to_numpy(dtype=self.dtype).ravel()
+        del numeric_pos
+
+        encoded_pos = np.arange(encoded.nnz, dtype=np.int64) + np.repeat(np.arange(1, n_rows + 1, dtype=np.int64) * n_numeric, np.diff(encoded.indptr))
+        indices[encoded_pos] = encoded.indices + n_numeric
+        data[encoded_pos] = encoded.data
+
+        return sparse.csr_matrix((data, indices, indptr), shape=(n_rows, self.n_features_out_))
+
+
+    def get_feature_names_out(self, input_features=None):
+        return np.concatenate([np.asarray(self.numeric_cols_, dtype=object), self.encoder_.get_feature_names_out()])
+
+
+class LagFeatures(InplaceTransformer):
+    '''
+    Per-store lags, rolling mean/std/min/max and exponentially weighted means of the sales.
+
+    fit keeps the sales history as a (stores, days) float32 matrix, one row per store and
+    one column per day (missing days are NaN). Every feature of a row only uses the days
+    before it: a row on day t gets the sales of day t - lag, the statistics of the
+    `window` days before t and the EWM up to day t - 1. Rows past the end of the history
+    (forecasts) use the history up to its last day, lags reaching past it are NaN.
+
+    All the stores are computed at once along the day axis: the rolling sums come from
+    prefix sums, min and max from a doubling table (log2(window) np.fmin passes) and the
+    EWMs are kept for every day at fit. `update` appends one new day of sales and extends
+    the EWMs by one step, so the features of the next day don't recompute the history.
+
+    Place it before DateFeatures, which drops the Date column.
+
+    Parameters:
+    -----------
+        target(str): Column of the sales, taken from `y` when fit is given one
+        lags(list): Days of the lag features
+        windows(list): Days of the rolling windows
+        stats(list): Statistics of the rolling windows among mean, std, min and max
+        ewm_spans(list): Spans of the exponentially weighted means
+        copy(bool): When False the input frame is modified in place instead of copied
+
+    Returns:
+    --------
+        pd.DataFrame: The frame with one float32 column per feature
+    '''
+
+    STATS = ('mean', 'std', 'min', 'max')
+
+    def __init__(self, target: str = 'Sales', lags: list = (1, 7, 14), windows: list = (7, 28),
+                 stats: list = ('mean', 'std', 'min', 'max'), ewm_spans: list = (7, 28), copy: bool = True):
+        self.target = target
+        self.lags = lags
+        self.windows = windows
+        self.stats = stats
+        self.ewm_spans = ewm_spans
+        self.copy = copy
+
+
+    def get_feature_names_out(self, input_features=None):
+        names = [f'{self.target}_lag_{lag}' for lag in self.lags]
+        names += [f'{self.target}_roll{window}_{stat}' for window in self.windows for stat in self.stats]
+        names += [f'{self.target}_ewm{span}' for span in self.ewm_spans]
+
+        return np.asarray(names, dtype=object)
+
+
+    @staticmethod
+    def _ewm_step(previous: np.ndarray, values: np.ndarray, alpha: float) -> np.ndarray:
+        # A missing day keeps the previous mean, the first known day starts it
+        step = np.where(np.isnan(previous), values, alpha * values + (1 - alpha) * previous)
+        return np.where(np.isnan(values), previous, step).astype(np.float32)
+
+
+    def _days(self, X) -> np.ndarray:
+        return (X['Date'].to_numpy(dtype='datetime64[D]') - self.origin_).astype(np.int64)
+
+
+    def _store_index(self, stores) -> tuple:
+        stores = np.asarray(stores)
+        index = np.minimum(np.searchsorted(self.stores_, stores), len(self.stores_) - 1)
+
+        return index, self.stores_[index] == stores
+
+
+    def _sales_values(self, X, y) -> np.ndarray:
+        if y is not None:
+            return np.asarray(y, dtype=np.float32)
+        if self.target in X.columns:
+            return X[self.target].to_numpy(dtype=np.float32)
+
+        raise ValueError(f"LagFeatures needs the `{self.target}` history, pass y or a `{self.target}` column")
+
+
+    def fit(self, X, y=None):
+
+        unknown = [stat for stat in self.stats if stat not in self.STATS]
+        if unknown:
+            raise ValueError(f"Unknown stats {unknown}, use {', '.join(self.STATS)}")
+
+        sales = self._sales_values(X, y)
+        days = X['Date'].to_numpy(dtype='datetime64[D]')
+        self.origin_ = days.min()
+        self.stores_ = np.unique(X['Store'].to_numpy())
+        self.n_days_ = int((days.max() - self.origin_).astype(np.int64)) + 1
+
+        self._sales = np.full((len(self.stores_), self.n_days_), np.nan, dtype=np.float32)
+        self._sales[np.searchsorted(self.stores_, X['Store'].to_numpy()), self._days(X)] = sales
+
+        # ewm_[i, :, t] is the EWM of span i up to day t - 1
+        self._ewm = np.full((len(self.ewm_spans), len(self.stores_), self.n_days_ + 1), np.nan, dtype=np.float32)
+        for i, span in enumerate(self.ewm_spans):
+            alpha = 2 / (span + 1)
+            for day in range(self.n_days_):
+                self._ewm[i, :, day + 1] = self._ewm_step(self._ewm[i, :, day], self._sales[:, day], alpha)
+
+        return self
+
+
+    @property
+    def sales_(self) -> np.ndarray:
+        return self._sales[:, :self.n_days_]
+
+
+    def _grow(self, n_days: int, new_stores: np.ndarray):
+        # The buffers double when full so that adding days one at a time doesn't copy the history every time
+        capacity = self._sales.shape[1]
+        if n_days > capacity or len(new_stores):
+            capacity = max(n_days, 2 * capacity) if n_days > capacity else capacity
+            stores = np.union1d(self.stores_, new_stores)
+            rows = np.searchsorted(stores, self.stores_)
+
+            sales = np.full((len(stores), capacity), np.nan, dtype=np.float32)
+            sales[rows, :self.n_days_] = self.sales_
+            ewm = np.full((len(self.ewm_spans), len(stores), capacity + 1), np.nan, dtype=np.float32)
+            ewm[:, rows, :self.n_days_ + 1] = self._ewm[:, :, :self.n_days_ + 1]
+
+            self._sales, self._ewm, self.stores_ = sales, ewm, stores
+
+
+    def update(self, X, y=None):
+        '''
+        Adds the sales of a new day (or days) after the last one of the history,
+        updating the EWMs one step per day instead of recomputing them
+
+        Parameters:
+        -----------
+            X(pd.DataFrame): Rows with Store and Date, and the target unless y is given
+            y: Sales of the rows
+        '''
+        if not hasattr(self, 'origin_'):
+            raise ValueError("LagFeatures has not been fitted yet. Call fit() before update().")
+
+        sales = self._sales_values(X, y)
+        days = self._days(X)
+        if len(days) and days.min() < self.n_days_:
+            raise ValueError(f"Only days after {self.origin_ + self.n_days_ - 1} can be added")
+
+        n_days = int(days.max()) + 1 if len(days) else self.n_days_
+        self._grow(n_days, np.setdiff1d(X['Store'].to_numpy(), self.stores_))
+
+        self._sales[np.searchsorted(self.stores_, X['Store'].to_numpy()), days] = sales
+        for i, span in enumerate(self.ewm_spans):
+            for day in range(self.n_days_, n_days):
+                self._ewm[i, :, day + 1] = self._ewm_step(self._ewm[i, :, day], self._sales[:, day], 2 / (span + 1))
+        self.n_days_ = n_days
+
+        return self
+
+
+    def _rolling(self, rows: np.ndarray, ends: np.ndarray, start: int, stop: int) -> dict:
+        '''
+        Statistics of every window before the `ends` day of the `rows` stores, computed on
+        the days [start, stop) of the stores involved only
+        '''
+        stores, local = np.unique(rows, return_inverse=True)
+        block = self.sales_[stores, start:stop]
+        features = {}
+
+        for window in self.windows:
+            # With `window` missing days in front, the window before day c of the block is [c, c + window)
+            padded = np.concatenate([np.full((len(stores), window), np.nan, dtype=np.float32), block], axis=1)
+            c = ends - start
+
+            if 'mean' in self.stats or 'std' in self.stats:
+                known = ~np.isnan(padded)
+                zero_filled = np.where(known, padded, 0).astype(np.float64)
+                prefix_count = np.pad(np.cumsum(known, axis=1), ((0, 0), (1, 0)))
+                prefix_sum = np.pad(np.cumsum(zero_filled, axis=1), ((0, 0), (1, 0)))
+                prefix_square = np.pad(np.cumsum(zero_filled ** 2, axis=1), ((0, 0), (1, 0)))
+
+                n = prefix_count[local, c + window] - prefix_count[local, c]
+                total = prefix_sum[local, c + window] - prefix_sum[local, c]
+                square = prefix_square[local, c + window] - prefix_square[local, c]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    mean = np.where(n > 0, total / n, np.nan)
+                    variance = np.where(n > 1, (square - total * mean) / (n - 1), np.nan)
+                features[(window, 'mean')] = mean
+                features[(window, 'std')] = np.sqrt(np.maximum(variance, 0))
+
+            # table[k][:, i] holds the min/max of the 2**k days from i, fmin/fmax skip missing days
+            power = 1 << (window.bit_length() - 1)
+            for stat, func in [('min', np.fmin), ('max', np.fmax)]:
+                if stat not in self.stats:
+                    continue
+                table = padded
+                size = 1
+                while size < power:
+                    table = func(table[:, :-size], table[:, size:])
+                    size *= 2
+                features[(window, stat)] = func(table[local, c], table[local, c + window - power])
+
+        return features
+
+
+    def transform(self, X, y=None):
+
+        if not hasattr(self, 'origin_'):
+            raise ValueError("LagFeatures has not been fitted yet. Call fit() before transform().")
+
+        X_copy = self._get_frame(X)
+        n_rows = len(X_copy)
+        rows, known = self._store_index(X_copy['Store'].to_numpy())
+        days = self._days(X_copy)
+        # Windows and EWMs stop at the last day of the history
+        ends = np.clip(days, 0, self.n_days_)
+
+        for lag in self.lags:
+            values = np.full(n_rows, np.nan, dtype=np.float32)
+            source = days - lag
+            found = known & (source >= 0) & (source < self.n_days_)
+            values[found] = self.sales_[rows[found], source[found]]
+            X_copy[f'{self.target}_lag_{lag}'] = values
+
+        rolling = {}
+        if self.windows and known.any():
+            start = max(int(ends[known].min()) - max(self.windows), 0)
+            stop = int(ends[known].max())
+            rolling = self._rolling(rows[known], ends[known], start, stop)
+
+        for window in self.windows:
+            for stat in self.stats:
+                values = np.full(n_rows, np.nan, dtype=np.float32)
+                if rolling:
+                    values[known] = rolling[(window, stat)]
+                X_copy[f'{self.target}_roll{window}_{stat}'] = values
+
+        for i, span in enumerate(self.ewm_spans):
+            values = np.full(n_rows, np.nan, dtype=np.float32)
+            values[known] = self._ewm[i, rows[known], ends[known]]
+            X_copy[f'{self.target}_ewm{span}'] = values
+
+        return X_copy
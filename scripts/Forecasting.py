@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+
+from Utils import DataUtils, logger
+
+# store.csv columns a forecast depends on
+STORE_COLUMNS = ['Store', 'StoreType', 'Assortment', 'CompetitionDistance', 'CompetitionOpenSinceMonth',
+                 'CompetitionOpenSinceYear', 'Promo2', 'Promo2SinceWeek', 'Promo2SinceYear', 'PromoInterval']
+
+# The columns of a train.csv row merged with store.csv, in the order of the API's SalesData
+GRID_COLUMNS = ['Store', 'DayOfWeek', 'Date', 'Open', 'Promo', 'StateHoliday', 'SchoolHoliday'] + STORE_COLUMNS[1:]
+
+
+def state_holidays(dates, country: str = 'DE', subdiv: str = None) -> np.ndarray:
+    '''
+    StateHoliday code of every date as in train.csv: `a` public holiday, `b` Easter
+    (Good Friday and Easter Monday), `c` Christmas and `0` for none
+
+    Parameters:
+    -----------
+        dates: Dates to look up
+        country(str): ISO code of the country whose calendar is used
+        subdiv(str): Optional subdivision (state) code
+
+    Returns:
+    --------
+        np.ndarray: One code per date
+    '''
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+    codes = np.full(len(dates), '0', dtype=object)
+    if not len(dates):
+        return codes
+
+    years = range(dates.min().year, dates.max().year + 1)
+    calendar = DataUtils().holiday_calendar(country, subdiv, years)
+
+    # Classified by date, the holiday names depend on the language of the holidays package
+    easter_days = pd.DatetimeIndex([pd.Timestamp(easter(year)) + pd.Timedelta(days=offset)
+                                    for year in years for offset in (-2, 1)])
+    is_holiday = dates.isin(calendar.index)
+    codes[is_holiday] = 'a'
+    codes[is_holiday & dates.isin(easter_days)] = 'b'
+    codes[is_holiday & (dates.month == 12) & dates.day.isin([25, 26])] = 'c'
+
+    return codes
+
+
+def forecast_grid(store: pd.DataFrame, store_ids=None, start_date=None, horizon: int = 42,
+                  promo_dates: list = None, country: str = 'DE') -> pd.DataFrame:
+    '''
+    Builds the feature rows of every store for `horizon` days from `start_date` in one step.
+
+    The store columns come from store.csv, the calendar columns are derived from the
+    date: stores are closed on Sundays and public holidays, StateHoliday comes from
+    the holiday calendar. Promotions aren't known ahead, the stores run one on the
+    `promo_dates` and none otherwise, and there is no school holiday.
+
+    Parameters:
+    -----------
+        store(pd.DataFrame): One row per store with the STORE_COLUMNS, e.g. store.csv
+        store_ids(list): Stores to forecast, all the stores of `store` by default
+        start_date: First forecast day, tomorrow by default
+        horizon(int): Number of days
+        promo_dates(list): Days with a promotion
+        country(str): ISO code of the holiday calendar
+
+    Returns:
+    --------
+        pd.DataFrame: len(store_ids) * horizon rows with the GRID_COLUMNS, by store then date
+    '''
+    if horizon < 1:
+        raise ValueError("horizon must be a positive integer")
+
+    if store_ids is not None:
+        store_ids = np.unique(np.asarray(store_ids))
+        unknown = np.setdiff1d(store_ids, store['Store'].to_numpy())
+        if len(unknown):
+            raise ValueError(f"Unknown stores: {', '.join(map(str, unknown[:10]))}")
+        store = store[store['Store'].isin(store_ids)]
+
+    start_date = pd.Timestamp(start_date if start_date is not None else pd.Timestamp.today() + pd.Timedelta(days=1))
+    dates = pd.date_range(start_date.normalize(), periods=horizon, freq='D')
+
+    day_of_week = dates.dayofweek.to_numpy() + 1
+    holiday = state_holidays(dates, country)
+    promo = dates.isin(pd.to_datetime(promo_dates)) if promo_dates is not None else np.zeros(horizon, dtype=bool)
+
+    # The calendar is computed once for the horizon and tiled over the stores
+    grid = store[STORE_COLUMNS].loc[store.index.repeat(horizon)].reset_index(drop=True)
+    grid['Date'] = np.tile(dates.to_numpy(), len(store))
+    grid['DayOfWeek'] = np.tile(day_of_week, len(store))
+    grid['Open'] = np.tile(((day_of_week != 7) & (holiday == '0')).astype(int), len(store))
+    grid['Promo'] = np.tile(promo.astype(int), len(store))
+    grid['StateHoliday'] = np.tile(holiday, len(store))
+    grid['SchoolHoliday'] = 0
+
+    return grid[GRID_COLUMNS]
+
+
+class Forecaster:
+    '''
+    Direct multi-horizon forecasts: every store and day of the horizon is built as one
+    feature grid and scored with a single predict call.
+
+    Parameters:
+    -----------
+        pipeline(Pipeline): Fitted preprocessing pipeline
+        model: Fitted regressor predicting Sales
+        store(pd.DataFrame): store.csv
+        country(str): ISO code of the holiday calendar
+    '''
+
+    def __init__(self, pipeline, model, store: pd.DataFrame, country: str = 'DE'):
+        self.pipeline = pipeline
+        self.model = model
+        self.store = store
+        self.country = country
+
+
+    def forecast(self, store_ids=None, start_date=None, horizon: int = 42, promo_dates: list = None) -> pd.DataFrame:
+        '''
+        Forecasts the sales of the stores for `horizon` days from `start_date`
+
+        Parameters:
+        -----------
+            store_ids(list): Stores to forecast, all of them by default
+            start_date: First forecast day, tomorrow by default
+            horizon(int): Number of days, six weeks by default
+            promo_dates(list): Days with a promotion
+
+        Returns:
+        --------
+            pd.DataFrame: Tidy (Store, Date, Sales) frame, by store then date
+        '''
+        grid = forecast_grid(self.store, store_ids, start_date, horizon, promo_dates, self.country)
+        logger.info(f"Forecasting {grid['Store'].nunique()} stores over {horizon} days")
+
+        # The custom transformers may modify the frame they get
+        sales = np.asarray(self.model.predict(self.pipeline.transform(grid.copy())), dtype=np.float64)
+        # A closed store doesn't sell, as in train.csv
+        sales[grid['Open'].to_numpy() == 0] = 0.0
+
+        return pd.DataFrame({'Store': grid['Store'].to_numpy(), 'Date': grid['Date'].to_numpy(), 'Sales': sales})
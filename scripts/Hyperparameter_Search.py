@@ -0,0 +1,293 @@
+import os
+import math
+import time
+import hashlib
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+from xgboost import XGBRegressor
+
+from Utils import logger
+from Model_IO import save_model
+
+
+def time_series_folds(dates: pd.Series, n_splits: int = 3, valid_days: int = 42, gap_days: int = 0) -> list:
+    '''
+    Expanding window folds over the dates: each fold validates on `valid_days` consecutive
+    days and trains on everything before them, the last fold ends on the last date.
+
+    Parameters:
+    -----------
+        dates(pd.Series): Date of every row
+        n_splits(int): Number of folds
+        valid_days(int): Length of each validation window, 42 days is the forecast horizon
+        gap_days(int): Days left out between the training and the validation part
+
+    Returns:
+    --------
+        list: (train_index, valid_index, valid_start) per fold, oldest first
+    '''
+    days = pd.to_datetime(dates).to_numpy(dtype='datetime64[D]')
+    last_day = days.max()
+
+    folds = []
+    for split in reversed(range(n_splits)):
+        valid_end = last_day - np.timedelta64(split * valid_days, 'D')
+        valid_start = valid_end - np.timedelta64(valid_days - 1, 'D')
+        train_end = valid_start - np.timedelta64(gap_days, 'D')
+
+        train_index = np.flatnonzero(days < train_end)
+        valid_index = np.flatnonzero((days >= valid_start) & (days <= valid_end))
+        if not len(train_index) or not len(valid_index):
+            raise ValueError(f"Not enough history for {n_splits} folds of {valid_days} days")
+
+        folds.append((train_index, valid_index, str(valid_start)))
+
+    return folds
+
+
+class FoldCache:
+    '''
+    Preprocessed (X_train, y_train, X_valid, y_valid) of every fold, stored on disk.
+
+    The pipeline is fitted on the training part of each fold only, so no statistics of
+    the validation window leak into its features. The files are keyed on a hash of the
+    data, the fold and the pipeline parameters, so later searches over the same data
+    skip the preprocessing, and worker processes load a fold by path instead of having
+    the matrices pickled to them.
+
+    Parameters:
+    -----------
+        cache_dir(str): Directory of the .npz/.npy files
+    '''
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    @staticmethod
+    def data_hash(data: pd.DataFrame) -> str:
+        return hashlib.blake2b(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes(), digest_size=16).hexdigest()
+
+
+    def fold_paths(self, key: str) -> dict:
+        return {name: os.path.join(self.cache_dir, f'{key}.{name}.{"npz" if name.startswith("X") else "npy"}')
+                for name in ('X_train', 'y_train', 'X_valid', 'y_valid')}
+
+
+    def build(self, pipeline, data: pd.DataFrame, target: str, folds: list) -> list:
+        '''
+        Writes the matrices of the folds that aren't cached yet
+
+        Returns:
+        --------
+            list: The file paths of every fold
+        '''
+        features = data.drop(columns=target)
+        y = data[target].to_numpy(dtype=np.float32)
+        base = f"{self.data_hash(data)}{sorted(pipeline.get_params(deep=True).items(), key=lambda item: item[0])!r}"
+
+        all_paths = []
+        for train_index, valid_index, valid_start in folds:
+            key = hashlib.blake2b(f"{base}{valid_start}{len(train_index)}{len(valid_index)}".encode(), digest_size=16).hexdigest()
+            paths = self.fold_paths(key)
+
+            if not all(os.path.exists(path) for path in paths.values()):
+                logger.info(f"Preprocessing the fold validating from {valid_start}...")
+                fold_pipeline = clone(pipeline).fit(features.iloc[train_index])
+                sparse.save_npz(paths['X_train'], sparse.csr_matrix(fold_pipeline.transform(features.iloc[train_index])))
+                sparse.save_npz(paths['X_valid'], sparse.csr_matrix(fold_pipeline.transform(features.iloc[valid_index])))
+                np.save(paths['y_train'], y[train_index])
+                np.save(paths['y_valid'], y[valid_index])
+
+            all_paths.append(paths)
+
+        return all_paths
+
+
+def _limit_threads(nthread: int):
+    # Set before the worker first runs OpenMP code, so every pool process stays on its share of the cores
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(nthread)
+
+
+def _evaluate(params: dict, paths: dict, n_estimators: int, early_stopping_rounds: int, nthread: int) -> dict:
+    '''
+    Trains one candidate on one fold and scores it on the validation window
+    '''
+    X_train, X_valid = sparse.load_npz(paths['X_train']), sparse.load_npz(paths['X_valid'])
+    y_train, y_valid = np.load(paths['y_train']), np.load(paths['y_valid'])
+
+    start = time.perf_counter()
+    model = XGBRegressor(**params, n_estimators=n_estimators, early_stopping_rounds=early_stopping_rounds, n_jobs=nthread)
+    model.fit(X_train, y_train, eval_set=[(X_valid, y_valid)], verbose=False)
+
+    error = model.predict(X_valid) - y_valid
+
+    return {
+        'rmse': float(np.sqrt(np.mean(error ** 2))),
+        'mae': float(np.mean(np.abs(error))),
+        'best_iteration': int(model.best_iteration),
+        'fit_time': time.perf_counter() - start,
+    }
+
+
+class HyperparameterSearch:
+    '''
+    Successive halving search over XGBRegressor parameters with time-based cross-validation.
+
+    Every candidate is first trained on all folds with a small number of trees, only the
+    best 1/`factor` of them get `factor` times more trees in the next rung, until one
+    candidate is left or `max_estimators` is reached. The (candidate, fold) jobs of a rung
+    run in a process pool of `n_jobs` workers, each capped to `nthread` XGBoost/OpenMP
+    threads, so n_jobs * nthread stays within the cores.
+
+    Parameters:
+    -----------
+        pipeline(Pipeline): Unfitted preprocessing pipeline, fitted per fold
+        param_grid(dict): Lists of values per XGBRegressor parameter
+        n_candidates(int): Sample this many candidates from the grid, None tries all of them
+        n_splits(int): Number of time-based folds
+        valid_days(int): Days in each validation window
+        min_estimators(int): Trees of the first rung
+        max_estimators(int): Most trees a candidate gets
+        factor(int): Fraction of candidates kept and growth of the trees per rung
+        early_stopping_rounds(int): Early stopping on the validation window of each fold
+        n_jobs(int): Worker processes, defaults to cpu_count // nthread
+        nthread(int): Threads of every XGBoost job
+        cache_dir(str): Where the fold matrices are cached
+        random_state(int): Seed of the candidate sampling
+    '''
+
+    def __init__(self, pipeline, param_grid: dict, n_candidates: int = None, n_splits: int = 3, valid_days: int = 42,
+                 min_estimators: int = 100, max_estimators: int = 1000, factor: int = 3, early_stopping_rounds: int = 50,
+                 n_jobs: int = None, nthread: int = 1, cache_dir: str = '.fold_cache', random_state: int = 42):
+        self.pipeline = pipeline
+        self.param_grid = param_grid
+        self.n_candidates = n_candidates
+        self.n_splits = n_splits
+        self.valid_days = valid_days
+        self.min_estimators = min_estimators
+        self.max_estimators = max_estimators
+        self.factor = factor
+        self.early_stopping_rounds = early_stopping_rounds
+        self.nthread = nthread
+        self.n_jobs = n_jobs or max(1, (os.cpu_count() or 1) // nthread)
+        self.cache_dir = cache_dir
+        self.random_state = random_state
+
+
+    def candidates(self) -> list:
+        if self.n_candidates is None:
+            return list(ParameterGrid(self.param_grid))
+
+        return list(ParameterSampler(self.param_grid, self.n_candidates, random_state=self.random_state))
+
+
+    def _run_rung(self, jobs: list) -> list:
+        if self.n_jobs == 1:
+            return [_evaluate(*job) for job in jobs]
+
+        # spawn, a forked child would inherit the OpenMP runtime state of the parent
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.n_jobs, mp_context=context, initializer=_limit_threads, initargs=(self.nthread,)) as pool:
+            return list(pool.map(_evaluate, *zip(*jobs)))
+
+
+    def fit(self, data: pd.DataFrame, target: str = 'Sales', date_col: str = 'Date'):
+        '''
+        Runs the search, then refits the pipeline and the best candidate on all the data
+
+        Parameters:
+        -----------
+            data(pd.DataFrame): Raw rows with the target, e.g. train.csv merged with store.csv
+            target(str): Target column
+            date_col(str): Column the folds are split on
+        '''
+        folds = time_series_folds(data[date_col], self.n_splits, self.valid_days)
+        fold_paths = FoldCache(self.cache_dir).build(self.pipeline, data, target, folds)
+
+        candidates = dict(enumerate(self.candidates()))
+        n_estimators = self.min_estimators
+        rows = []
+
+        for rung in range(math.ceil(math.log(max(self.max_estimators / self.min_estimators, 1), self.factor)) + 1):
+            ids = list(candidates)
+            logger.info(f"Rung {rung}: {len(ids)} candidates with {n_estimators} trees")
+
+            jobs = [(candidates[i], paths, n_estimators, self.early_stopping_rounds, self.nthread)
+                    for i in ids for paths in fold_paths]
+            scores = self._run_rung(jobs)
+
+            rung_rows = []
+            for position, i in enumerate(ids):
+                fold_scores = scores[position * len(fold_paths):(position + 1) * len(fold_paths)]
+                rmse = [score['rmse'] for score in fold_scores]
+                rung_rows.append({
+                    'candidate': i, 'rung': rung, 'n_estimators': n_estimators, **candidates[i],
+                    'rmse_mean': float(np.mean(rmse)), 'rmse_std': float(np.std(rmse)),
+                    'mae_mean': float(np.mean([score['mae'] for score in fold_scores])),
+                    'best_iteration': int(np.mean([score['best_iteration'] for score in fold_scores])),
+                    'fit_time': float(np.sum([score['fit_time'] for score in fold_scores])),
+                })
+            rows.extend(rung_rows)
+
+            keep = max(1, len(ids) // self.factor)
+            if len(ids) == 1 or n_estimators >= self.max_estimators:
+                break
+
+            survivors = sorted(rung_rows, key=lambda row: row['rmse_mean'])[:keep]
+            candidates = {row['candidate']: candidates[row['candidate']] for row in survivors}
+            n_estimators = min(n_estimators * self.factor, self.max_estimators)
+
+        self.results_ = pd.DataFrame(rows).sort_values(['rung', 'rmse_mean'], ascending=[False, True], ignore_index=True)
+        best = self.results_.iloc[0]
+        self.best_params_ = candidates[best['candidate']]
+        self.best_score_ = best['rmse_mean']
+
+        # Without a validation window the final model gets the trees early stopping chose in the folds
+        self.best_estimators_ = int(best['best_iteration']) + 1
+        logger.info(f"Best candidate {best['candidate']}: rmse {self.best_score_:.2f} with {self.best_estimators_} trees, {self.best_params_}")
+
+        features = data.drop(columns=target)
+        self.best_pipeline_ = clone(self.pipeline).fit(features)
+        self.best_model_ = XGBRegressor(**self.best_params_, n_estimators=self.best_estimators_, n_jobs=self.n_jobs * self.nthread)
+        self.best_model_.fit(self.best_pipeline_.transform(features), data[target].to_numpy())
+
+        return self
+
+
+    def save(self, models_dir: str = 'models') -> dict:
+        '''
+        Writes the refitted pipeline and model in the layout the API reads, next to the results table
+
+        Returns:
+        --------
+            dict: Paths of the written files
+        '''
+        os.makedirs(models_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime('%d-%m-%Y-%H-%M-%S')
+
+        paths = {
+            'pipeline': os.path.join(models_dir, 'preprocessing_pipeline.pkl'),
+            'model': os.path.join(models_dir, f'model_{timestamp}.ubj'),
+            'results': os.path.join(models_dir, f'search_results_{timestamp}.csv'),
+        }
+
+        joblib.dump(self.best_pipeline_, paths['pipeline'])
+        feature_names = self.best_pipeline_.steps[-1][1].get_feature_names_out() \
+            if hasattr(self.best_pipeline_.steps[-1][1], 'get_feature_names_out') else None
+        save_model(self.best_model_, paths['model'], feature_names=feature_names,
+                   extra={'search': {'params': self.best_params_, 'cv_rmse': self.best_score_, 'n_splits': self.n_splits,
+                                     'valid_days': self.valid_days}})
+        self.results_.to_csv(paths['results'], index=False)
+
+        return paths
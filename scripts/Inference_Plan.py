@@ -0,0 +1,222 @@
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from Utils import DataUtils
+from Custom_Transformers import (MissingDataHandler, OutlierHandler, ProperDtypes, CompactDtypes, DateFeatures, Scaler,
+                                 ColumnEncoder)
+
+# Key used for NaN in the one-hot lookup tables, NaN can't be found in a dict by value
+_NAN = object()
+
+
+def _is_missing(value) -> bool:
+    return value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value))
+
+
+class InferencePlan:
+    '''
+    A fitted preprocessing pipeline flattened into a list of per-value operations.
+
+    Scoring one request through the pipeline builds a one-row DataFrame and runs every
+    transformer on it, where the pandas overhead dwarfs the actual work. The plan applies
+    the same steps (imputation constants, clip bounds, casts, date features, scaling and
+    a lookup table from category to one-hot column) directly to the values of a record
+    and returns the row of the model's input matrix.
+
+    Parameters:
+    -----------
+        operations(list): (name, params) tuples executed in order on every record
+        lookups(list): (column, {category: output column}) per input column of the encoder
+        n_features(int): Number of columns of the encoded output
+        handle_unknown(str): `error` raises on unseen categories, `ignore` leaves the row empty
+        dtype: dtype of the encoded output
+        numeric(list): (column, output column) of the values a ColumnEncoder passes through
+    '''
+
+    def __init__(self, operations: list, lookups: list, n_features: int, handle_unknown: str = 'error', dtype=np.float64,
+                 numeric: list = None):
+        self.operations = operations
+        self.lookups = lookups
+        self.numeric = numeric or []
+        self.n_features = n_features
+        self.handle_unknown = handle_unknown
+        self.dtype = dtype
+        self.data_utils = DataUtils()
+
+
+    @classmethod
+    def from_pipeline(cls, pipeline: Pipeline):
+        '''
+        Compiles a fitted preprocessing pipeline ending with a OneHotEncoder or a ColumnEncoder
+
+        Raises:
+        -------
+            ValueError: When the pipeline holds a step that can't be compiled
+        '''
+        operations = []
+        *steps, (_, encoder) = pipeline.steps
+
+        for name, step in steps:
+            operations.extend(cls._compile_step(name, step))
+
+        numeric = []
+        if isinstance(encoder, ColumnEncoder):
+            numeric = [(col, index) for index, col in enumerate(encoder.numeric_cols_)]
+            encoder = encoder.encoder_
+
+        if not isinstance(encoder, OneHotEncoder):
+            raise ValueError(f"The last step must be a OneHotEncoder or a ColumnEncoder, got {type(encoder).__name__}")
+        if encoder.drop_idx_ is not None or encoder._infrequent_enabled:
+            raise ValueError("OneHotEncoder with drop or infrequent categories can't be compiled")
+
+        lookups = []
+        offset = len(numeric)
+        for col, categories in zip(encoder.feature_names_in_, encoder.categories_):
+            table = {}
+            for index, category in enumerate(categories):
+                table[_NAN if _is_missing(category) else category] = offset + index
+            lookups.append((col, table))
+            offset += len(categories)
+
+        return cls(operations, lookups, offset, encoder.handle_unknown, encoder.dtype, numeric)
+
+
+    @staticmethod
+    def _compile_step(name: str, step) -> list:
+
+        if isinstance(step, MissingDataHandler):
+            return [('fill', dict(zip(step.cols, step.imputer.statistics_)))]
+
+        if isinstance(step, OutlierHandler):
+            if step.method != 'IQR':
+                raise ValueError(f"Step `{name}`: z_score drops rows and can't be applied to a single record")
+            if not hasattr(step, 'fit_cols_'):
+                raise ValueError(f"Step `{name}` has no learned bounds, refit the pipeline to compile it")
+            bounds = {col: (step.lower_bound_[col], step.upper_bound_[col]) for col in step.fit_cols_}
+            return [('clip', bounds)]
+
+        if isinstance(step, ProperDtypes):
+            cast = np.dtype(step.proper_type).type
+            return [('to_datetime', 'Date'), ('cast', {col: cast for col in step.cols})]
+
+        if isinstance(step, CompactDtypes):
+            # Narrower types and categories don't change the value of a single record
+            return []
+
+        if isinstance(step, DateFeatures):
+            # The calendar the step was fitted with, pickles older than the parameters get its defaults
+            return [('date_features', {'col': 'Date', 'country': step.country, 'subdiv': step.subdiv})]
+
+        if isinstance(step, Scaler):
+            if isinstance(step.scaler, StandardScaler):
+                return [('standard', {col: (mean, scale) for col, mean, scale
+                                      in zip(step.cols, step.scaler.mean_, step.scaler.scale_)})]
+            return [('minmax', {col: (scale, min_) for col, scale, min_
+                                in zip(step.cols, step.scaler.scale_, step.scaler.min_)})]
+
+        raise ValueError(f"Step `{name}` ({type(step).__name__}) can't be compiled")
+
+
+    def _apply(self, values: dict) -> dict:
+
+        for operation, params in self.operations:
+
+            if operation == 'fill':
+                for col, fill_value in params.items():
+                    if _is_missing(values[col]):
+                        values[col] = fill_value
+
+            elif operation == 'clip':
+                for col, (lower, upper) in params.items():
+                    if not _is_missing(values[col]):
+                        values[col] = min(max(values[col], lower), upper)
+
+            elif operation == 'cast':
+                for col, cast in params.items():
+                    values[col] = cast(values[col])
+
+            elif operation == 'to_datetime':
+                values[params] = pd.Timestamp(values[params])
+
+            elif operation == 'date_features':
+                date = values.pop(params['col'])
+                values['quarter'] = (date.month - 1) // 3 + 1
+                values['month'] = date.month
+                values['year'] = date.year
+                values['dayofyear'] = date.dayofyear
+                values['weekdays'] = values['DayOfWeek'] < 6
+                values['weekends'] = values['DayOfWeek'] >= 6
+                calendar = self.data_utils.holiday_calendar(params['country'], params['subdiv'],
+                                                            years=range(date.year, date.year + 1))
+                values['Holiday'] = calendar.get(date.normalize(), 'Not Holiday')
+
+            elif operation == 'standard':
+                for col, (mean, scale) in params.items():
+                    values[col] = (np.float64(values[col]) - mean) / scale
+
+            elif operation == 'minmax':
+                for col, (scale, min_) in params.items():
+                    values[col] = np.float64(values[col]) * scale + min_
+
+        return values
+
+
+    def _encode(self, values: dict) -> tuple:
+        columns = [index for _, index in self.numeric]
+        data = [np.nan if _is_missing(values[col]) else values[col] for col, _ in self.numeric]
+
+        for col, table in self.lookups:
+            value = values[col]
+            index = table.get(_NAN if _is_missing(value) else value)
+
+            if index is None:
+                if self.handle_unknown == 'error':
+                    raise ValueError(f"Found unknown category {value!r} in column `{col}`")
+                continue
+            columns.append(index)
+            data.append(1)
+
+        return columns, data
+
+
+    def transform_records(self, records) -> sparse.csr_matrix:
+        '''
+        Encodes records into the model's input matrix, row for row the same as the pipeline
+
+        Parameters:
+        -----------
+            records: A list of dicts or a numpy record array with the raw SalesData columns
+
+        Returns:
+        --------
+            sparse.csr_matrix: Matrix of shape (len(records), n_features)
+
+        Raises:
+        -------
+            ValueError: When a record misses a field or holds an unknown category
+        '''
+        if isinstance(records, np.ndarray):
+            records = [dict(zip(records.dtype.names, row.tolist())) for row in records]
+
+        indptr = [0]
+        indices = []
+        data = []
+        for record in records:
+            try:
+                columns, values = self._encode(self._apply(dict(record)))
+            except KeyError as e:
+                raise ValueError(f"Missing field `{e.args[0]}`") from None
+            indices.extend(columns)
+            data.extend(values)
+            indptr.append(len(indices))
+
+        data = np.array(data, dtype=self.dtype)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, self.n_features))
+
+
+    def transform_record(self, record: dict) -> sparse.csr_matrix:
+        return self.transform_records([record])
@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import datetime
+
+import xgboost
+from xgboost import XGBModel
+
+from Utils import logger
+
+# Extensions XGBoost saves and loads in its own format, by the name of the format
+NATIVE_FORMATS = {'.ubj': 'ubjson', '.json': 'json'}
+
+METADATA_SUFFIX = '.meta.json'
+
+
+def metadata_path(path: str) -> str:
+    '''
+    Path of the sidecar metadata file of a saved model, `model_x.ubj` -> `model_x.meta.json`
+    '''
+    return os.path.splitext(path)[0] + METADATA_SUFFIX
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def save_model(model: XGBModel, path: str, feature_names: list = None, extra: dict = None) -> dict:
+    '''
+    Saves an XGBoost estimator in the native format picked by the extension of `path`,
+    next to a sidecar metadata file with everything needed to rebuild the estimator.
+
+    Unlike a pickle the booster file doesn't depend on the Python or scikit-learn
+    version and loads without unpickling the estimator object.
+
+    Parameters:
+    -----------
+        model(XGBModel): A fitted XGBRegressor/XGBClassifier
+        path(str): Output file, `.ubj` (UBJSON, compact) or `.json`
+        feature_names(list): Names of the model's input columns, e.g. the encoder's
+            get_feature_names_out(), defaults to the names the booster was fitted with
+        extra(dict): Additional JSON serializable entries for the metadata file
+
+    Returns:
+    --------
+        dict: The metadata that was written
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in NATIVE_FORMATS:
+        raise ValueError(f"Unsupported model extension `{extension}`, use one of {', '.join(NATIVE_FORMATS)}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    model.save_model(path)
+
+    booster = model.get_booster()
+    if feature_names is None and booster.feature_names is not None:
+        feature_names = list(booster.feature_names)
+
+    metadata = {
+        'format': NATIVE_FORMATS[extension],
+        'estimator': type(model).__name__,
+        'xgboost_version': xgboost.__version__,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'n_features': booster.num_features(),
+        'feature_names': [str(name) for name in feature_names] if feature_names is not None else None,
+        'best_iteration': getattr(model, 'best_iteration', None),
+        'params': {key: value for key, value in model.get_params().items() if _is_json(value)},
+        'sha256': _file_hash(path),
+    }
+    if extra:
+        metadata.update(extra)
+
+    with open(metadata_path(path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    logger.info(f"Saved {metadata['estimator']} to {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB)")
+
+    return metadata
+
+
+def _is_json(value) -> bool:
+    try:
+        json.dumps(value)
+    except TypeError:
+        return False
+
+    return True
+
+
+def read_metadata(path: str) -> dict:
+    '''
+    Reads the sidecar metadata of a saved model, an empty dict when there is none
+    '''
+    sidecar = metadata_path(path)
+    if not os.path.exists(sidecar):
+        return {}
+
+    with open(sidecar) as f:
+        return json.load(f)
+
+
+def load_model(path: str, verify: bool = False) -> XGBModel:
+    '''
+    Loads a model written by save_model.
+
+    The estimator class and its parameters come from the sidecar file, without one
+    an XGBRegressor is assumed.
+
+    Parameters:
+    -----------
+        path(str): The `.ubj` or `.json` booster file
+        verify(bool): Check the file against the hash recorded in the metadata
+
+    Returns:
+    --------
+        XGBModel: The fitted estimator
+    '''
+    metadata = read_metadata(path)
+
+    if verify and metadata.get('sha256') and metadata['sha256'] != _file_hash(path):
+        raise ValueError(f"{path} doesn't match the hash in {metadata_path(path)}")
+
+    estimator = getattr(xgboost, metadata.get('estimator', 'XGBRegressor'), None)
+    if estimator is None or not issubclass(estimator, XGBModel):
+        raise ValueError(f"Unknown estimator `{metadata['estimator']}` in {metadata_path(path)}")
+
+    model = estimator(**metadata.get('params', {}))
+    model.load_model(path)
+
+    n_features = metadata.get('n_features')
+    if n_features is not None and model.get_booster().num_features() != n_features:
+        raise ValueError(f"{path} has {model.get_booster().num_features()} features, the metadata says {n_features}")
+
+    if metadata.get('xgboost_version') not in (None, xgboost.__version__):
+        logger.warning(f"{os.path.basename(path)} was saved with xgboost {metadata['xgboost_version']}, "
+                       f"loading with {xgboost.__version__}")
+
+    return model
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from Utils import logger
+from Custom_Transformers import LagFeatures
+
+
+class SequenceDataset:
+    '''
+    Lookback windows over the daily history of every store, for the LSTM models.
+
+    The rows are sorted by store and date into one contiguous float32 array, and the
+    windows are a strided view over it (`sliding_window_view`): window i is rows
+    i .. i + lookback - 1 and its target is the target of its last row. Only windows
+    of `lookback` consecutive days of a single store are kept, they are addressed by
+    their start row, so the dataset holds the data once whatever the lookback. Rows are
+    copied out of the view one batch at a time when the windows are streamed.
+
+    Parameters:
+    -----------
+        X(np.ndarray): Preprocessed features, one row per store and day
+        y(np.ndarray): Target of every row
+        stores(np.ndarray): Store of every row
+        dates(np.ndarray): Date of every row
+        lookback(int): Days in a window, e.g. 7, 14 or 42
+    '''
+
+    def __init__(self, X, y, stores, dates, lookback: int = 7):
+        if lookback < 1:
+            raise ValueError("lookback must be a positive integer")
+        if not len(X) == len(y) == len(stores) == len(dates):
+            raise ValueError("X, y, stores and dates must have the same number of rows")
+
+        stores = np.asarray(stores)
+        days = pd.to_datetime(np.asarray(dates)).to_numpy(dtype='datetime64[D]')
+        order = np.lexsort((days, stores))
+
+        self.lookback = lookback
+        self.X = np.ascontiguousarray(np.asarray(X, dtype=np.float32)[order])
+        self.y = np.asarray(y, dtype=np.float32)[order]
+        self.stores = stores[order]
+        self.days = days[order]
+
+        # A window is valid when it doesn't cross into another store and spans exactly
+        # `lookback` days, i.e. the store has no missing day inside it
+        last = np.arange(lookback - 1, len(self.X))
+        first = last - (lookback - 1)
+        valid = (self.stores[first] == self.stores[last]) & \
+                (self.days[last] - self.days[first] == np.timedelta64(lookback - 1, 'D'))
+        self.starts = first[valid]
+
+        logger.info(f"{len(self.starts)} windows of {lookback} days over {len(self.X)} rows")
+
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, pipeline, target: str = 'Sales', lookback: int = 7,
+                   target_lags: list = None):
+        '''
+        Preprocesses a frame with a fitted pipeline and builds its windows
+
+        Parameters:
+        -----------
+            data(pd.DataFrame): Rows with Store, Date and the target, e.g. train.csv merged with store.csv
+            pipeline(Pipeline): Fitted preprocessing pipeline
+            target(str): Target column
+            lookback(int): Days in a window
+            target_lags(list): Append the target of that many days before every row as features
+                               (LagFeatures), e.g. [1, 7]. Days missing from the history are 0
+        '''
+        X = pipeline.transform(data.drop(columns=target))
+        if hasattr(X, 'toarray'):
+            X = X.toarray()
+
+        if target_lags:
+            X = np.hstack([X, cls._target_lags(data, target, target_lags)])
+
+        return cls(X, data[target].to_numpy(), data['Store'].to_numpy(), data['Date'].to_numpy(), lookback)
+
+
+    @staticmethod
+    def _target_lags(data: pd.DataFrame, target: str, lags: list) -> np.ndarray:
+        # Lags only look at the days before a row, the target of a window's last row stays out of it
+        history = pd.DataFrame({
+            'Store': data['Store'].to_numpy(),
+            'Date': pd.to_datetime(data['Date']).to_numpy(),
+            target: data[target].to_numpy(),
+        })
+        lag_features = LagFeatures(target=target, lags=list(lags), windows=[], stats=[], ewm_spans=[])
+        lagged = lag_features.fit(history).transform(history)[lag_features.get_feature_names_out()]
+
+        return lagged.fillna(0).to_numpy(dtype=np.float32)
+
+
+    def _subset(self, starts: np.ndarray):
+        subset = object.__new__(SequenceDataset)
+        subset.__dict__.update(self.__dict__)
+        subset.starts = starts
+
+        return subset
+
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+    @property
+    def n_features(self) -> int:
+        return self.X.shape[1]
+
+
+    @property
+    def windows(self) -> np.ndarray:
+        '''
+        Read only (n_rows - lookback + 1, lookback, n_features) view of every window
+        start, including the invalid ones, without copying the data
+        '''
+        return sliding_window_view(self.X, self.lookback, axis=0).transpose(0, 2, 1)
+
+
+    @property
+    def target_days(self) -> np.ndarray:
+        '''
+        Day predicted by each window, the day of its last row
+        '''
+        return self.days[self.starts + self.lookback - 1]
+
+
+    @property
+    def targets(self) -> np.ndarray:
+        '''
+        Target of each window, in the order of `starts`
+        '''
+        return self.y[self.starts + self.lookback - 1]
+
+
+    def split(self, valid_start) -> tuple:
+        '''
+        Splits the windows on the day they predict, sharing the underlying arrays
+
+        Parameters:
+        -----------
+            valid_start: First day of the validation windows
+
+        Returns:
+        --------
+            tuple: (train, valid) SequenceDatasets
+        '''
+        is_valid = self.target_days >= np.datetime64(pd.Timestamp(valid_start).date(), 'D')
+
+        return self._subset(self.starts[~is_valid]), self._subset(self.starts[is_valid])
+
+
+    def batches(self, batch_size: int = 128, shuffle: bool = False, seed: int = None):
+        '''
+        Yields (X, y) batches of windows, X of shape (batch, lookback, n_features)
+
+        Parameters:
+        -----------
+            batch_size(int): Windows per batch
+            shuffle(bool): Visit the windows in a random order
+            seed(int): Seed of the shuffling
+        '''
+        starts = np.random.default_rng(seed).permutation(self.starts) if shuffle else self.starts
+        windows = self.windows
+
+        for i in range(0, len(starts), batch_size):
+            batch = starts[i:i + batch_size]
+            # Fancy indexing copies only this batch out of the strided view
+            yield windows[batch], self.y[batch + self.lookback - 1]
+
+
+    def to_tf_dataset(self, batch_size: int = 128, shuffle: bool = False, seed: int = None):
+        '''
+        The windows as a batched and prefetched tf.data.Dataset, for Keras' fit/predict.
+
+        A new shuffled order is drawn on every pass (epoch) when `shuffle` is set.
+        '''
+        # Imported here, TensorFlow takes seconds to import and only the LSTM notebook needs it
+        try:
+            import tensorflow as tf
+        except ImportError:
+            raise ImportError("to_tf_dataset needs tensorflow, use batches() to feed another framework")
+
+        rng = np.random.default_rng(seed)
+
+        def generator():
+            yield from self.batches(batch_size, shuffle, int(rng.integers(2 ** 31)) if shuffle else None)
+
+        signature = (
+            tf.TensorSpec(shape=(None, self.lookback, self.n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        )
+
+        return tf.data.Dataset.from_generator(generator, output_signature=signature).prefetch(tf.data.AUTOTUNE)
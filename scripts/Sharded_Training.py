@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from xgboost import XGBRegressor
+
+from Utils import DataUtils, logger
+from Model_IO import save_model, read_metadata
+from Hyperparameter_Search import _limit_threads
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _shard_value(value) -> str:
+    # Form-encoded requests hold a list per field, and JSON ones may send 1, 1.0 or "1"
+    # for the same store, they must all land on the shard the training rows named `1`
+    if isinstance(value, (list, tuple)) and len(value) == 1:
+        value = value[0]
+
+    if isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return value.strip()
+        if number.is_integer():
+            return str(int(number))
+        return value.strip()
+
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool) \
+            and float(value).is_integer():
+        return str(int(value))
+
+    return str(value)
+
+
+def shard_key(record, by: list) -> str:
+    '''
+    Name of the shard a row or request belongs to, e.g. `Store=1` or `StoreType=a|Assortment=c`.
+    Integral numbers are written without decimals whatever their type
+    '''
+    return '|'.join(f"{col}={_shard_value(record[col])}" for col in by)
+
+
+def shard_file(key: str) -> str:
+    # Keys hold `|` and `=`, which don't belong in file names
+    return f"shard_{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}.ubj"
+
+
+def _train_shard(key: str, X, y: np.ndarray, params: dict, path: str, data_hash: str, nthread: int) -> dict:
+    start = time.perf_counter()
+    model = XGBRegressor(**params, n_jobs=nthread).fit(X, y)
+    save_model(model, path, extra={'shard': key, 'rows': len(y), 'data_hash': data_hash})
+
+    return {'shard': key, 'rows': len(y), 'fit_time': time.perf_counter() - start}
+
+
+class ShardedTrainer:
+    '''
+    Trains one XGBRegressor per store or per cluster of stores, in a pool of worker processes.
+
+    The preprocessing pipeline is shared: it is fitted once on all rows, so every shard
+    sees the same features and the API transforms a request once whatever its shard.
+    Shards with fewer than `min_rows` rows get no model of their own and are served by a
+    global model trained on every row.
+
+    The bundle written to `output_dir`:
+        manifest.json               shard keys -> model files, the fallback and the pipeline
+        preprocessing_pipeline.pkl  the shared pipeline
+        shards/shard_<hash>.ubj     one native XGBoost model (+ .meta.json) per shard
+        shards/global.ubj           the fallback model
+
+    A shard whose model file and metadata already exist for the same training rows is
+    skipped, so an interrupted run resumes with the shards that are missing.
+
+    Parameters:
+    -----------
+        pipeline(Pipeline): Unfitted preprocessing pipeline
+        by(list): Columns defining a shard, ['Store'] or ['StoreType', 'Assortment']
+        params(dict): XGBRegressor parameters of every shard
+        output_dir(str): Directory of the bundle
+        min_rows(int): Smallest shard that gets its own model
+        n_jobs(int): Worker processes, defaults to cpu_count // nthread
+        nthread(int): Threads of every XGBoost job
+    '''
+
+    def __init__(self, pipeline, by: list = ('Store',), params: dict = None, output_dir: str = 'models/sharded',
+                 min_rows: int = 100, n_jobs: int = None, nthread: int = 1):
+        self.pipeline = pipeline
+        self.by = list(by)
+        self.params = params or {'n_estimators': 200, 'max_depth': 6, 'learning_rate': 0.1}
+        self.output_dir = output_dir
+        self.min_rows = min_rows
+        self.nthread = nthread
+        self.n_jobs = n_jobs or max(1, (os.cpu_count() or 1) // nthread)
+
+
+    def _is_done(self, path: str, data_hash: str) -> bool:
+        # The metadata is written after the model, so its presence marks a finished shard
+        return os.path.exists(path) and read_metadata(path).get('data_hash') == data_hash
+
+
+    def fit(self, data: pd.DataFrame, target: str = 'Sales'):
+        '''
+        Trains the missing shards and writes the bundle
+
+        Parameters:
+        -----------
+            data(pd.DataFrame): Raw rows with the target, e.g. train.csv merged with store.csv
+            target(str): Target column
+
+        Returns:
+        --------
+            dict: The manifest
+        '''
+        shard_dir = os.path.join(self.output_dir, 'shards')
+        os.makedirs(shard_dir, exist_ok=True)
+
+        features = data.drop(columns=target)
+        y = data[target].to_numpy(dtype=np.float32)
+
+        self.pipeline.fit(features)
+        X = sparse.csr_matrix(self.pipeline.transform(features))
+        joblib.dump(self.pipeline, os.path.join(self.output_dir, 'preprocessing_pipeline.pkl'))
+
+        groups = {
+            shard_key(dict(zip(self.by, values if isinstance(values, tuple) else (values,))), self.by): index
+            for values, index in data.reset_index(drop=True).groupby(self.by, observed=True).indices.items()
+        }
+
+        jobs = []
+        targets = {}
+        # The global model comes first, the longest job shouldn't be the last one to start
+        for key, index in [('global', np.arange(len(data)))] + sorted(groups.items()):
+            if key != 'global' and len(index) < self.min_rows:
+                continue
+
+            file_name = 'global.ubj' if key == 'global' else shard_file(key)
+            path = os.path.join(shard_dir, file_name)
+            data_hash = hashlib.blake2b(index.tobytes() + y[index].tobytes(), digest_size=16)
+            data_hash.update(json.dumps(self.params, sort_keys=True).encode())
+            data_hash = data_hash.hexdigest()
+            targets[key] = (file_name, path, data_hash)
+
+            if self._is_done(path, data_hash):
+                continue
+            jobs.append((key, X[index], y[index], self.params, path, data_hash, self.nthread))
+
+        logger.info(f"Training {len(jobs)} of {len(targets)} shard models with {self.n_jobs} workers")
+        self.results_ = self._run(jobs)
+
+        # Only the finished shards are served, the stores of a failed one go to the fallback
+        # until the next run retrains it
+        if not self._is_done(*targets['global'][1:]):
+            raise RuntimeError("The global model failed, no bundle was written")
+        shards = {
+            key: os.path.join('shards', file_name)
+            for key, (file_name, path, data_hash) in targets.items()
+            if key != 'global' and self._is_done(path, data_hash)
+        }
+        failed = len(targets) - 1 - len(shards)
+        if failed:
+            logger.warning(f"{failed} shards failed and are served by the global model")
+
+        manifest = {
+            'by': self.by,
+            'pipeline': 'preprocessing_pipeline.pkl',
+            'fallback': os.path.join('shards', 'global.ubj'),
+            'shards': shards,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        return manifest
+
+
+    def _run(self, jobs: list) -> list:
+        results = []
+        if self.n_jobs == 1:
+            for job in jobs:
+                try:
+                    results.append(_train_shard(*job))
+                except Exception as e:
+                    logger.error(f"Shard {job[0]} failed: {e}")
+            return results
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.n_jobs, mp_context=context, initializer=_limit_threads,
+                                 initargs=(self.nthread,)) as pool:
+            # A failing shard doesn't stop the others, the next run retries it
+            futures = {pool.submit(_train_shard, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Shard {futures[future]} failed: {e}")
+
+        return results
+
+
+if __name__ == '__main__':
+    from Training import make_pipeline
+
+    parser = argparse.ArgumentParser(description='Per-store or per-cluster models on train.csv/store.csv')
+    parser.add_argument('--data-dir', default=DataUtils.data_dir)
+    parser.add_argument('--by', nargs='+', default=['Store'], help='Store, or StoreType Assortment')
+    parser.add_argument('--output-dir', default=os.path.join('models', 'sharded'))
+    parser.add_argument('--min-rows', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    data_utils = DataUtils()
+    data_utils.data_dir = args.data_dir
+    train = data_utils.load_data('train.csv')
+    data = train.merge(data_utils.load_data('store.csv'), on='Store', how='inner').drop(columns='Customers')
+
+    manifest = ShardedTrainer(make_pipeline(), by=args.by, output_dir=args.output_dir, min_rows=args.min_rows,
+                              n_jobs=args.workers).fit(data)
+    logger.info(f"Saved {len(manifest['shards'])} shard models to {args.output_dir}")
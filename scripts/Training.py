@@ -0,0 +1,344 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from xgboost import XGBRegressor
+
+from Utils import DataUtils, COMPACT_DTYPES, logger
+from Custom_Transformers import transform_iter
+from Model_IO import save_model
+
+
+class ChunkIter(xgb.DataIter):
+    '''
+    Feeds preprocessed chunks to XGBoost one at a time.
+
+    XGBoost walks the iterator more than once (to sketch the quantiles, then to build
+    the matrix), so it takes a factory that returns a fresh iterable of (X, y) chunks
+    on every pass instead of an iterator that could only be consumed once.
+
+    Parameters:
+    -----------
+        make_chunks(callable): Returns an iterable of (X, y) tuples, e.g. transform_iter(...)
+        cache_prefix(str): Where XGBoost pages the data to disk, only used by DMatrix
+            (external memory), QuantileDMatrix keeps the quantized data in memory
+    '''
+
+    def __init__(self, make_chunks, cache_prefix: str = None):
+        self.make_chunks = make_chunks
+        self.rows = 0
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+
+    def next(self, input_data) -> int:
+        if self._chunks is None:
+            self._chunks = iter(self.make_chunks())
+            self.rows = 0
+
+        try:
+            X, y = next(self._chunks)
+        except StopIteration:
+            return 0
+
+        input_data(data=X, label=y)
+        self.rows += X.shape[0]
+
+        return 1
+
+
+    def reset(self):
+        self._chunks = None
+
+
+class CheckpointCallback(xgb.callback.TrainingCallback):
+    '''
+    Saves the booster every `interval` rounds so an interrupted job can resume.
+
+    The booster is written to `checkpoint.ubj` through a temporary file, so a crash
+    while saving leaves the previous checkpoint intact, and `checkpoint.json` records
+    the number of rounds, the parameters it was trained with, the best iteration and
+    score of early stopping and whether the run already stopped early.
+
+    Parameters:
+    -----------
+        directory(str): Directory of the checkpoint files
+        params(dict): Training parameters, a checkpoint is only resumed with the same ones
+        interval(int): Rounds between two checkpoints
+    '''
+
+    def __init__(self, directory: str, params: dict, interval: int = 10):
+        self.directory = directory
+        self.params = params
+        self.interval = interval
+        self.state = {}
+        os.makedirs(directory, exist_ok=True)
+        super().__init__()
+
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.directory, 'checkpoint.ubj')
+
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, 'checkpoint.json')
+
+
+    def save(self, model: xgb.Booster):
+        tmp_path = self.model_path + '.tmp.ubj'
+        model.save_model(tmp_path)
+        os.replace(tmp_path, self.model_path)
+        self.save_state(model)
+
+        logger.info(f"Checkpoint saved after {model.num_boosted_rounds()} rounds")
+
+
+    def save_state(self, model: xgb.Booster, early_stopped: bool = False):
+        '''
+        Writes checkpoint.json for the booster saved in checkpoint.ubj
+
+        Parameters:
+        -----------
+            model(xgb.Booster): The checkpointed booster
+            early_stopped(bool): The run stopped early, resuming it must not train further
+        '''
+        best_iteration = model.attr('best_iteration')
+        best_score = model.attr('best_score')
+        self.state = {
+            'rounds': model.num_boosted_rounds(),
+            'params': self.params,
+            'best_iteration': int(best_iteration) if best_iteration is not None else None,
+            'best_score': float(best_score) if best_score is not None else None,
+            'early_stopped': early_stopped,
+        }
+
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+
+    def load(self):
+        '''
+        Returns the checkpointed booster, None when there is no checkpoint
+        '''
+        if not (os.path.exists(self.model_path) and os.path.exists(self.state_path)):
+            return None
+
+        with open(self.state_path) as f:
+            state = json.load(f)
+
+        if state['params'] != self.params:
+            raise ValueError(f"The checkpoint in {self.directory} was trained with other parameters, "
+                             "remove it or train with the same ones")
+
+        booster = xgb.Booster(model_file=self.model_path)
+        if state.get('best_iteration') is not None:
+            booster.set_attr(best_iteration=str(state['best_iteration']), best_score=str(state['best_score']))
+        self.state = state
+        logger.info(f"Resuming from the checkpoint after {booster.num_boosted_rounds()} rounds")
+
+        return booster
+
+
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        if (epoch + 1) % self.interval == 0:
+            self.save(model)
+
+        return False
+
+
+    def after_training(self, model):
+        self.save(model)
+
+        return model
+
+
+class OutOfCoreTrainer:
+    '''
+    Trains an XGBoost regressor from chunked data without holding the full feature matrix.
+
+    The preprocessing pipeline is fitted on a sample of the chunks, then every chunk is
+    read, preprocessed and handed to XGBoost through a ChunkIter. The training data is
+    built as a QuantileDMatrix, which only keeps the quantized features (about one byte
+    per value) instead of the float matrix, or with `external_memory` as a DMatrix paged
+    to disk. The evaluation set is a separate (validation) range, not the training data.
+
+    Parameters:
+    -----------
+        pipeline(Pipeline): Preprocessing pipeline, fitted by `fit_pipeline` unless already fitted
+        params(dict): xgb.train parameters
+        num_boost_round(int): Total number of boosting rounds
+        early_stopping_rounds(int): Stop when the validation score hasn't improved for this many rounds
+        checkpoint_dir(str): Save resumable checkpoints there, None disables them
+        checkpoint_interval(int): Rounds between two checkpoints
+        external_memory(bool): Page the training data to disk instead of quantizing it in memory
+        max_bin(int): Number of histogram bins per feature
+    '''
+
+    def __init__(self, pipeline, params: dict = None, num_boost_round: int = 1000, early_stopping_rounds: int = 50,
+                 checkpoint_dir: str = None, checkpoint_interval: int = 10, external_memory: bool = False,
+                 max_bin: int = 256):
+        self.pipeline = pipeline
+        self.params = {'objective': 'reg:squarederror', 'tree_method': 'hist', 'max_bin': max_bin, **(params or {})}
+        self.num_boost_round = num_boost_round
+        self.early_stopping_rounds = early_stopping_rounds
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.external_memory = external_memory
+
+
+    def fit_pipeline(self, make_chunks, target: str = 'Sales', sample_frac: float = 0.1, seed: int = 42):
+        '''
+        Fits the preprocessing pipeline on a random sample of the rows of every chunk
+
+        Parameters:
+        -----------
+            make_chunks(callable): Returns an iterable of raw frames, e.g. DataUtils.iter_data
+            target(str): Target column, dropped before fitting
+            sample_frac(float): Fraction of each chunk kept in the sample
+        '''
+        rng = np.random.default_rng(seed)
+        sample = pd.concat(
+            [chunk[rng.random(len(chunk)) < sample_frac] for chunk in make_chunks()], ignore_index=True
+        )
+        logger.info(f"Fitting the preprocessing pipeline on {len(sample)} sampled rows")
+        self.pipeline.fit(sample.drop(columns=target))
+
+        return self
+
+
+    def _matrix(self, make_chunks, target: str, ref=None, cache_name: str = 'train'):
+        def chunks():
+            return transform_iter(self.pipeline, make_chunks(), target=target)
+
+        if self.external_memory:
+            cache_dir = self.checkpoint_dir or '.'
+            os.makedirs(cache_dir, exist_ok=True)
+            data_iter = ChunkIter(chunks, cache_prefix=os.path.join(cache_dir, f'{cache_name}.cache'))
+            matrix = xgb.DMatrix(data_iter, missing=np.nan)
+        else:
+            data_iter = ChunkIter(chunks)
+            matrix = xgb.QuantileDMatrix(data_iter, missing=np.nan, max_bin=self.params['max_bin'], ref=ref)
+
+        logger.info(f"Built the {cache_name} matrix from {data_iter.rows} rows")
+
+        return matrix
+
+
+    def train(self, make_train_chunks, make_valid_chunks=None, target: str = 'Sales') -> XGBRegressor:
+        '''
+        Trains the booster, resuming from the checkpoint in `checkpoint_dir` when there is one
+
+        Parameters:
+        -----------
+            make_train_chunks(callable): Returns an iterable of raw training frames
+            make_valid_chunks(callable): Returns an iterable of raw validation frames
+            target(str): Target column
+
+        Returns:
+        --------
+            XGBRegressor: The trained model
+        '''
+        dtrain = self._matrix(make_train_chunks, target, cache_name='train')
+        evals = [(dtrain, 'train')]
+        if make_valid_chunks is not None:
+            # The training set is only evaluated when there is nothing else
+            evals = [(self._matrix(make_valid_chunks, target, ref=dtrain, cache_name='valid'), 'valid')]
+
+        callbacks = []
+        booster = None
+        checkpoint = None
+        if self.checkpoint_dir is not None:
+            checkpoint = CheckpointCallback(self.checkpoint_dir, self.params, self.checkpoint_interval)
+            booster = checkpoint.load()
+            callbacks.append(checkpoint)
+
+        early_stopping_rounds = self.early_stopping_rounds if make_valid_chunks is not None else None
+        rounds = self.num_boost_round - (booster.num_boosted_rounds() if booster is not None else 0)
+
+        if checkpoint is not None and checkpoint.state.get('early_stopped'):
+            # Training past the early stop would only add rounds the validation score didn't want
+            logger.info(f"The checkpointed run stopped early at round {booster.num_boosted_rounds()}, not training further")
+        elif rounds > 0:
+            booster = xgb.train(
+                self.params, dtrain, num_boost_round=rounds, evals=evals, xgb_model=booster,
+                early_stopping_rounds=early_stopping_rounds, callbacks=callbacks, verbose_eval=False
+            )
+            # after_training can't tell whether the early stopping callback ended the run
+            if checkpoint is not None and early_stopping_rounds and booster.num_boosted_rounds() < self.num_boost_round:
+                checkpoint.save_state(booster, early_stopped=True)
+
+        # The sklearn wrapper gives the same predict (up to the best iteration) and save_model as the notebook
+        model = XGBRegressor(**self.params)
+        model.load_model(bytearray(booster.save_raw('ubj')))
+
+        return model
+
+
+def make_pipeline():
+    '''
+    The preprocessing pipeline of Predict_Sales.ipynb. Categories missing from the sample
+    the pipeline is fitted on are ignored instead of failing a later chunk.
+    '''
+    from sklearn.pipeline import Pipeline
+    from Custom_Transformers import MissingDataHandler, OutlierHandler, ProperDtypes, DateFeatures, ColumnEncoder
+
+    missing_cols = ['CompetitionDistance', 'CompetitionOpenSinceYear', 'CompetitionOpenSinceMonth', 'Promo2SinceWeek', 'Promo2SinceYear', 'Open']
+
+    return Pipeline([
+        ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols= missing_cols)),
+        ('Cat_missing_handler', MissingDataHandler(strategy='constant', fill_value='No Promo', cols= ['PromoInterval'])),
+        ('Outlier_handler', OutlierHandler(method='IQR', cols=['CompetitionDistance'])),
+        ('Proper_dtypes', ProperDtypes(cols=['CompetitionOpenSinceMonth', 'CompetitionOpenSinceYear', 'Promo2', 'Promo2SinceYear'], proper_type='int64')),
+        ('Feature_engineering', DateFeatures()),
+        ('Encoder', ColumnEncoder(handle_unknown='ignore'))
+    ])
+
+
+def rossmann_chunks(data_utils: DataUtils, chunksize: int, date_range: tuple = None, store: pd.DataFrame = None):
+    '''
+    Factory of train.csv chunks merged with store.csv, without the Customers column like
+    in Predict_Sales.ipynb
+    '''
+    if store is None:
+        store = data_utils.load_data('store.csv')
+
+    def make_chunks():
+        for chunk in data_utils.iter_data('train.csv', chunksize, dtype=COMPACT_DTYPES, date_range=date_range,
+                                          merge_with=store):
+            yield chunk.drop(columns='Customers')
+
+    return make_chunks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Out-of-core training on train.csv/store.csv')
+    parser.add_argument('--data-dir', default=DataUtils.data_dir)
+    parser.add_argument('--chunksize', type=int, default=200_000)
+    parser.add_argument('--valid-start', default='2015-06-19', help='first day of the validation range')
+    parser.add_argument('--rounds', type=int, default=1000)
+    parser.add_argument('--checkpoint-dir', default='checkpoints')
+    parser.add_argument('--external-memory', action='store_true')
+    parser.add_argument('--output', default=os.path.join('models', f"model_{pd.Timestamp.now():%d-%m-%Y-%H-%M-%S}.ubj"))
+    args = parser.parse_args()
+
+    data_utils = DataUtils()
+    data_utils.data_dir = args.data_dir
+    valid_start = pd.Timestamp(args.valid_start)
+
+    trainer = OutOfCoreTrainer(make_pipeline(), num_boost_round=args.rounds,
+                               checkpoint_dir=args.checkpoint_dir, external_memory=args.external_memory)
+    store = data_utils.load_data('store.csv')
+    train_chunks = rossmann_chunks(data_utils, args.chunksize, ('1900-01-01', valid_start - pd.Timedelta(days=1)), store)
+    valid_chunks = rossmann_chunks(data_utils, args.chunksize, (valid_start, '2100-01-01'), store)
+
+    trainer.fit_pipeline(train_chunks)
+    model = trainer.train(train_chunks, valid_chunks)
+
+    save_model(model, args.output, feature_names=trainer.pipeline.named_steps['Encoder'].get_feature_names_out())
+    logger.info(f"Saved the model to {args.output}")
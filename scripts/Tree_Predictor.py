@@ -0,0 +1,191 @@
+import json
+import logging
+
+import numpy as np
+from numba import njit
+from scipy import sparse
+
+# Utils sets the root logger to DEBUG, which would print numba's compiler passes
+logging.getLogger('numba').setLevel(logging.WARNING)
+
+# Objectives whose prediction is the raw margin, other objectives need a link function
+IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:squaredlogerror'}
+
+
+@njit(cache=False, nogil=True)
+def _traverse(row, feature, threshold, left, right, default_left, value, roots, base_score):
+    acc = np.float32(base_score)
+    for root in roots:
+        node = root
+        while left[node] != -1:
+            x = row[feature[node]]
+            if np.isnan(x):
+                node = left[node] if default_left[node] else right[node]
+            elif x < threshold[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        acc += value[node]
+
+    return acc
+
+
+@njit(cache=False, nogil=True)
+def _predict_dense(X, feature, threshold, left, right, default_left, value, roots, base_score):
+    out = np.empty(X.shape[0], dtype=np.float32)
+    for i in range(X.shape[0]):
+        out[i] = _traverse(X[i], feature, threshold, left, right, default_left, value, roots, base_score)
+
+    return out
+
+
+@njit(cache=False, nogil=True)
+def _predict_csr(indptr, indices, data, n_features, feature, threshold, left, right, default_left, value, roots, base_score):
+    n_rows = indptr.shape[0] - 1
+    out = np.empty(n_rows, dtype=np.float32)
+
+    # Entries absent from the sparse row are missing values, like in a DMatrix built from CSR
+    row = np.full(n_features, np.nan, dtype=np.float32)
+    for i in range(n_rows):
+        for k in range(indptr[i], indptr[i + 1]):
+            row[indices[k]] = data[k]
+
+        out[i] = _traverse(row, feature, threshold, left, right, default_left, value, roots, base_score)
+
+        for k in range(indptr[i], indptr[i + 1]):
+            row[indices[k]] = np.nan
+
+    return out
+
+
+class FlatTreePredictor:
+    '''
+    The trees of a fitted XGBoost regressor flattened into contiguous arrays and scored
+    with a numba-compiled traversal.
+
+    The booster API has a fixed cost per predict call (DMatrix construction, thread
+    dispatch) that dominates for one or a few rows. Here every node of every tree is a
+    position in the feature/threshold/left/right/value arrays and a row walks each tree
+    from its root to a leaf, comparing in float32 like XGBoost does. NaN, and entries
+    absent from a sparse row, follow the default direction learned for the split.
+
+    Parameters:
+    -----------
+        feature(np.ndarray): Feature index of each split node
+        threshold(np.ndarray): Split value, rows with x < threshold go left
+        left(np.ndarray): Index of the left child, -1 for leaves
+        right(np.ndarray): Index of the right child, -1 for leaves
+        default_left(np.ndarray): Whether missing values go left
+        value(np.ndarray): Leaf values
+        roots(np.ndarray): Index of the root node of each tree
+        base_score(float): Initial margin of every prediction
+        n_features(int): Number of input columns
+    '''
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, base_score: float, n_features: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.base_score = np.float32(base_score)
+        self.n_features = n_features
+
+
+    @classmethod
+    def from_model(cls, model):
+        '''
+        Flattens an XGBRegressor or Booster, keeping only the trees up to the best
+        iteration when the model was fitted with early stopping, as its predict does.
+        '''
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        learner = json.loads(booster.save_raw('json'))['learner']
+
+        objective = learner['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objective `{objective}` isn't supported, only {', '.join(sorted(IDENTITY_OBJECTIVES))}")
+
+        gradient_booster = learner['gradient_booster']
+        if gradient_booster['name'] != 'gbtree':
+            raise ValueError(f"Booster `{gradient_booster['name']}` isn't supported, only gbtree")
+
+        model_param = learner['learner_model_param']
+        if int(model_param.get('num_target', 1)) != 1 or int(model_param.get('num_class', 0)) > 1:
+            raise ValueError("Only single-output models are supported")
+
+        trees = gradient_booster['model']['trees']
+        best_iteration = booster.attr('best_iteration')
+        if best_iteration is not None:
+            trees = trees[:gradient_booster['model']['iteration_indptr'][int(best_iteration) + 1]]
+
+        feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            if any(tree['split_type']):
+                raise ValueError("Categorical splits aren't supported")
+
+            tree_left = np.asarray(tree['left_children'], dtype=np.int32)
+            tree_right = np.asarray(tree['right_children'], dtype=np.int32)
+            is_leaf = tree_left == -1
+
+            roots.append(offset)
+            feature.append(np.asarray(tree['split_indices'], dtype=np.int32))
+            threshold.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            left.append(np.where(is_leaf, -1, tree_left + offset))
+            right.append(np.where(is_leaf, -1, tree_right + offset))
+            default_left.append(np.asarray(tree['default_left'], dtype=np.bool_))
+            # Leaves keep their value in split_conditions
+            value.append(np.where(is_leaf, np.asarray(tree['split_conditions'], dtype=np.float32), np.float32(0)))
+            offset += len(tree_left)
+
+        # Newer versions write the base score as a one element vector, e.g. `[5.5E2]`
+        base_score = float(str(model_param['base_score']).strip('[]'))
+
+        predictor = cls(
+            np.concatenate(feature), np.concatenate(threshold), np.concatenate(left).astype(np.int32),
+            np.concatenate(right).astype(np.int32), np.concatenate(default_left),
+            np.concatenate(value).astype(np.float32), np.asarray(roots, dtype=np.int64),
+            base_score, int(model_param['num_feature'])
+        )
+        # Compile the kernels now rather than on the first request
+        predictor.predict(np.zeros((1, predictor.n_features), dtype=np.float32))
+        predictor.predict(sparse.csr_matrix((1, predictor.n_features), dtype=np.float32))
+
+        return predictor
+
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+
+    def _tree_arrays(self):
+        return (self.feature, self.threshold, self.left, self.right, self.default_left,
+                self.value, self.roots, self.base_score)
+
+
+    def predict(self, X) -> np.ndarray:
+        '''
+        Predicts a dense array, DataFrame or scipy sparse matrix
+
+        Parameters:
+        -----------
+            X: (n_rows, n_features) input, NaN or absent sparse entries are missing
+
+        Returns:
+        --------
+            np.ndarray: float32 predictions
+        '''
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the model expects {self.n_features}")
+
+        if sparse.issparse(X):
+            X = sparse.csr_matrix(X)
+            return _predict_csr(X.indptr, X.indices, X.data.astype(np.float32, copy=False),
+                                self.n_features, *self._tree_arrays())
+
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+
+        return _predict_dense(X, *self._tree_arrays())
@@ -1,4 +1,7 @@
 import os
+import glob
+import json
+import hashlib
 import logging
 
 import pandas as pd
@@ -8,6 +11,12 @@ import seaborn as sns
 import missingno as msno
 import holidays
 
+try:
+    import pyarrow.parquet
+except ImportError:
+    # Without pyarrow load_data parses the csv every time
+    pyarrow = None
+
 # ANSI Escape code to make the printing more appealing
 ANSI_ESC = {
     "PURPLE": "\033[95m",
@@ -20,6 +29,25 @@ ANSI_ESC = {
 }
 
 
+# Compact dtypes for the integer and categorical columns of train.csv, test.csv and store.csv,
+# pass it as `dtype` to DataUtils.load_data to parse the csv straight into these types. The
+# integer columns never have missing values; the categories allow NaN, e.g. PromoInterval is
+# empty for the stores without Promo2
+COMPACT_DTYPES = {
+    'Store': 'int16',
+    'DayOfWeek': 'int8',
+    'Sales': 'int32',
+    'Customers': 'int16',
+    'Promo': 'int8',
+    'StateHoliday': 'category',
+    'SchoolHoliday': 'int8',
+    'StoreType': 'category',
+    'Assortment': 'category',
+    'Promo2': 'int8',
+    'PromoInterval': 'category',
+}
+
+
 log_dir = os.path.join(os.path.split(os.getcwd())[0], 'logs')
 
 if not os.path.exists(log_dir):
@@ -55,28 +83,194 @@ class DataUtils:
     # def __init__(self, data):
     #     self.data = data
 
+    # Directory holding the csv files, relative to the notebooks
+    data_dir = '../data'
 
-    def load_data(self, file_name: str)->pd.DataFrame:
+    # Holiday calendars keyed on (country, subdiv), see holiday_calendar
+    _holiday_calendars = {}
+
+
+    def load_data(self, file_name: str, dtype: dict = None, columns: list = None, stores: list = None,
+                  date_range: tuple = None, use_cache: bool = True)->pd.DataFrame:
         '''
         Load the file name from the data directory
 
+        After the first parse a Parquet copy of the csv is kept in `<data_dir>/.cache` and
+        used by later loads, see _load_cached. Column projection and row filters are pushed
+        down to the Parquet reader so only the requested part of the file is read.
+
         Parameters:
             file_name(str): name of the file
+            dtype(dict): Optional dtype schema used while parsing the csv, e.g. COMPACT_DTYPES.
+                         Columns of the schema that aren't in the file are ignored
+            columns(list): Only load these columns
+            stores(list): Only load the rows of these stores
+            date_range(tuple): Only load the rows with (start, end) <= Date <= end, both inclusive
+            use_cache(bool): Read and write the Parquet cache
 
         Returns:
             pd.DataFrame
         '''
         logger.debug("Loading data from file...")
         try:
-            data = pd.read_csv(f"../data/{file_name}", low_memory=False)
+            path = os.path.join(self.data_dir, file_name)
+
+            if use_cache and pyarrow is not None and os.path.exists(path):
+                return self._load_cached(path, dtype, columns, stores, date_range)
+
+            # Same values as a load from the cache, e.g. StateHoliday as strings
+            data = self._normalize_objects(pd.read_csv(path, low_memory=False, dtype=dtype))
+            if stores is not None or date_range is not None:
+                data = self._filter_rows(data, stores, date_range)
+            if columns is not None:
+                data = data[columns]
+
             return data
 
         except Exception as e:
             logger.error(f"Error loading data: {e}")
             return None
-        
 
 
+    def iter_data(self, file_name: str, chunksize: int, dtype: dict = None, columns: list = None, stores: list = None,
+                  date_range: tuple = None, merge_with: pd.DataFrame = None):
+        '''
+        Yields the file from the data directory in chunks of `chunksize` rows, so only one
+        chunk is held in memory at a time.
+
+        `StateHoliday` is always read as strings, otherwise chunks only holding the value 0
+        would be parsed as integers and encode differently from the other chunks.
+
+        Parameters:
+            file_name(str): name of the file
+            chunksize(int): Number of csv rows per chunk
+            dtype(dict): Optional dtype schema used while parsing the csv, e.g. COMPACT_DTYPES
+            columns(list): Only load these columns
+            stores(list): Only keep the rows of these stores
+            date_range(tuple): Only keep the rows with start <= Date <= end
+            merge_with(pd.DataFrame): Frame merged into every chunk on `Store`, e.g. store.csv
+
+        Yields:
+            pd.DataFrame
+        '''
+        logger.debug(f"Streaming {file_name} in chunks of {chunksize} rows...")
+        dtype = {'StateHoliday': str, **(dtype or {})}
+        reader = pd.read_csv(os.path.join(self.data_dir, file_name), chunksize=chunksize,
+                             dtype=dtype, usecols=columns, low_memory=False)
+
+        with reader:
+            for chunk in reader:
+                if stores is not None or date_range is not None:
+                    chunk = self._filter_rows(chunk, stores, date_range)
+                if chunk.empty:
+                    continue
+                if merge_with is not None:
+                    chunk = chunk.merge(merge_with, on='Store', how='inner')
+
+                yield chunk
+
+
+    def _filter_rows(self, data: pd.DataFrame, stores: list = None, date_range: tuple = None) -> pd.DataFrame:
+        mask = np.ones(len(data), dtype=bool)
+
+        if stores is not None:
+            mask &= data['Store'].isin(stores).to_numpy()
+        if date_range is not None:
+            start, end = self._date_bounds(date_range)
+            dates = data['Date'].astype(str)
+            mask &= ((dates >= start) & (dates <= end)).to_numpy()
+
+        return data[mask].reset_index(drop=True)
+
+
+    def _date_bounds(self, date_range: tuple) -> tuple:
+        # Dates are kept as `YYYY-MM-DD` strings in the csv, so they compare lexicographically
+        return tuple(pd.Timestamp(bound).strftime('%Y-%m-%d') for bound in date_range)
+
+
+    def _file_hash(self, path: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+
+    def _load_cached(self, path: str, dtype: dict, columns: list, stores: list, date_range: tuple) -> pd.DataFrame:
+        '''
+        Loads the csv through its Parquet copy.
+
+        Cache entries are named `<file>.<content hash>.<schema hash>.parquet`. The content
+        hash is only recomputed when the size or mtime of the csv differ from the ones
+        recorded in `<file>.json`, and entries of an older content hash are evicted.
+        '''
+        cache_dir = os.path.join(self.data_dir, '.cache')
+        os.makedirs(cache_dir, exist_ok=True)
+
+        file_name = os.path.basename(path)
+        stat = os.stat(path)
+        meta_path = os.path.join(cache_dir, f"{file_name}.json")
+
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                meta = json.load(file)
+
+        if meta.get('size') == stat.st_size and meta.get('mtime') == stat.st_mtime_ns:
+            content_hash = meta['hash']
+        else:
+            content_hash = self._file_hash(path)
+            with open(meta_path, 'w') as file:
+                json.dump({'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content_hash}, file)
+
+        schema_hash = hashlib.blake2b(json.dumps(dtype, sort_keys=True, default=str).encode(), digest_size=4).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{file_name}.{content_hash}.{schema_hash}.parquet")
+
+        for entry in glob.glob(os.path.join(cache_dir, f"{glob.escape(file_name)}.*.parquet")):
+            if os.path.basename(entry).split('.')[-3] != content_hash:
+                logger.info(f"Evicting stale cache entry {entry}")
+                os.remove(entry)
+
+        if not os.path.exists(cache_path):
+            logger.debug(f"Caching {file_name} as Parquet...")
+            data = self._normalize_objects(pd.read_csv(path, low_memory=False, dtype=dtype))
+            # Written next to the entry and moved into place, a crash or a concurrent load
+            # never sees a partly written Parquet file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            data.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+
+            if stores is not None or date_range is not None:
+                data = self._filter_rows(data, stores, date_range)
+            return data if columns is None else data[columns]
+
+        filters = []
+        if stores is not None:
+            filters.append(('Store', 'in', list(stores)))
+        if date_range is not None:
+            start, end = self._date_bounds(date_range)
+            filters += [('Date', '>=', start), ('Date', '<=', end)]
+
+        data = pd.read_parquet(cache_path, columns=columns, filters=filters or None)
+
+        # Parquet gives back missing strings as None, the transformers expect NaN like read_csv
+        for col in data.select_dtypes(include='object').columns:
+            data[col] = data[col].where(data[col].notna(), np.nan)
+
+        return data
+
+
+    def _normalize_objects(self, data: pd.DataFrame) -> pd.DataFrame:
+        # Columns mixing numbers and strings (StateHoliday has both 0 and '0') can't be stored
+        # in Parquet, their values are turned into strings
+        for col in data.select_dtypes(include='object').columns:
+            if pd.api.types.infer_dtype(data[col], skipna=True) not in ('string', 'empty'):
+                data[col] = data[col].where(data[col].isna(), data[col].astype(str))
+
+        return data
+        
+
     def data_info(self, data) -> pd.DataFrame:
         '''
         Provides detailed information about the data, including:
@@ -148,11 +342,79 @@ class DataUtils:
         return info_df
     
 
-    def holiday_generator(self, data):
+    def holiday_calendar(self, country: str, subdiv: str = None, years: range = None) -> pd.Series:
+        '''
+        Returns the holidays of a country (or one of its subdivisions) as a Series of
+        holiday names indexed by date. Calendars are built once and shared by every
+        DataUtils instance, they are only rebuilt when a year outside of the cached
+        ones is requested.
+
+        Parameters:
+            country(str): ISO code of the country, e.g. US or DE
+            subdiv(str): Optional subdivision (state) code, e.g. BY for Bavaria
+            years(range): Years the calendar must cover
+
+        Returns:
+            pd.Series
+        '''
+        key = (country, subdiv)
+        years = set(years or [])
+        cached_years, calendar = DataUtils._holiday_calendars.get(key, (set(), None))
+
+        if calendar is None or not years <= cached_years:
+            cached_years = cached_years | years
+            country_holidays = holidays.country_holidays(country, subdiv=subdiv, years=sorted(cached_years))
+            calendar = pd.Series(list(country_holidays.values()),
+                                 index=pd.DatetimeIndex(list(country_holidays.keys())),
+                                 dtype=object).sort_index()
+            DataUtils._holiday_calendars[key] = (cached_years, calendar)
+
+        return calendar
+
+
+    def holiday_generator(self, data, country: str = 'US', state_col: str = None, subdiv: str = None):
+        '''
+        Adds a `Holiday` column with the name of the holiday on each date, or `Not Holiday`.
+
+        The dates are looked up in a precomputed calendar covering the min-max range of
+        the `Date` column instead of checking each row against the holidays package.
+
+        Parameters:
+            data(pd.DataFrame): Dataframe with a `Date` column
+            country(str): ISO code of the country whose holidays are used
+            state_col(str): Optional column holding the subdivision (state) code of each row,
+                            every state is looked up in its own calendar and rows without
+                            a state use the country wide one
+            subdiv(str): Optional subdivision (state) code of the rows without `state_col`
+
+        Returns:
+            pd.DataFrame
+        '''
         logger.debug("Adding holiday column...")
         try:
-            us_holidays = holidays.US()
-            data['Holiday'] = data['Date'].apply(lambda x: us_holidays[x] if x in us_holidays else 'Not Holiday')
+            dates = pd.DatetimeIndex(pd.to_datetime(data['Date'])).normalize()
+            result = np.full(len(dates), 'Not Holiday', dtype=object)
+
+            if dates.notna().any():
+                years = range(dates.min().year, dates.max().year + 1)
+
+                if state_col is None:
+                    groups = [(subdiv, np.arange(len(dates)))]
+                else:
+                    # Rows without a state fall back to the `subdiv` (or country wide) calendar
+                    codes, states = pd.factorize(data[state_col])
+                    groups = [(subdiv, np.flatnonzero(codes == -1))]
+                    groups += [(state, np.flatnonzero(codes == code)) for code, state in enumerate(states)]
+
+                for subdiv, rows in groups:
+                    if len(rows) == 0:
+                        continue
+                    calendar = self.holiday_calendar(country, subdiv, years)
+                    positions = calendar.index.get_indexer(dates[rows])
+                    found = positions >= 0
+                    result[rows[found]] = calendar.to_numpy()[positions[found]]
+
+            data['Holiday'] = result
             return data
         
         except Exception as e:
@@ -0,0 +1,458 @@
+import sys
+import os
+import pickle
+import unittest
+
+import numpy as np
+import pandas as pd
+import holidays
+from sklearn.pipeline import Pipeline
+
+sys.path.append(os.path.abspath('scripts'))
+from Custom_Transformers import (DateFeatures, MissingDataHandler, ProperDtypes, CompactDtypes, OutlierHandler,
+                                 QuantileSketch, ColumnEncoder, LagFeatures, make_copy_free, transform_iter)
+
+
+class TestDateFeatures(unittest.TestCase):
+
+    def setUp(self):
+
+        dates = pd.date_range('2013-01-01', '2015-12-31', freq='D')
+        self.data = pd.DataFrame({
+            'Store': np.arange(len(dates)) % 5 + 1,
+            'DayOfWeek': dates.dayofweek + 1,
+            'Date': dates
+        })
+
+
+    def legacy_transform(self, X):
+        us_holidays = holidays.US()
+        X_copy = X.copy()
+        X_copy['quarter'] =   X_copy['Date'].dt.quarter
+        X_copy['month'] =     X_copy['Date'].dt.month
+        X_copy['year'] =      X_copy['Date'].dt.year
+        X_copy['dayofyear'] = X_copy['Date'].dt.dayofyear
+        X_copy['weekdays'] =  X_copy['DayOfWeek'].apply(lambda x: x < 6)
+        X_copy['weekends'] =  X_copy['DayOfWeek'].apply(lambda x: x >= 6)
+        X_copy['Holiday'] = X_copy['Date'].apply(lambda x: us_holidays[x] if x in us_holidays else 'Not Holiday')
+        X_copy.drop('Date', axis=1, inplace=True)
+
+        return X_copy
+
+
+    def test_transform_matches_legacy(self):
+        '''
+        Tests that the vectorized features have the same values and columns as the .dt/apply version
+        '''
+
+        result = DateFeatures().transform(self.data)
+        expected = self.legacy_transform(self.data)
+
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        self.assertIn('Date', self.data.columns)
+
+
+    def test_transform_compact_dtypes(self):
+        '''
+        Tests the dtypes of the generated features
+        '''
+
+        result = DateFeatures().transform(self.data)
+
+        self.assertEqual(result['quarter'].dtype, np.int8)
+        self.assertEqual(result['month'].dtype, np.int8)
+        self.assertEqual(result['year'].dtype, np.int16)
+        self.assertEqual(result['dayofyear'].dtype, np.int16)
+        self.assertEqual(result['weekdays'].dtype, bool)
+
+
+    def test_transform_in_place(self):
+        '''
+        Tests that copy=False modifies and returns the input frame
+        '''
+
+        data = self.data.copy()
+        result = DateFeatures(copy=False).transform(data)
+
+        self.assertIs(result, data)
+        self.assertNotIn('Date', data.columns)
+        self.assertIn('dayofyear', data.columns)
+
+
+class TestCopyFree(unittest.TestCase):
+
+    def setUp(self):
+
+        self.data = pd.DataFrame({
+            'Date': ['2015-07-31', '2015-07-30', '2015-07-29'],
+            'DayOfWeek': [5, 4, 3],
+            'CompetitionDistance': [1270.0, np.nan, 620.0],
+            'Promo2': [0.0, 1.0, 1.0]
+        })
+
+        self.pipeline = Pipeline([
+            ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols=['CompetitionDistance'])),
+            ('Proper_dtypes', ProperDtypes(cols=['Promo2'], proper_type='int64')),
+            ('Feature_engineering', DateFeatures())
+        ])
+
+
+    def test_make_copy_free(self):
+        '''
+        Tests that only the first transformer keeps copying and the caller's frame is untouched
+        '''
+
+        expected = self.pipeline.fit_transform(self.data)
+        original = self.data.copy()
+
+        make_copy_free(self.pipeline)
+        result = self.pipeline.transform(self.data)
+
+        self.assertTrue(self.pipeline.named_steps['missing_handler'].copy)
+        self.assertFalse(self.pipeline.named_steps['Feature_engineering'].copy)
+        pd.testing.assert_frame_equal(result, expected)
+        pd.testing.assert_frame_equal(self.data, original)
+
+
+    def test_make_copy_free_own_input(self):
+        '''
+        Tests that with own_input the pipeline works on the frame it is given
+        '''
+
+        self.pipeline.fit(self.data)
+        make_copy_free(self.pipeline, own_input=True)
+        result = self.pipeline.transform(self.data)
+
+        self.assertIs(result, self.data)
+        self.assertEqual(self.data['CompetitionDistance'].isna().sum(), 0)
+
+
+    def test_unpickle_baseline_pipeline(self):
+        '''
+        Tests that a pipeline pickled by the code before copy and the learned outlier bounds still transforms
+        '''
+
+        expected = Pipeline(self.pipeline.steps[:1] + [
+            ('outlier_handler', OutlierHandler(method='IQR', cols=['Promo2'])),
+        ] + self.pipeline.steps[1:]).fit_transform(self.data)
+
+        def baseline(cls, **state):
+            step = cls.__new__(cls)
+            step.__dict__.update(state)
+            return step
+
+        imputer = self.pipeline.named_steps['missing_handler'].imputer
+        pipeline = pickle.loads(pickle.dumps(Pipeline([
+            ('missing_handler', baseline(MissingDataHandler, missing_values=np.nan, strategy='constant', fill_value=0,
+                                         imputer=imputer, cols=['CompetitionDistance'])),
+            ('outlier_handler', baseline(OutlierHandler, method='IQR', factor=1.5, threshold=3, cols=['Promo2'])),
+            ('Proper_dtypes', baseline(ProperDtypes, cols=['Promo2'], proper_type='int64')),
+            ('Feature_engineering', baseline(DateFeatures, data_utils=self.pipeline.named_steps['Feature_engineering'].data_utils)),
+        ])))
+
+        self.assertTrue(all(step.copy for _, step in pipeline.steps))
+        pd.testing.assert_frame_equal(pipeline.transform(self.data), expected)
+
+
+    def test_transform_iter(self):
+        '''
+        Tests that transforming chunk by chunk gives the same rows as one transform
+        '''
+
+        data = self.data.assign(Sales=[5263, 5020, 4782])
+        expected = self.pipeline.fit(self.data).transform(self.data)
+        chunks = [data.iloc[:2].copy(), data.iloc[2:].copy()]
+
+        results = list(transform_iter(self.pipeline, chunks, target='Sales'))
+
+        pd.testing.assert_frame_equal(pd.concat([X for X, _ in results]), expected)
+        self.assertListEqual([list(y) for _, y in results], [[5263, 5020], [4782]])
+        self.assertTrue(self.pipeline.named_steps['missing_handler'].copy)
+
+
+
+class TestCompactDtypes(unittest.TestCase):
+
+    def setUp(self):
+
+        self.data = pd.DataFrame({
+            'Store': np.arange(1, 1001, dtype=np.int64),
+            'Sales': np.arange(1000, dtype=np.int64) * 50,
+            'StoreType': np.array(['a', 'b', 'c', 'd'] * 250, dtype=object),
+            'CompetitionDistance': np.linspace(0, 1000, 1000),
+            'Id': [f'id-{i}' for i in range(1000)]
+        })
+
+
+    def test_transform_dtypes(self):
+        '''
+        Tests the chosen dtypes and that the values are unchanged
+        '''
+
+        compact = CompactDtypes(max_categories=10)
+        result = compact.fit_transform(self.data)
+
+        self.assertEqual(result['Store'].dtype, np.int16)
+        self.assertEqual(result['Sales'].dtype, np.int32)
+        self.assertIsInstance(result['StoreType'].dtype, pd.CategoricalDtype)
+        self.assertEqual(result['CompetitionDistance'].dtype, np.float64)
+        self.assertEqual(result['Id'].dtype, object)
+        self.assertGreater(compact.memory_saved_, 0)
+        pd.testing.assert_frame_equal(result.astype(self.data.dtypes.to_dict()), self.data)
+
+
+    def test_transform_widens_unseen_values(self):
+        '''
+        Tests that values outside of the fitted range or categories are kept
+        '''
+
+        compact = CompactDtypes().fit(self.data.head(10))
+        result = compact.transform(self.data)
+
+        self.assertEqual(result['Sales'].dtype, np.int32)
+        self.assertEqual(result['Sales'].iloc[-1], 49950)
+        self.assertEqual(result['StoreType'].isna().sum(), 0)
+
+
+
+class TestOutlierHandler(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        self.data = pd.DataFrame({
+            'Store': np.arange(20_000),
+            'CompetitionDistance': rng.gamma(1.0, 5000.0, 20_000),
+            'Promo2SinceWeek': rng.normal(25, 10, 20_000)
+        })
+        self.data.loc[::7, 'Promo2SinceWeek'] = np.nan
+
+
+    def test_quantile_sketch_exact(self):
+        '''
+        Tests that a sketch holding every value gives numpy's quantiles
+        '''
+
+        values = self.data['CompetitionDistance'].to_numpy()[:500]
+        sketch = QuantileSketch(size=1000).update(values)
+
+        for q in [0, 0.25, 0.5, 0.75, 1]:
+            self.assertAlmostEqual(sketch.quantile(q), np.quantile(values, q))
+
+
+    def test_quantile_sketch_merge(self):
+        '''
+        Tests that merged compressed sketches stay close to the exact quartiles
+        '''
+
+        values = self.data['CompetitionDistance'].to_numpy()
+        sketch = QuantileSketch(size=500)
+        for chunk in np.array_split(values, 8):
+            sketch.merge(QuantileSketch(size=500).update(chunk))
+
+        self.assertEqual(sketch.count, len(values))
+        for q in [0.25, 0.75]:
+            self.assertAlmostEqual(sketch.quantile(q), np.quantile(values, q), delta=0.01 * values.std())
+
+
+    def test_iqr_bounds_learned_in_fit(self):
+        '''
+        Tests that fit learns the pandas IQR bounds and that a single row is clipped with them
+        '''
+
+        handler = OutlierHandler(method='IQR', cols=['Promo2SinceWeek'], chunk_size=3000, n_jobs=2).fit(self.data)
+
+        Q1, Q3 = self.data['CompetitionDistance'].quantile([0.25, 0.75])
+        self.assertListEqual(handler.fit_cols_, ['CompetitionDistance'])
+        self.assertAlmostEqual(handler.upper_bound_['CompetitionDistance'], Q3 + 1.5 * (Q3 - Q1), delta=0.01 * (Q3 - Q1))
+
+        row = pd.DataFrame({'Store': [1], 'CompetitionDistance': [1e9], 'Promo2SinceWeek': [1e9]})
+        result = handler.transform(row)
+
+        self.assertAlmostEqual(result['CompetitionDistance'].iloc[0], handler.upper_bound_['CompetitionDistance'])
+        self.assertEqual(result['Promo2SinceWeek'].iloc[0], 1e9)
+
+
+    def test_partial_fit(self):
+        '''
+        Tests that fitting chunk by chunk gives the same bounds as one fit
+        '''
+
+        full = OutlierHandler(method='z_score').fit(self.data)
+        streamed = OutlierHandler(method='z_score')
+        for chunk in np.array_split(self.data, 5):
+            streamed.partial_fit(chunk)
+
+        pd.testing.assert_series_equal(streamed.mean_, full.mean_)
+        pd.testing.assert_series_equal(streamed.std_, full.std_)
+        self.assertAlmostEqual(full.std_['Promo2SinceWeek'], self.data['Promo2SinceWeek'].std(ddof=0))
+
+
+    def test_transform_not_fitted(self):
+        '''
+        Tests that transform refuses to run before fit
+        '''
+
+        with self.assertRaises(ValueError):
+            OutlierHandler(method='IQR').transform(self.data)
+
+
+    def test_unpickle_without_bounds(self):
+        '''
+        Tests that a handler pickled before the bounds were learned in fit clips with the batch's bounds
+        '''
+
+        # The state of a handler pickled by the code without fit, only its parameters
+        legacy = OutlierHandler.__new__(OutlierHandler)
+        legacy.__dict__.update({'method': 'IQR', 'factor': 1.5, 'threshold': 3, 'cols': ['Promo2SinceWeek']})
+
+        handler = pickle.loads(pickle.dumps(legacy))
+        result = handler.transform(self.data)
+
+        expected = OutlierHandler(method='IQR', cols=['Promo2SinceWeek']).fit(self.data).transform(self.data)
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertFalse(hasattr(handler, 'fit_cols_'))
+
+
+class TestColumnEncoder(unittest.TestCase):
+
+    def setUp(self):
+
+        self.data = pd.DataFrame({
+            'CompetitionDistance': [270.0, 0.0, 75000.0, np.nan],
+            'Promo': [0, 1, 0, 1],
+            'StoreType': ['a', 'b', 'a', 'c'],
+            'weekends': [False, True, False, False],
+        })
+
+
+    def test_only_categoricals_encoded(self):
+        '''
+        Tests that numeric columns pass through as one column each and categoricals are one-hot encoded
+        '''
+
+        encoder = ColumnEncoder().fit(self.data)
+        result = encoder.transform(self.data)
+
+        self.assertListEqual(encoder.numeric_cols_, ['CompetitionDistance', 'Promo'])
+        self.assertListEqual(encoder.categorical_cols_, ['StoreType', 'weekends'])
+        self.assertEqual(result.format, 'csr')
+        self.assertEqual(result.shape, (4, 2 + 3 + 2))
+        self.assertEqual(encoder.n_features_out_, 7)
+        self.assertEqual(len(encoder.get_feature_names_out()), 7)
+
+        dense = result.toarray()
+        np.testing.assert_array_equal(dense[:, 0], self.data['CompetitionDistance'].to_numpy(dtype=np.float32))
+        np.testing.assert_array_equal(dense[:, 2:5], [[1, 0, 0], [0, 1, 0], [1, 0, 0], [0, 0, 1]])
+
+
+    def test_zeros_stored(self):
+        '''
+        Tests that numeric zeros are explicit entries, absent entries are missing values for XGBoost
+        '''
+
+        result = ColumnEncoder().fit_transform(self.data)
+
+        # Two numeric and two one-hot entries per row
+        self.assertEqual(result.nnz, 4 * 4)
+        self.assertEqual(result[1, 0], 0)
+        self.assertIn(0, result.indices[result.indptr[1]:result.indptr[2]])
+
+
+    def test_explicit_categoricals(self):
+        '''
+        Tests that listed categorical columns are encoded and non-numeric leftovers are rejected
+        '''
+
+        encoder = ColumnEncoder(categorical_cols=['StoreType', 'weekends', 'Promo']).fit(self.data)
+        self.assertListEqual(encoder.numeric_cols_, ['CompetitionDistance'])
+
+        with self.assertRaises(ValueError):
+            ColumnEncoder(categorical_cols=['weekends']).fit(self.data)
+
+
+class TestLagFeatures(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        self.dates = pd.date_range('2015-01-01', periods=60, freq='D')
+        data = pd.DataFrame({'Store': np.repeat([3, 1, 2], 60), 'Date': np.tile(self.dates, 3)})
+        data['Sales'] = rng.normal(100, 20, len(data)).astype(np.float32)
+        # Missing days, and rows in no particular order
+        self.data = data.drop(index=[5, 70, 71, 72, 150]).sample(frac=1, random_state=1)
+
+
+    def expected(self, frame, result):
+        # Reference computed with pandas on a store x day grid
+        index = pd.MultiIndex.from_arrays([result['Date'], result['Store']])
+        return frame.stack(future_stack=True).reindex(index).to_numpy()
+
+
+    def test_matches_pandas(self):
+        '''
+        Tests the features against pandas shift/rolling/ewm per store, using only earlier days
+        '''
+
+        X = self.data.drop(columns='Sales')
+        result = LagFeatures(lags=[1, 7], windows=[3, 28], ewm_spans=[7]).fit(X, self.data['Sales']).transform(X)
+        grid = self.data.set_index(['Store', 'Date'])['Sales'].unstack('Store').reindex(self.dates)
+
+        for lag in [1, 7]:
+            np.testing.assert_allclose(result[f'Sales_lag_{lag}'], self.expected(grid.shift(lag), result))
+        for window in [3, 28]:
+            rolling = grid.shift(1).rolling(window, min_periods=1)
+            np.testing.assert_allclose(result[f'Sales_roll{window}_mean'], self.expected(rolling.mean(), result), rtol=1e-5)
+            np.testing.assert_allclose(result[f'Sales_roll{window}_min'], self.expected(rolling.min(), result))
+            np.testing.assert_allclose(result[f'Sales_roll{window}_max'], self.expected(rolling.max(), result))
+            std = grid.shift(1).rolling(window, min_periods=2).std()
+            np.testing.assert_allclose(result[f'Sales_roll{window}_std'], self.expected(std, result), rtol=1e-4)
+
+        ewm = grid.ewm(span=7, adjust=False, ignore_na=True).mean().shift(1)
+        np.testing.assert_allclose(result['Sales_ewm7'], self.expected(ewm, result), rtol=1e-5)
+
+
+    def test_future_rows(self):
+        '''
+        Tests that rows past the history use its last days and unknown stores get missing features
+        '''
+
+        features = LagFeatures(lags=[1, 2], windows=[7], stats=['mean'], ewm_spans=[]).fit(self.data)
+        future = pd.DataFrame({'Store': [1, 1, 9], 'Date': pd.to_datetime(['2015-03-02', '2015-03-03', '2015-03-02'])})
+        result = features.transform(future)
+
+        last_day = self.data[(self.data['Store'] == 1) & (self.data['Date'] == '2015-03-01')]['Sales'].iloc[0]
+        self.assertAlmostEqual(result['Sales_lag_1'].iloc[0], last_day, places=3)
+        self.assertTrue(np.isnan(result['Sales_lag_1'].iloc[1]))
+        self.assertEqual(result['Sales_roll7_mean'].iloc[0], result['Sales_roll7_mean'].iloc[1])
+        self.assertTrue(result.iloc[2, 2:].isna().all())
+
+
+    def test_update(self):
+        '''
+        Tests that adding a day gives the same features as fitting on the longer history
+        '''
+
+        history = self.data[self.data['Date'] < '2015-02-20']
+        new_day = self.data[self.data['Date'] == '2015-02-20']
+        next_day = pd.DataFrame({'Store': [1, 2, 3, 4], 'Date': pd.Timestamp('2015-02-21')})
+
+        updated = LagFeatures().fit(history).update(new_day)
+        refitted = LagFeatures().fit(pd.concat([history, new_day]))
+
+        pd.testing.assert_frame_equal(updated.transform(next_day), refitted.transform(next_day))
+        with self.assertRaises(ValueError):
+            updated.update(new_day)
+
+
+    def test_needs_target(self):
+        '''
+        Tests that fitting without the sales history is rejected
+        '''
+
+        with self.assertRaises(ValueError):
+            LagFeatures().fit(self.data.drop(columns='Sales'))
+
+
+if __name__ == '__main__':
+    unittest.main()
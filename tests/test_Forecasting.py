@@ -0,0 +1,87 @@
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath('scripts'))
+from Forecasting import Forecaster, forecast_grid, state_holidays, GRID_COLUMNS
+
+
+class TestForecasting(unittest.TestCase):
+
+    def setUp(self):
+
+        self.store = pd.DataFrame({
+            'Store': [1, 2, 3], 'StoreType': ['c', 'a', 'a'], 'Assortment': ['a', 'a', 'c'],
+            'CompetitionDistance': [1270.0, 570.0, np.nan], 'CompetitionOpenSinceMonth': [9.0, 11.0, np.nan],
+            'CompetitionOpenSinceYear': [2008.0, 2007.0, np.nan], 'Promo2': [0, 1, 1],
+            'Promo2SinceWeek': [np.nan, 13.0, 14.0], 'Promo2SinceYear': [np.nan, 2010.0, 2011.0],
+            'PromoInterval': [np.nan, 'Jan,Apr,Jul,Oct', 'Jan,Apr,Jul,Oct']
+        })
+
+        pipeline = MagicMock()
+        pipeline.transform.side_effect = lambda data: data[['Store', 'DayOfWeek']].to_numpy()
+        model = MagicMock()
+        model.predict.side_effect = lambda X: X[:, 0] * 1000.0 + X[:, 1]
+        self.forecaster = Forecaster(pipeline, model, self.store)
+
+
+    def test_state_holidays(self):
+        '''
+        Tests the train.csv codes of public, Easter and Christmas holidays
+        '''
+
+        codes = state_holidays(['2015-04-03', '2015-04-06', '2015-05-01', '2015-12-25', '2015-12-26', '2015-06-02'])
+
+        self.assertListEqual(codes.tolist(), ['b', 'b', 'a', 'c', 'c', '0'])
+
+
+    def test_forecast_grid(self):
+        '''
+        Tests that the grid holds every store and day, closed on Sundays and holidays
+        '''
+
+        grid = forecast_grid(self.store, [3, 1], '2015-04-01', horizon=7, promo_dates=['2015-04-02'])
+
+        self.assertListEqual(list(grid.columns), GRID_COLUMNS)
+        self.assertEqual(len(grid), 14)
+        self.assertListEqual(grid['Store'].unique().tolist(), [1, 3])
+
+        store_1 = grid[grid['Store'] == 1].set_index('Date')
+        # 2015-04-03 is Good Friday, 2015-04-05 a Sunday
+        self.assertListEqual(store_1['Open'].tolist(), [1, 1, 0, 1, 0, 0, 1])
+        self.assertListEqual(store_1['StateHoliday'].tolist(), ['0', '0', 'b', '0', '0', 'b', '0'])
+        self.assertListEqual(store_1['Promo'].tolist(), [0, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(store_1.loc['2015-04-01', 'DayOfWeek'], 3)
+
+
+    def test_forecast_grid_unknown_store(self):
+        '''
+        Tests that unknown stores are rejected
+        '''
+
+        with self.assertRaises(ValueError):
+            forecast_grid(self.store, [1, 99], '2015-04-01')
+
+
+    def test_forecast(self):
+        '''
+        Tests that every store and day is scored by one predict call into a tidy frame
+        '''
+
+        sales = self.forecaster.forecast(start_date='2015-08-01', horizon=42)
+
+        self.assertListEqual(list(sales.columns), ['Store', 'Date', 'Sales'])
+        self.assertEqual(len(sales), 3 * 42)
+        self.assertEqual(self.forecaster.model.predict.call_count, 1)
+        self.assertEqual(sales.iloc[0]['Sales'], 1006.0)
+        # 2015-08-02 is a Sunday
+        self.assertEqual(sales.iloc[1]['Sales'], 0.0)
+        self.assertEqual(sales['Date'].max(), pd.Timestamp('2015-09-11'))
+
+
+if __name__ == '__main__':
+    unittest.main()
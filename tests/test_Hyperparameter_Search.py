@@ -0,0 +1,125 @@
+import sys
+import os
+import glob
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+sys.path.append(os.path.abspath('scripts'))
+from Custom_Transformers import MissingDataHandler, DateFeatures, ColumnEncoder
+from Hyperparameter_Search import time_series_folds, FoldCache, HyperparameterSearch
+from Model_IO import load_model
+
+
+class TestHyperparameterSearch(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        rows = 3000
+        dates = pd.date_range('2014-01-01', periods=rows // 10, freq='D').repeat(10)
+
+        self.data = pd.DataFrame({
+            'Store': np.tile(np.arange(1, 11), rows // 10),
+            'DayOfWeek': dates.dayofweek + 1,
+            'Date': dates.strftime('%Y-%m-%d'),
+            'Promo': rng.integers(0, 2, rows),
+            'StoreType': rng.choice(['a', 'b', 'c'], rows),
+            'CompetitionDistance': rng.choice([270.0, 1270.0, np.nan], rows),
+        })
+        self.data['Sales'] = 1000 + 500 * self.data['Promo'] + 30 * self.data['Store'] + rng.normal(0, 10, rows)
+
+        self.pipeline = Pipeline([
+            ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols=['CompetitionDistance'])),
+            ('Feature_engineering', DateFeatures()),
+            ('Encoder', ColumnEncoder(handle_unknown='ignore'))
+        ])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def make_search(self, **kwargs):
+        params = dict(param_grid={'max_depth': [1, 3, 5], 'learning_rate': [0.01, 0.3]}, n_splits=2, valid_days=21,
+                      min_estimators=10, max_estimators=90, factor=3, early_stopping_rounds=5, n_jobs=1,
+                      cache_dir=os.path.join(self.tmp_dir.name, 'folds'))
+        params.update(kwargs)
+        return HyperparameterSearch(self.pipeline, **params)
+
+
+    def test_time_series_folds(self):
+        '''
+        Tests that every fold validates on later days than it trains on, the last fold ending on the last day
+        '''
+
+        dates = pd.to_datetime(self.data['Date'])
+        folds = time_series_folds(self.data['Date'], n_splits=3, valid_days=14, gap_days=2)
+
+        self.assertEqual(len(folds), 3)
+        for train_index, valid_index, _ in folds:
+            self.assertLess(dates.iloc[train_index].max() + pd.Timedelta(days=2), dates.iloc[valid_index].min())
+            self.assertEqual(dates.iloc[valid_index].nunique(), 14)
+        self.assertEqual(dates.iloc[folds[-1][1]].max(), dates.max())
+
+        with self.assertRaises(ValueError):
+            time_series_folds(self.data['Date'], n_splits=30, valid_days=14)
+
+
+    def test_fold_cache_reused(self):
+        '''
+        Tests that the fold matrices are written once and reused by the next build
+        '''
+
+        cache = FoldCache(os.path.join(self.tmp_dir.name, 'folds'))
+        folds = time_series_folds(self.data['Date'], n_splits=2, valid_days=21)
+
+        paths = cache.build(self.pipeline, self.data, 'Sales', folds)
+        mtimes = [os.path.getmtime(path) for fold in paths for path in fold.values()]
+        self.assertEqual(len(glob.glob(os.path.join(cache.cache_dir, '*'))), 8)
+
+        again = cache.build(self.pipeline, self.data, 'Sales', folds)
+        self.assertListEqual(again, paths)
+        self.assertListEqual([os.path.getmtime(path) for fold in again for path in fold.values()], mtimes)
+
+
+    def test_successive_halving(self):
+        '''
+        Tests that each rung keeps a third of the candidates with three times the trees and the best model is saved
+        '''
+
+        search = self.make_search().fit(self.data)
+        rungs = search.results_.groupby('rung').agg(candidates=('candidate', 'nunique'), trees=('n_estimators', 'max'))
+
+        self.assertListEqual(rungs['candidates'].tolist(), [6, 2, 1])
+        self.assertListEqual(rungs['trees'].tolist(), [10, 30, 90])
+        self.assertEqual(search.best_params_['learning_rate'], 0.3)
+
+        paths = search.save(os.path.join(self.tmp_dir.name, 'models'))
+        self.assertTrue(os.path.basename(paths['model']).startswith('model_'))
+        self.assertTrue(os.path.exists(paths['pipeline']))
+        self.assertEqual(len(pd.read_csv(paths['results'])), 9)
+
+        model = load_model(paths['model'])
+        X = search.best_pipeline_.transform(self.data.drop(columns='Sales'))
+        np.testing.assert_allclose(model.predict(X), search.best_model_.predict(X), rtol=1e-6)
+
+
+    def test_process_pool(self):
+        '''
+        Tests that the jobs give the same scores in worker processes
+        '''
+
+        grid = {'max_depth': [2, 4], 'learning_rate': [0.3]}
+        inline = self.make_search(param_grid=grid, max_estimators=10).fit(self.data)
+        pooled = self.make_search(param_grid=grid, max_estimators=10, n_jobs=2).fit(self.data)
+
+        np.testing.assert_allclose(pooled.results_['rmse_mean'], inline.results_['rmse_mean'], rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import sys
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+sys.path.append(os.path.abspath('scripts'))
+from Custom_Transformers import MissingDataHandler, OutlierHandler, ProperDtypes, DateFeatures, Scaler, ColumnEncoder
+from Inference_Plan import InferencePlan
+
+
+class TestInferencePlan(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(1)
+        rows = 400
+        dates = pd.date_range('2014-12-01', periods=rows // 4, freq='D').repeat(4)
+
+        self.data = pd.DataFrame({
+            'Store': np.tile([1, 2, 3, 4], rows // 4),
+            'DayOfWeek': dates.dayofweek + 1,
+            'Date': dates.strftime('%Y-%m-%d'),
+            'Open': rng.choice([0.0, 1.0, np.nan], rows, p=[0.1, 0.85, 0.05]),
+            'Promo': rng.integers(0, 2, rows),
+            'StateHoliday': rng.choice(['0', 'a'], rows),
+            'SchoolHoliday': rng.integers(0, 2, rows),
+            'StoreType': rng.choice(['a', 'b', 'c', 'd'], rows),
+            'Assortment': rng.choice(['a', 'c'], rows),
+            'CompetitionDistance': rng.choice([270.0, 1270.0, 9000.0, 75000.0, np.nan], rows),
+            'CompetitionOpenSinceMonth': rng.choice([4.0, 9.0, np.nan], rows),
+            'CompetitionOpenSinceYear': rng.choice([2008.0, 2013.0, np.nan], rows),
+            'Promo2': rng.integers(0, 2, rows),
+            'Promo2SinceWeek': rng.choice([1.0, 14.0, 40.0, np.nan], rows),
+            'Promo2SinceYear': rng.choice([2011.0, 2013.0, np.nan], rows),
+            'PromoInterval': rng.choice(['Jan,Apr,Jul,Oct', 'Feb,May,Aug,Nov', np.nan], rows)
+        })
+
+        missing_cols = ['CompetitionDistance', 'CompetitionOpenSinceYear', 'CompetitionOpenSinceMonth', 'Promo2SinceWeek', 'Promo2SinceYear', 'Open']
+        self.pipeline = Pipeline([
+            ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols= missing_cols)),
+            ('Cat_missing_handler', MissingDataHandler(strategy='constant', fill_value='No Promo', cols= ['PromoInterval'])),
+            ('Outlier_handler', OutlierHandler(method='IQR', cols=['CompetitionDistance'])),
+            ('Proper_dtypes', ProperDtypes(cols=['CompetitionOpenSinceMonth', 'CompetitionOpenSinceYear', 'Promo2', 'Promo2SinceYear'], proper_type='int64')),
+            ('Feature_engineering', DateFeatures()),
+            ('Encoder', OneHotEncoder())
+        ]).fit(self.data)
+
+
+    def test_parity_with_pipeline(self):
+        '''
+        Tests that the plan encodes records exactly like the pipeline
+        '''
+
+        plan = InferencePlan.from_pipeline(self.pipeline)
+        records = self.data.to_dict('records')
+
+        expected = self.pipeline.transform(self.data).toarray()
+        result = plan.transform_records(records)
+
+        self.assertEqual(result.shape, expected.shape)
+        np.testing.assert_array_equal(result.toarray(), expected)
+
+        for i in [0, 17, 399]:
+            np.testing.assert_array_equal(plan.transform_record(records[i]).toarray()[0], expected[i])
+
+
+    def test_column_encoder(self):
+        '''
+        Tests that a pipeline ending with a ColumnEncoder compiles with the numeric values passed through
+        '''
+
+        self.pipeline.steps[-1] = ('Encoder', ColumnEncoder())
+        self.pipeline.fit(self.data)
+
+        plan = InferencePlan.from_pipeline(self.pipeline)
+        records = self.data.to_dict('records')
+
+        expected = self.pipeline.transform(self.data)
+        result = plan.transform_records(records)
+
+        self.assertEqual(result.shape, expected.shape)
+        self.assertEqual(result.nnz, expected.nnz)
+        np.testing.assert_array_equal(result.toarray(), expected.toarray())
+
+
+    def test_record_array(self):
+        '''
+        Tests that numpy record arrays give the same rows as dicts
+        '''
+
+        plan = InferencePlan.from_pipeline(self.pipeline)
+        subset = self.data.head(5)
+
+        result = plan.transform_records(subset.to_records(index=False))
+
+        np.testing.assert_array_equal(result.toarray(), self.pipeline.transform(subset).toarray())
+
+
+    def test_unknown_category(self):
+        '''
+        Tests that unseen categories raise like the OneHotEncoder
+        '''
+
+        plan = InferencePlan.from_pipeline(self.pipeline)
+        record = dict(self.data.iloc[0], StoreType='z')
+
+        with self.assertRaises(ValueError):
+            plan.transform_record(record)
+
+
+    def test_holiday_calendar_of_pipeline(self):
+        '''
+        Tests that the plan looks up holidays in the calendar of the fitted DateFeatures step
+        '''
+
+        self.pipeline.steps[4] = ('Feature_engineering', DateFeatures(country='DE', subdiv='BY'))
+        self.pipeline.fit(self.data)
+
+        plan = InferencePlan.from_pipeline(self.pipeline)
+
+        self.assertIn('Heilige Drei Könige', self.pipeline.named_steps['Encoder'].categories_[-1])
+        np.testing.assert_array_equal(plan.transform_records(self.data.to_dict('records')).toarray(),
+                                      self.pipeline.transform(self.data).toarray())
+
+
+    def test_missing_field(self):
+        '''
+        Tests that a record without one of the fields raises a ValueError naming it
+        '''
+
+        plan = InferencePlan.from_pipeline(self.pipeline)
+        record = self.data.iloc[0].to_dict()
+        del record['Promo2SinceYear']
+
+        with self.assertRaisesRegex(ValueError, 'Promo2SinceYear'):
+            plan.transform_record(record)
+
+
+    def test_unsupported_step(self):
+        '''
+        Tests that steps without a compiled equivalent are rejected
+        '''
+
+        self.pipeline.steps.insert(0, ('scaler', Scaler(cols=['Promo'], scaler_type='StandardScaler').fit(self.data)))
+        InferencePlan.from_pipeline(self.pipeline)
+
+        self.pipeline.steps[2] = ('Outlier_handler', OutlierHandler(method='z_score').fit(self.data))
+        with self.assertRaises(ValueError):
+            InferencePlan.from_pipeline(self.pipeline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import os
+import json
+import unittest
+import tempfile
+
+import numpy as np
+from xgboost import XGBRegressor, XGBClassifier
+
+sys.path.append(os.path.abspath('scripts'))
+from Model_IO import save_model, load_model, read_metadata, metadata_path
+
+
+class TestModelIO(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        rng = np.random.default_rng(0)
+        self.X = rng.random((200, 4))
+        self.y = self.X[:, 0] * 10 + rng.random(200)
+        self.model = XGBRegressor(n_estimators=20, max_depth=3).fit(self.X, self.y)
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def test_round_trip(self):
+        '''
+        Both native formats give back a model with identical predictions and parameters
+        '''
+
+        for extension in ['.ubj', '.json']:
+            path = os.path.join(self.tmp_dir.name, f'model{extension}')
+            save_model(self.model, path, feature_names=['a', 'b', 'c', 'd'])
+            loaded = load_model(path, verify=True)
+
+            self.assertIsInstance(loaded, XGBRegressor)
+            self.assertEqual(loaded.get_params()['max_depth'], 3)
+            np.testing.assert_array_equal(loaded.predict(self.X), self.model.predict(self.X))
+
+
+    def test_metadata(self):
+        '''
+        The sidecar records the estimator, feature names and format
+        '''
+
+        path = os.path.join(self.tmp_dir.name, 'model_01.ubj')
+        save_model(self.model, path, feature_names=['a', 'b', 'c', 'd'], extra={'rmse': 1.5})
+
+        self.assertEqual(metadata_path(path), os.path.join(self.tmp_dir.name, 'model_01.meta.json'))
+        metadata = read_metadata(path)
+        self.assertEqual(metadata['format'], 'ubjson')
+        self.assertEqual(metadata['estimator'], 'XGBRegressor')
+        self.assertEqual(metadata['n_features'], 4)
+        self.assertListEqual(metadata['feature_names'], ['a', 'b', 'c', 'd'])
+        self.assertEqual(metadata['rmse'], 1.5)
+
+
+    def test_classifier(self):
+        '''
+        The estimator class is rebuilt from the metadata
+        '''
+
+        path = os.path.join(self.tmp_dir.name, 'classifier.ubj')
+        classifier = XGBClassifier(n_estimators=5).fit(self.X, self.y > 5)
+        save_model(classifier, path)
+
+        loaded = load_model(path)
+        self.assertIsInstance(loaded, XGBClassifier)
+        np.testing.assert_array_equal(loaded.predict(self.X), classifier.predict(self.X))
+
+
+    def test_invalid(self):
+        '''
+        Unknown extensions, modified files and mismatching metadata are rejected
+        '''
+
+        with self.assertRaises(ValueError):
+            save_model(self.model, os.path.join(self.tmp_dir.name, 'model.pkl'))
+
+        path = os.path.join(self.tmp_dir.name, 'model.json')
+        save_model(self.model, path)
+        with open(path, 'a') as f:
+            f.write(' ')
+        with self.assertRaises(ValueError):
+            load_model(path, verify=True)
+
+        metadata = read_metadata(path)
+        metadata['n_features'] = 7
+        with open(metadata_path(path), 'w') as f:
+            json.dump(metadata, f)
+        with self.assertRaises(ValueError):
+            load_model(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import sys
+import os
+import unittest
+import importlib.util
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import FunctionTransformer
+
+sys.path.append(os.path.abspath('scripts'))
+from Sequence_Dataset import SequenceDataset
+
+
+class TestSequenceDataset(unittest.TestCase):
+
+    def setUp(self):
+
+        # Two stores over 10 days, store 2 misses day 6, rows shuffled
+        dates = pd.date_range('2015-01-01', periods=10, freq='D')
+        data = pd.DataFrame({
+            'Store': np.repeat([1, 2], 10),
+            'Date': np.tile(dates, 2),
+        })
+        data = data.drop(index=15).sample(frac=1, random_state=0)
+        data['Day'] = (data['Date'] - dates[0]).dt.days
+        data['Feature'] = data['Store'] * 100 + data['Day']
+        self.data = data
+
+        self.dataset = SequenceDataset(data[['Feature', 'Day']].to_numpy(), data['Feature'].to_numpy(),
+                                       data['Store'].to_numpy(), data['Date'].to_numpy(), lookback=3)
+
+
+    def test_windows(self):
+        '''
+        Tests that windows hold consecutive days of one store, skipping missing days and store boundaries
+        '''
+
+        # Store 1: 8 windows, store 2: days 0-4 give 3 windows and days 6-9 give 2
+        self.assertEqual(len(self.dataset), 13)
+
+        for start in self.dataset.starts:
+            window = self.dataset.windows[start]
+            self.assertEqual(window.shape, (3, 2))
+            np.testing.assert_array_equal(np.diff(window[:, 0]), [1, 1])
+
+
+    def test_windows_are_views(self):
+        '''
+        Tests that the windows don't copy the data
+        '''
+
+        self.assertTrue(np.shares_memory(self.dataset.windows, self.dataset.X))
+
+
+    def test_batches(self):
+        '''
+        Tests that batches cover every window once and pair it with the target of its last day
+        '''
+
+        batches = list(self.dataset.batches(batch_size=5, shuffle=True, seed=0))
+        X = np.concatenate([X for X, _ in batches])
+        y = np.concatenate([y for _, y in batches])
+
+        self.assertListEqual([len(X) for X, _ in batches], [5, 5, 3])
+        self.assertEqual(X.shape, (13, 3, 2))
+        self.assertEqual(X.dtype, np.float32)
+        np.testing.assert_array_equal(X[:, -1, 0], y)
+        self.assertEqual(len(set(y.tolist())), 13)
+
+
+    def test_split(self):
+        '''
+        Tests that the split is on the day the window predicts
+        '''
+
+        train, valid = self.dataset.split('2015-01-09')
+
+        self.assertEqual(len(train) + len(valid), len(self.dataset))
+        self.assertTrue((train.target_days < np.datetime64('2015-01-09')).all())
+        self.assertTrue((valid.target_days >= np.datetime64('2015-01-09')).all())
+        self.assertIs(train.X, self.dataset.X)
+
+
+    def test_from_frame_target_lags(self):
+        '''
+        Tests that the lagged target is appended to the features without the target of the predicted day
+        '''
+
+        data = self.data.assign(Sales=self.data['Feature'])
+        pipeline = FunctionTransformer(lambda X: X[['Day']].to_numpy())
+        dataset = SequenceDataset.from_frame(data, pipeline, lookback=3, target_lags=[1])
+
+        self.assertEqual(dataset.n_features, 2)
+        windows = dataset.windows[dataset.starts]
+        # Windows hold consecutive days, the lag of the last day is the target of the day before
+        np.testing.assert_array_equal(windows[:, -1, 1], dataset.targets - 1)
+        # The first day of a store has no history
+        first_days = dataset.X[dataset.days == np.datetime64('2015-01-01')]
+        np.testing.assert_array_equal(first_days[:, 1], [0, 0])
+
+
+    def test_invalid_lookback(self):
+        '''
+        Tests that a lookback under one day is rejected
+        '''
+
+        with self.assertRaises(ValueError):
+            SequenceDataset(np.zeros((3, 1)), np.zeros(3), np.ones(3), pd.date_range('2015-01-01', periods=3), lookback=0)
+
+
+    @unittest.skipUnless(importlib.util.find_spec('tensorflow'), 'tensorflow is not installed')
+    def test_tf_dataset(self):
+        '''
+        Tests that the tf.data pipeline yields the same batches
+        '''
+
+        batches = list(self.dataset.to_tf_dataset(batch_size=5).as_numpy_iterator())
+
+        np.testing.assert_array_equal(batches[0][0], next(self.dataset.batches(batch_size=5))[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
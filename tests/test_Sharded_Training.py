@@ -0,0 +1,174 @@
+import sys
+import os
+import json
+import unittest
+import tempfile
+from unittest.mock import patch
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+sys.path.append(os.path.abspath('scripts'))
+from Custom_Transformers import MissingDataHandler, DateFeatures, ColumnEncoder
+import Sharded_Training
+from Sharded_Training import ShardedTrainer, shard_key
+from Model_IO import load_model
+
+
+class TestShardedTraining(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        rows = 1200
+        dates = pd.date_range('2014-01-01', periods=rows // 6, freq='D').repeat(6)
+
+        self.data = pd.DataFrame({
+            'Store': np.tile(np.arange(1, 7), rows // 6),
+            'DayOfWeek': dates.dayofweek + 1,
+            'Date': dates.strftime('%Y-%m-%d'),
+            'Promo': rng.integers(0, 2, rows),
+            'StoreType': np.tile(['a', 'a', 'b', 'b', 'c', 'c'], rows // 6),
+            'Assortment': np.tile(['a', 'c', 'a', 'c', 'a', 'c'], rows // 6),
+            'CompetitionDistance': rng.choice([270.0, 1270.0, np.nan], rows),
+        })
+        # Every store reacts differently to promotions
+        self.data['Sales'] = 1000 + self.data['Promo'] * self.data['Store'] * 200 + rng.normal(0, 10, rows)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmp_dir.name, 'sharded')
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def make_trainer(self, **kwargs):
+        pipeline = Pipeline([
+            ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols=['CompetitionDistance'])),
+            ('Feature_engineering', DateFeatures()),
+            ('Encoder', ColumnEncoder(handle_unknown='ignore'))
+        ])
+        params = dict(params={'n_estimators': 20, 'max_depth': 3}, output_dir=self.output_dir, min_rows=50, n_jobs=1)
+        params.update(kwargs)
+        return ShardedTrainer(pipeline, **params)
+
+
+    def shard_path(self, manifest, key):
+        return os.path.join(self.output_dir, manifest['shards'][key])
+
+
+    def test_shard_key(self):
+        '''
+        Tests the shard names of a store and of a cluster
+        '''
+
+        record = {'Store': 3, 'StoreType': 'b', 'Assortment': 'a'}
+
+        self.assertEqual(shard_key(record, ['Store']), 'Store=3')
+        self.assertEqual(shard_key(record, ['StoreType', 'Assortment']), 'StoreType=b|Assortment=a')
+
+        # The same store as sent by the JSON API, a form or read from a csv
+        for store in [3.0, '3', ['3'], np.int16(3), np.float64(3)]:
+            self.assertEqual(shard_key({'Store': store}, ['Store']), 'Store=3')
+        self.assertEqual(shard_key({'StoreType': ['b']}, ['StoreType']), 'StoreType=b')
+
+
+    def test_per_store_bundle(self):
+        '''
+        Tests that every store gets a model of its own, trained only on its rows, next to the fallback
+        '''
+
+        manifest = self.make_trainer().fit(self.data)
+
+        self.assertEqual(sorted(manifest['shards']), [f'Store={store}' for store in range(1, 7)])
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, manifest['fallback'])))
+        with open(os.path.join(self.output_dir, 'manifest.json')) as f:
+            self.assertEqual(json.load(f)['by'], ['Store'])
+
+        pipeline = joblib.load(os.path.join(self.output_dir, manifest['pipeline']))
+        promo = self.data[(self.data['Store'] == 6) & (self.data['Promo'] == 1)].drop(columns='Sales').head(5)
+        model = load_model(self.shard_path(manifest, 'Store=6'))
+        np.testing.assert_allclose(model.predict(pipeline.transform(promo)), 2200, rtol=0.05)
+
+
+    def test_cluster_bundle(self):
+        '''
+        Tests that sharding on StoreType/Assortment gives one model per cluster
+        '''
+
+        manifest = self.make_trainer(by=['StoreType', 'Assortment']).fit(self.data)
+
+        self.assertEqual(len(manifest['shards']), 6)
+        self.assertIn('StoreType=b|Assortment=c', manifest['shards'])
+
+
+    def test_small_shards_fall_back(self):
+        '''
+        Tests that shards below min_rows get no model and are left to the fallback
+        '''
+
+        data = self.data[(self.data['Store'] != 6) | (self.data.index < 120)]
+        manifest = self.make_trainer().fit(data)
+
+        self.assertNotIn('Store=6', manifest['shards'])
+        self.assertEqual(len(manifest['shards']), 5)
+
+
+    def test_restart_skips_trained_shards(self):
+        '''
+        Tests that a second run only retrains the shards whose model is missing
+        '''
+
+        manifest = self.make_trainer().fit(self.data)
+        kept = self.shard_path(manifest, 'Store=1')
+        removed = self.shard_path(manifest, 'Store=2')
+        mtime = os.path.getmtime(kept)
+        os.remove(removed)
+
+        trainer = self.make_trainer()
+        trainer.fit(self.data)
+
+        self.assertEqual([result['shard'] for result in trainer.results_], ['Store=2'])
+        self.assertEqual(os.path.getmtime(kept), mtime)
+        self.assertTrue(os.path.exists(removed))
+
+
+    def test_failed_shard_left_out(self):
+        '''
+        Tests that a shard whose training fails isn't listed in the manifest
+        '''
+
+        train_shard = Sharded_Training._train_shard
+
+        def failing(key, *args):
+            if key == 'Store=2':
+                raise MemoryError("out of memory")
+            return train_shard(key, *args)
+
+        with patch('Sharded_Training._train_shard', side_effect=failing):
+            manifest = self.make_trainer().fit(self.data)
+
+        self.assertNotIn('Store=2', manifest['shards'])
+        self.assertEqual(len(manifest['shards']), 5)
+        self.assertTrue(all(os.path.exists(self.shard_path(manifest, key)) for key in manifest['shards']))
+
+
+    def test_worker_pool(self):
+        '''
+        Tests that the worker processes train the same models as the sequential run
+        '''
+
+        manifest = self.make_trainer(by=['StoreType'], n_jobs=2).fit(self.data)
+        X = np.zeros((3, load_model(os.path.join(self.output_dir, manifest['fallback'])).n_features_in_))
+        pooled = load_model(self.shard_path(manifest, 'StoreType=a')).predict(X)
+
+        self.output_dir = os.path.join(self.tmp_dir.name, 'sequential')
+        manifest = self.make_trainer(by=['StoreType']).fit(self.data)
+        np.testing.assert_allclose(load_model(self.shard_path(manifest, 'StoreType=a')).predict(X), pooled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import sys
+import os
+import unittest
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+sys.path.append(os.path.abspath('scripts'))
+from Custom_Transformers import MissingDataHandler, DateFeatures, ColumnEncoder
+from Training import ChunkIter, OutOfCoreTrainer
+
+
+class TestOutOfCoreTrainer(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        rows = 3000
+        dates = pd.date_range('2014-01-01', periods=rows // 10, freq='D').repeat(10)
+
+        self.data = pd.DataFrame({
+            'Store': np.tile(np.arange(1, 11), rows // 10),
+            'DayOfWeek': dates.dayofweek + 1,
+            'Date': dates.strftime('%Y-%m-%d'),
+            'Promo': rng.integers(0, 2, rows),
+            'StoreType': rng.choice(['a', 'b', 'c'], rows),
+            'CompetitionDistance': rng.choice([270.0, 1270.0, np.nan], rows),
+        })
+        self.data['Sales'] = 1000 + 500 * self.data['Promo'] + 30 * self.data['Store'] + rng.normal(0, 10, rows)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+    def make_chunks(self, data, chunksize=500):
+        def chunks():
+            for start in range(0, len(data), chunksize):
+                yield data.iloc[start:start + chunksize].copy()
+        return chunks
+
+
+    def make_trainer(self, rounds, **kwargs):
+        pipeline = Pipeline([
+            ('missing_handler', MissingDataHandler(strategy='constant', fill_value=0, cols=['CompetitionDistance'])),
+            ('Feature_engineering', DateFeatures()),
+            ('Encoder', ColumnEncoder(handle_unknown='ignore'))
+        ])
+        return OutOfCoreTrainer(pipeline, params={'max_depth': 3, 'eta': 0.3}, num_boost_round=rounds, **kwargs)
+
+
+    def test_chunk_iter_passes(self):
+        '''
+        Tests that every pass of the iterator restarts the chunks
+        '''
+
+        batches = []
+        data_iter = ChunkIter(lambda: ((np.ones((2, 1)), np.ones(2)) for _ in range(3)))
+        for _ in range(2):
+            while data_iter.next(lambda data, label: batches.append(len(data))):
+                pass
+            data_iter.reset()
+
+        self.assertEqual(len(batches), 6)
+
+
+    def test_train_from_chunks(self):
+        '''
+        Tests that the model trained from chunks fits the data and stops on the validation range
+        '''
+
+        train, valid = self.data.iloc[:2500], self.data.iloc[2500:]
+        trainer = self.make_trainer(rounds=200, early_stopping_rounds=5)
+        trainer.fit_pipeline(self.make_chunks(train), sample_frac=0.5)
+        model = trainer.train(self.make_chunks(train), self.make_chunks(valid))
+
+        X_valid = trainer.pipeline.transform(valid.drop(columns='Sales'))
+        error = np.abs(model.predict(X_valid) - valid['Sales'].to_numpy()).mean()
+
+        self.assertLess(error, 50)
+        self.assertLess(model.best_iteration, 199)
+
+
+    def test_resume_from_checkpoint(self):
+        '''
+        Tests that a second run continues from the checkpoint instead of starting over
+        '''
+
+        train = self.data
+        checkpoint_dir = os.path.join(self.tmp_dir.name, 'checkpoints')
+
+        first = self.make_trainer(rounds=10, checkpoint_dir=checkpoint_dir, checkpoint_interval=5)
+        first.fit_pipeline(self.make_chunks(train), sample_frac=1.0)
+        short = first.train(self.make_chunks(train))
+        self.assertTrue(os.path.exists(os.path.join(checkpoint_dir, 'checkpoint.ubj')))
+
+        second = self.make_trainer(rounds=20, checkpoint_dir=checkpoint_dir)
+        second.pipeline = first.pipeline
+        longer = second.train(self.make_chunks(train))
+
+        X = first.pipeline.transform(train.drop(columns='Sales'))
+        self.assertEqual(longer.get_booster().num_boosted_rounds(), 20)
+        np.testing.assert_allclose(longer.predict(X, iteration_range=(0, 10)), short.predict(X), rtol=1e-6)
+
+        other_params = self.make_trainer(rounds=30, checkpoint_dir=checkpoint_dir)
+        other_params.params['max_depth'] = 6
+        other_params.pipeline = first.pipeline
+        with self.assertRaises(ValueError):
+            other_params.train(self.make_chunks(train))
+
+
+    def test_resume_after_early_stop(self):
+        '''
+        Tests that restarting a run that stopped early keeps its rounds and best iteration
+        '''
+
+        train, valid = self.data.iloc[:2500], self.data.iloc[2500:]
+        checkpoint_dir = os.path.join(self.tmp_dir.name, 'checkpoints')
+
+        first = self.make_trainer(rounds=200, early_stopping_rounds=5, checkpoint_dir=checkpoint_dir)
+        first.fit_pipeline(self.make_chunks(train), sample_frac=0.5)
+        stopped = first.train(self.make_chunks(train), self.make_chunks(valid))
+        rounds = stopped.get_booster().num_boosted_rounds()
+        self.assertLess(rounds, 200)
+
+        second = self.make_trainer(rounds=200, early_stopping_rounds=5, checkpoint_dir=checkpoint_dir)
+        second.pipeline = first.pipeline
+        resumed = second.train(self.make_chunks(train), self.make_chunks(valid))
+
+        self.assertEqual(resumed.get_booster().num_boosted_rounds(), rounds)
+        self.assertEqual(resumed.best_iteration, stopped.best_iteration)
+        self.assertAlmostEqual(resumed.best_score, stopped.best_score)
+
+
+if __name__ == '__main__':
+    unittest.main()
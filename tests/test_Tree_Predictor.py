@@ -0,0 +1,79 @@
+import sys
+import os
+import unittest
+
+import numpy as np
+from scipy import sparse
+from xgboost import XGBRegressor, XGBClassifier
+
+sys.path.append(os.path.abspath('scripts'))
+from Tree_Predictor import FlatTreePredictor
+
+
+class TestFlatTreePredictor(unittest.TestCase):
+
+    def setUp(self):
+
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(500, 8))
+        self.X[rng.random(self.X.shape) < 0.1] = np.nan
+        self.y = np.nansum(self.X[:, :3], axis=1) * 100 + rng.normal(size=500)
+
+
+    def test_dense_parity(self):
+        '''
+        Predictions match the booster on dense input with missing values
+        '''
+
+        model = XGBRegressor(n_estimators=50, max_depth=5).fit(self.X, self.y)
+        predictor = FlatTreePredictor.from_model(model)
+
+        self.assertEqual(predictor.n_trees, 50)
+        np.testing.assert_allclose(predictor.predict(self.X), model.predict(self.X), rtol=1e-6, atol=1e-3)
+
+
+    def test_sparse_parity(self):
+        '''
+        Absent entries of a CSR matrix are treated as missing, like in a DMatrix
+        '''
+
+        rng = np.random.default_rng(1)
+        X = sparse.random(500, 30, density=0.1, format='csr', random_state=2, data_rvs=lambda n: rng.integers(1, 4, n))
+        y = X[:, :5].sum(axis=1).A.ravel() * 10 + rng.normal(size=500)
+
+        model = XGBRegressor(n_estimators=30, max_depth=4).fit(X, y)
+        predictor = FlatTreePredictor.from_model(model)
+
+        np.testing.assert_allclose(predictor.predict(X), model.predict(X), rtol=1e-6, atol=1e-3)
+        np.testing.assert_allclose(predictor.predict(X[:1]), model.predict(X[:1]), rtol=1e-6, atol=1e-3)
+
+
+    def test_best_iteration(self):
+        '''
+        Trees after the best iteration are dropped, as XGBRegressor.predict does
+        '''
+
+        model = XGBRegressor(n_estimators=200, learning_rate=0.5, early_stopping_rounds=5)
+        model.fit(self.X[:400], self.y[:400], eval_set=[(self.X[400:], self.y[400:])], verbose=False)
+        predictor = FlatTreePredictor.from_model(model)
+
+        self.assertEqual(predictor.n_trees, model.best_iteration + 1)
+        np.testing.assert_allclose(predictor.predict(self.X), model.predict(self.X), rtol=1e-6, atol=1e-3)
+
+
+    def test_unsupported(self):
+        '''
+        Models whose output isn't the raw margin and wrongly shaped input are rejected
+        '''
+
+        classifier = XGBClassifier(n_estimators=5).fit(self.X, self.y > 0)
+        with self.assertRaises(ValueError):
+            FlatTreePredictor.from_model(classifier)
+
+        predictor = FlatTreePredictor.from_model(XGBRegressor(n_estimators=5).fit(self.X, self.y))
+        with self.assertRaises(ValueError):
+            predictor.predict(self.X[:, :3])
+
+
+if __name__ == '__main__':
+    unittest.main()
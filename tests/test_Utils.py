@@ -1,13 +1,17 @@
 import sys
 import os
+import glob
+import tempfile
 
 import unittest
 from unittest.mock import patch, MagicMock
+import numpy as np
 import pandas as pd
 import holidays
 
 sys.path.append(os.path.abspath('scripts'))
-from Utils import DataUtils
+import Utils
+from Utils import DataUtils, COMPACT_DTYPES
 
 
 class TestUtils(unittest.TestCase):
@@ -51,6 +55,20 @@ class TestUtils(unittest.TestCase):
         self.assertTrue((result == mock_data).all().all())
 
     
+    @patch('pandas.read_csv')
+    def test_load_data_with_dtype(self, mock_read_csv):
+        '''
+        Tests that the dtype schema is passed on to the csv parser
+        '''
+
+        mock_read_csv.return_value = self.data_no_missing
+
+        data_utils = DataUtils()
+        data_utils.load_data('test.csv', dtype=COMPACT_DTYPES)
+
+        self.assertIs(mock_read_csv.call_args.kwargs['dtype'], COMPACT_DTYPES)
+
+    
     @patch('pandas.read_csv')
     def test_load_data_faliure(self, mock_read_csv):
         '''
@@ -65,6 +83,114 @@ class TestUtils(unittest.TestCase):
         self.assertIsNone(result)
 
 
+    @unittest.skipUnless(Utils.pyarrow is not None, 'pyarrow is not installed, load_data reads the csv')
+    def test_load_data_cache(self):
+        '''
+        Tests that the second load is served from the Parquet cache with the same content
+        '''
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.write_train_csv(data_dir)
+            data_utils = DataUtils()
+            data_utils.data_dir = data_dir
+
+            first = data_utils.load_data('train.csv')
+            with patch('pandas.read_csv') as mock_read_csv:
+                second = data_utils.load_data('train.csv')
+
+            mock_read_csv.assert_not_called()
+            self.assertEqual(len(glob.glob(os.path.join(data_dir, '.cache', '*.parquet'))), 1)
+            pd.testing.assert_frame_equal(first, second)
+            self.assertEqual(second['StateHoliday'].tolist(), ['0', '0', 'a', '0'])
+            self.assertTrue(np.isnan(second['PromoInterval'].iloc[1]))
+
+
+    @unittest.skipUnless(Utils.pyarrow is not None, 'pyarrow is not installed, load_data reads the csv')
+    def test_load_data_uncached_matches_cache(self):
+        '''
+        Tests that a load bypassing the cache gives the same frame and the cache holds no partial files
+        '''
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.write_train_csv(data_dir)
+            data_utils = DataUtils()
+            data_utils.data_dir = data_dir
+
+            cached = data_utils.load_data('train.csv')
+            uncached = data_utils.load_data('train.csv', use_cache=False)
+
+            pd.testing.assert_frame_equal(cached, uncached)
+            self.assertEqual(uncached['StateHoliday'].tolist(), ['0', '0', 'a', '0'])
+            self.assertEqual(glob.glob(os.path.join(data_dir, '.cache', '*.tmp')), [])
+
+
+    @unittest.skipUnless(Utils.pyarrow is not None, 'pyarrow is not installed, load_data reads the csv')
+    def test_load_data_cache_filters(self):
+        '''
+        Tests the column projection and the store and date filters
+        '''
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.write_train_csv(data_dir)
+            data_utils = DataUtils()
+            data_utils.data_dir = data_dir
+
+            for _ in range(2):  # first from the csv, then from the cache
+                result = data_utils.load_data('train.csv', columns=['Store', 'Date'], stores=[1],
+                                              date_range=('2015-07-30', '2015-07-31'))
+
+                self.assertListEqual(list(result.columns), ['Store', 'Date'])
+                self.assertListEqual(result['Date'].tolist(), ['2015-07-31', '2015-07-30'])
+
+
+    @unittest.skipUnless(Utils.pyarrow is not None, 'pyarrow is not installed, load_data reads the csv')
+    def test_load_data_cache_eviction(self):
+        '''
+        Tests that a changed csv invalidates its cache entry
+        '''
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.write_train_csv(data_dir)
+            data_utils = DataUtils()
+            data_utils.data_dir = data_dir
+            data_utils.load_data('train.csv')
+
+            with open(os.path.join(data_dir, 'train.csv'), 'a') as file:
+                file.write('3,2015-07-31,500,0,\n')
+            result = data_utils.load_data('train.csv')
+
+            self.assertEqual(len(result), 5)
+            self.assertEqual(len(glob.glob(os.path.join(data_dir, '.cache', '*.parquet'))), 1)
+
+
+    def test_iter_data(self):
+        '''
+        Tests the chunk sizes, the StateHoliday dtype and the merge of every chunk
+        '''
+
+        store = pd.DataFrame({'Store': [1, 2], 'StoreType': ['a', 'c']})
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.write_train_csv(data_dir)
+            data_utils = DataUtils()
+            data_utils.data_dir = data_dir
+
+            chunks = list(data_utils.iter_data('train.csv', chunksize=3, merge_with=store))
+
+        self.assertListEqual([len(chunk) for chunk in chunks], [3, 1])
+        self.assertEqual(chunks[1]['StateHoliday'].iloc[0], '0')
+        self.assertListEqual(chunks[0]['StoreType'].tolist(), ['a', 'a', 'c'])
+
+
+    def write_train_csv(self, data_dir):
+        with open(os.path.join(data_dir, 'train.csv'), 'w') as file:
+            file.write('Store,Date,Sales,StateHoliday,PromoInterval\n'
+                       '1,2015-07-31,5263,0,"Jan,Apr,Jul,Oct"\n'
+                       '1,2015-07-30,5020,0,\n'
+                       '2,2015-07-31,6064,a,"Jan,Apr,Jul,Oct"\n'
+                       '1,2015-07-29,4782,"0","Jan,Apr,Jul,Oct"\n')
+
+
     def test_data_info_with_missing_data(self):
         '''
         Tests the funcion data_info with missing data
@@ -104,6 +230,39 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(result['Holiday'].loc[2], "Christmas Day")
 
 
+    def test_holiday_generator_matches_holidays_package(self):
+        '''
+        Tests that the calendar lookup gives the same names as checking each date with holidays.US
+        '''
+
+        data = pd.DataFrame({'Date': pd.date_range('2013-01-01', '2015-12-31', freq='D')})
+        us_holidays = holidays.US()
+        expected = data['Date'].apply(lambda x: us_holidays[x] if x in us_holidays else 'Not Holiday')
+
+        data_utils = DataUtils()
+        result = data_utils.holiday_generator(data)
+
+        self.assertListEqual(list(result['Holiday']), list(expected))
+
+
+    def test_holiday_generator_per_state(self):
+        '''
+        Tests the holiday_generator with a German state per row
+        '''
+
+        data = pd.DataFrame({
+            'Date': pd.to_datetime(['2015-01-06', '2015-01-06', '2015-01-01']),
+            'State': ['BY', 'NW', None]
+        })
+
+        data_utils = DataUtils()
+        result = data_utils.holiday_generator(data, country='DE', state_col='State')
+
+        self.assertEqual(result['Holiday'].loc[0], "Heilige Drei Könige")
+        self.assertEqual(result['Holiday'].loc[1], "Not Holiday")
+        self.assertEqual(result['Holiday'].loc[2], "Neujahr")
+
+
         
 
 